@@ -0,0 +1,196 @@
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import BaseUserManager
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from accounts.models import Account, UserProfile
+
+
+DEFAULT_PROFILE_PICTURE = 'default/default-user.png'
+EMAIL_LENGTH = Account._meta.get_field('email').max_length
+USERNAME_LENGTH = Account._meta.get_field('username').max_length
+
+
+def _init_worker(settings_module):
+    # Needed when the pool uses 'spawn'; with 'fork' Django is already set up
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def _hash_password(password):
+    return make_password(password or None)
+
+
+def assign_usernames(emails):
+    """{email: username}: the email itself where it fits and is free, else its local part plus a suffix."""
+    wanted = {
+        email: email if len(email) <= USERNAME_LENGTH else email.split('@')[0][:USERNAME_LENGTH]
+        for email in emails
+    }
+    taken = set(Account.objects.filter(username__in=wanted.values()).values_list('username', flat=True))
+    usernames = {}
+    for email, username in wanted.items():
+        if username in taken:
+            # Room for a '-NNNNNN' suffix
+            base = username[:USERNAME_LENGTH - 7]
+            taken.update(Account.objects.filter(username__startswith=base).values_list('username', flat=True))
+            suffix = 2
+            while f'{base}-{suffix}' in taken:
+                suffix += 1
+            username = f'{base}-{suffix}'
+        taken.add(username)
+        usernames[email] = username
+    return usernames
+
+
+def read_records(path, fmt):
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        'Import customers from CSV or JSONL (email, first_name, last_name, '
+        'phone_number, password). Passwords are hashed across a process pool '
+        'and rows are inserted with bulk_create, resuming from a checkpoint file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'])
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--checkpoint', help='Progress file (default: <path>.checkpoint)')
+        parser.add_argument('--hashed', action='store_true',
+                            help='The password column already holds Django password hashes.')
+        parser.add_argument('--inactive', action='store_true',
+                            help='Import accounts as inactive (they must verify their email).')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        checkpoint = options['checkpoint'] or path + '.checkpoint'
+        done = 0
+        if os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                done = int(f.read().strip() or 0)
+            self.stdout.write(f'Resuming after {done} records')
+
+        pool = None
+        if options['workers'] > 1 and not options['hashed']:
+            pool = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                initializer=_init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'mohifoodspro.settings'),),
+            )
+
+        created = skipped = 0
+        start = time.perf_counter()
+        records = itertools.islice(read_records(path, fmt), done, None)
+        try:
+            while True:
+                batch = list(itertools.islice(records, options['batch_size']))
+                if not batch:
+                    break
+                batch_created, batch_skipped = self.import_batch(batch, pool, options)
+                created += batch_created
+                skipped += batch_skipped
+                done += len(batch)
+                with open(checkpoint, 'w') as f:
+                    f.write(str(done))
+                rate = created / (time.perf_counter() - start)
+                self.stdout.write(f'{done} records read, {created} created, {skipped} skipped ({rate:.0f}/s)')
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(f'Imported {created} customers, skipped {skipped}.'))
+
+    def import_batch(self, batch, pool, options):
+        rows = {}
+        for record in batch:
+            email = BaseUserManager.normalize_email((record.get('email') or '').strip())
+            if not email or email in rows:
+                continue
+            try:
+                validate_email(email)
+                if len(email) > EMAIL_LENGTH:
+                    raise ValidationError(f'longer than {EMAIL_LENGTH} characters')
+            except ValidationError as e:
+                self.stderr.write(f'Skipped {email!r}: {" ".join(e.messages)}')
+                continue
+            rows[email] = record
+        existing = set(Account.objects.filter(email__in=rows).values_list('email', flat=True))
+        for email in existing:
+            del rows[email]
+        if not rows:
+            return 0, len(batch)
+
+        passwords = [record.get('password') for record in rows.values()]
+        if options['hashed']:
+            hashes = [password or make_password(None) for password in passwords]
+        elif pool is not None:
+            hashes = list(pool.map(_hash_password, passwords, chunksize=max(1, len(passwords) // (options['workers'] * 4))))
+        else:
+            hashes = [_hash_password(password) for password in passwords]
+
+        usernames = assign_usernames(rows)
+        accounts = [
+            Account(
+                email=email,
+                username=usernames[email],
+                first_name=(record.get('first_name') or '')[:50],
+                last_name=(record.get('last_name') or '')[:50],
+                phone_number=(record.get('phone_number') or '')[:50],
+                password=password_hash,
+                is_active=not options['inactive'],
+            )
+            for (email, record), password_hash in zip(rows.items(), hashes)
+        ]
+        try:
+            self.create_accounts(accounts)
+        except IntegrityError:
+            # Someone registered one of these meanwhile: retry row by row, skipping the clashes
+            created = []
+            for account in accounts:
+                account.pk = None
+                try:
+                    self.create_accounts([account])
+                except IntegrityError:
+                    self.stderr.write(f'Skipped {account.email!r}: email or username already taken')
+                else:
+                    created.append(account)
+            accounts = created
+        return len(accounts), len(batch) - len(accounts)
+
+    def create_accounts(self, accounts):
+        with transaction.atomic():
+            # bulk_create skips post_save, so create_user_profile doesn't run per row
+            Account.objects.bulk_create(accounts)
+            if any(account.pk is None for account in accounts):
+                ids = dict(Account.objects.filter(email__in=[account.email for account in accounts])
+                           .values_list('email', 'id'))
+                for account in accounts:
+                    account.pk = ids[account.email]
+            UserProfile.objects.bulk_create([
+                UserProfile(user_id=account.pk, profile_picture=DEFAULT_PROFILE_PICTURE)
+                for account in accounts
+            ])
@@ -1,3 +1,91 @@
-from django.test import TestCase
+import json
+from io import StringIO
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .models import Account, UserProfile
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportCustomersTests(TestCase):
+    def write(self, name, lines):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_csv_import_creates_accounts_and_profiles(self):
+        Account.objects.create_user('Old', 'User', 'old@example.com', 'old@example.com', 'x')
+        path = self.write('customers.csv', [
+            'email,first_name,last_name,phone_number,password',
+            'a@example.com,Asha,Rao,999,pw-a',
+            'b@example.com,Bala,Iyer,888,pw-b',
+            'old@example.com,Old,User,777,pw-old',
+            'a@example.com,Dup,Row,666,pw-dup',
+        ])
+        call_command('import_customers', path, workers=1, batch_size=2, stdout=StringIO())
+
+        user = Account.objects.get(email='a@example.com')
+        self.assertTrue(user.is_active)
+        self.assertEqual(user.phone_number, '999')
+        self.assertTrue(check_password('pw-a', user.password))
+        self.assertEqual(Account.objects.count(), 3)
+        self.assertEqual(UserProfile.objects.count(), 3)
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_jsonl_import_resumes_from_checkpoint(self):
+        path = self.write('customers.jsonl', [
+            json.dumps({'email': f'user{i}@example.com', 'first_name': 'U', 'password': 'pw'})
+            for i in range(5)
+        ])
+        with open(path + '.checkpoint', 'w') as f:
+            f.write('3')
+        call_command('import_customers', path, workers=1, stdout=StringIO())
+        self.assertEqual(
+            sorted(Account.objects.values_list('email', flat=True)),
+            ['user3@example.com', 'user4@example.com'],
+        )
+
+    def test_process_pool_hashing(self):
+        path = self.write('customers.csv', ['email,password'] + [f'p{i}@example.com,pw{i}' for i in range(6)])
+        call_command('import_customers', path, workers=2, stdout=StringIO())
+        self.assertTrue(check_password('pw5', Account.objects.get(email='p5@example.com').password))
+
+    def test_long_emails_and_clashing_usernames_get_unique_usernames(self):
+        Account.objects.create_user('Old', 'User', 'taken@example.com', 'old@example.com', 'x')
+        long_email = 'a' * 60 + '@example.com'
+        too_long = 'b' * 100 + '@example.com'
+        path = self.write('customers.csv', [
+            'email,password',
+            f'{long_email},pw',
+            'taken@example.com,pw',
+            f'{too_long},pw',
+        ])
+        err = StringIO()
+        call_command('import_customers', path, workers=1, stdout=StringIO(), stderr=err)
+
+        self.assertEqual(Account.objects.get(email=long_email).username, 'a' * 50)
+        username = Account.objects.get(email='taken@example.com').username
+        self.assertEqual(username, 'taken@example.com-2')
+        self.assertIn(too_long, err.getvalue())
+        self.assertFalse(Account.objects.filter(email=too_long).exists())
+
+    def test_rows_that_still_clash_are_skipped_not_fatal(self):
+        path = self.write('customers.csv', ['email,password', 'x@example.com,pw', 'y@example.com,pw'])
+        err = StringIO()
+        same = {'x@example.com': 'same', 'y@example.com': 'same'}
+        with mock.patch('accounts.management.commands.import_customers.assign_usernames', return_value=same):
+            call_command('import_customers', path, workers=1, stdout=StringIO(), stderr=err)
+        self.assertEqual(list(Account.objects.values_list('email', flat=True)), ['x@example.com'])
+        self.assertEqual(UserProfile.objects.count(), 1)
+        self.assertIn('y@example.com', err.getvalue())
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
@@ -1,9 +1,10 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from .forms import RegistrationForm, UserForm, UserProfileForm
 from .models import Account, UserProfile
-from orders.models import Order, OrderProduct
+from orders.archive import find_user_order, user_order_count, user_orders
 from django.contrib import messages, auth
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from django.http import HttpResponse
 
 # Verification email
@@ -14,8 +15,8 @@ from django.utils.encoding import force_bytes
 from django.contrib.auth.tokens import default_token_generator
 from django.core.mail import EmailMessage
 
-from carts.views import _cart_id
-from carts.models import Cart, CartItem
+from carts.models import merge_guest_cart, merge_cart_quantities
+from carts.guest_cart import read_guest_cart, clear_guest_cart
 #import requests
 
 
@@ -69,57 +70,24 @@ def login(request):
         user = auth.authenticate(email=email, password=password)
 
         if user is not None:
-            try:
-                cart = Cart.objects.get(cart_id=_cart_id(request))
-                is_cart_item_exists = CartItem.objects.filter(cart=cart).exists()
-                if is_cart_item_exists:
-                    cart_item = CartItem.objects.filter(cart=cart)
-
-                    # Getting the product variations by cart id
-                    product_variation = []
-                    for item in cart_item:
-                        variation = item.variations.all()
-                        product_variation.append(list(variation))
-
-                    # Get the cart items from the user to access his product variations
-                    cart_item = CartItem.objects.filter(user=user)
-                    ex_var_list = []
-                    id = []
-                    for item in cart_item:
-                        existing_variation = item.variations.all()
-                        ex_var_list.append(list(existing_variation))
-                        id.append(item.id)
-
-                    # product_variation = [1, 2, 3, 4, 6]
-                    # ex_var_list = [4, 6, 3, 5]
-
-                    for pr in product_variation:
-                        if pr in ex_var_list:
-                            index = ex_var_list.index(pr)
-                            item_id = id[index]
-                            item = CartItem.objects.get(id=item_id)
-                            item.quantity += 1
-                            item.user = user
-                            item.save()
-                        else:
-                            cart_item = CartItem.objects.filter(cart=cart)
-                            for item in cart_item:
-                                item.user = user
-                                item.save()
-            except:
-                pass
+            # Hand the guest cart over before login() rotates the session key
+            merge_guest_cart(request.session.session_key, user)
+            merge_cart_quantities(read_guest_cart(request), user)
             auth.login(request, user)
             messages.success(request, 'You are now logged in.')
             url = request.META.get('HTTP_REFERER')
+            response = redirect('dashboard')
             try:
                 query = requests.utils.urlparse(url).query
                 # next=/cart/checkout/
                 params = dict(x.split('=') for x in query.split('&'))
                 if 'next' in params:
                     nextPage = params['next']
-                    return redirect(nextPage)
+                    response = redirect(nextPage)
             except:
-                return redirect('dashboard')
+                pass
+            clear_guest_cart(response)
+            return response
         else:
             messages.error(request, 'Invalid login credentials')
             return redirect('login')
@@ -152,8 +120,7 @@ def activate(request, uidb64, token):
 
 @login_required(login_url = 'login')
 def dashboard(request):
-    orders = Order.objects.order_by('-created_at').filter(user_id=request.user.id, is_ordered=True)
-    orders_count = orders.count()
+    orders_count = user_order_count(request.user)
 
     # NEW ROBUST CODE
     userprofile, created = UserProfile.objects.get_or_create(user_id=request.user.id)
@@ -229,9 +196,13 @@ def resetPassword(request):
         return render(request, 'accounts/resetPassword.html')
 
 
+ORDERS_PAGE_SIZE = 20
+
+
 @login_required(login_url='login')
 def my_orders(request):
-    orders = Order.objects.filter(user=request.user, is_ordered=True).order_by('-created_at')
+    paginator = Paginator(user_orders(request.user), ORDERS_PAGE_SIZE)
+    orders = paginator.get_page(request.GET.get('page'))
     context = {
         'orders': orders,
     }
@@ -288,8 +259,7 @@ def change_password(request):
 
 @login_required(login_url='login')
 def order_detail(request, order_id):
-    order_detail = OrderProduct.objects.filter(order__order_number=order_id)
-    order = Order.objects.get(order_number=order_id)
+    order, order_detail = find_user_order(request.user, order_id)
     subtotal = 0
     for i in order_detail:
         subtotal += i.product_price * i.quantity
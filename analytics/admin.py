@@ -0,0 +1,25 @@
+from django.contrib import admin
+from .models import DailyProductSales, DailyCategorySales, OrderedTogether
+
+
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    list_display = ('date', 'product', 'units', 'revenue', 'orders')
+    list_filter = ('date',)
+    date_hierarchy = 'date'
+
+
+class DailyCategorySalesAdmin(admin.ModelAdmin):
+    list_display = ('date', 'category', 'units', 'revenue', 'orders')
+    list_filter = ('date', 'category')
+    date_hierarchy = 'date'
+
+
+class OrderedTogetherAdmin(admin.ModelAdmin):
+    list_display = ('product', 'rank', 'related', 'orders')
+    list_select_related = ('product', 'related')
+    search_fields = ('product__product_name',)
+
+
+admin.site.register(DailyProductSales, DailyProductSalesAdmin)
+admin.site.register(DailyCategorySales, DailyCategorySalesAdmin)
+admin.site.register(OrderedTogether, OrderedTogetherAdmin)
@@ -0,0 +1,73 @@
+import itertools
+import random
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from accounts.models import Account
+from analytics.recommendations import build_ordered_together, ordered_together
+from orders.models import Order, OrderProduct
+from store.benchmarks import requests_per_second, seed_catalog, temporary_database
+
+
+class Command(BaseCommand):
+    help = 'Time building "frequently ordered together" neighbours from a synthetic order history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=1_000_000)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--top-k', type=int, default=10)
+        parser.add_argument('--duration', type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            start = time.perf_counter()
+            product_ids = self.seed(options['lines'], options['products'])
+            self.stdout.write(f"Seeded {options['lines']} order lines in {time.perf_counter() - start:.1f}s")
+
+            start = time.perf_counter()
+            products, rows = build_ordered_together(options['top_k'])
+            self.stdout.write(f'Build: {time.perf_counter() - start:.2f}s ({rows} neighbours for {products} products)')
+
+            product_id = product_ids[0]
+
+            def cold():
+                cache.clear()
+                ordered_together(product_id)
+
+            rps = requests_per_second(cold, options['duration'])
+            self.stdout.write(f'Lookup, cold cache: {rps:9.1f}/s')
+            rps = requests_per_second(lambda: ordered_together(product_id), options['duration'])
+            self.stdout.write(f'Lookup, warm cache: {rps:9.1f}/s')
+
+    def seed(self, lines, products):
+        """Orders of 1-7 lines drawn from a window of 40 neighbouring products, so pairs repeat."""
+        user = Account.objects.create_user('Bench', 'User', 'bench', 'bench@example.com', 'x')
+        _, items = seed_catalog(products, reviews_per_product=0)
+        product_ids = [product.id for product in items]
+        rng = random.Random(0)
+        sizes = []
+        remaining = lines
+        while remaining > 0:
+            sizes.append(min(rng.randint(1, 7), remaining))
+            remaining -= sizes[-1]
+        Order.objects.bulk_create([
+            Order(user=user, order_number=str(i), first_name='Bench', last_name='User', phone='999',
+                  email='bench@example.com', address_line_1='1 Street', country='IN', state='KA',
+                  city='Bengaluru', order_total=0, tax=0, is_ordered=True)
+            for i in range(len(sizes))
+        ], batch_size=5000)
+        order_ids = Order.objects.order_by('id').values_list('id', flat=True)
+
+        def order_lines():
+            for order_id, size in zip(order_ids, sizes):
+                base = rng.randrange(products)
+                for offset in rng.sample(range(40), size):
+                    yield OrderProduct(order_id=order_id, user=user, product_id=product_ids[(base + offset) % products],
+                                       quantity=1, product_price=1, ordered=True)
+
+        rows = order_lines()
+        while batch := list(itertools.islice(rows, 10000)):
+            OrderProduct.objects.bulk_create(batch)
+        return product_ids
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from analytics.recommendations import build_ordered_together
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the "frequently ordered together" neighbours from paid order lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=10, help='Neighbours kept per product')
+        parser.add_argument('--min-orders', type=int, default=1,
+                            help='Ignore pairs that appear together in fewer orders than this')
+
+    def handle(self, *args, **options):
+        products, rows = build_ordered_together(options['top_k'], options['min_orders'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {rows} neighbours for {products} products.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from analytics.rankings import rebuild_rankings
+
+
+class Command(BaseCommand):
+    help = 'Recompute best-seller and trending scores from the daily sales rollups and reviews.'
+
+    def handle(self, *args, **options):
+        count = rebuild_rankings()
+        self.stdout.write(self.style.SUCCESS(f'Ranked {count} products.'))
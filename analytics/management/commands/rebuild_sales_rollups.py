@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from analytics.rollups import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily product and category sales rollups from paid orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Last date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ('since', 'until'):
+            if options[name]:
+                dates[name] = parse_date(options[name])
+                if dates[name] is None:
+                    raise CommandError(f'--{name} must be a date like 2025-01-31')
+        counts = rebuild_sales_rollups(**dates)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {counts['DailyProductSales']} product rows and {counts['DailyCategorySales']} category rows."
+        ))
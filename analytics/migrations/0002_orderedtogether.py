@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('store', '0003_delete_variation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderedTogether',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.IntegerField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+            ],
+            options={
+                'verbose_name_plural': 'ordered together',
+                'constraints': [models.UniqueConstraint(fields=('product', 'rank'), name='unique_ordered_together_rank')],
+            },
+        ),
+    ]
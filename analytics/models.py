@@ -0,0 +1,72 @@
+from django.db import models
+from store.models import Product
+from category.models import Category
+
+
+# Daily sales rollups, kept up to date as orders are paid (see rollups.py) so
+# reports never have to scan OrderProduct.
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    units = models.IntegerField(default=0)
+    revenue = models.FloatField(default=0)
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily product sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_daily_product_sales'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.product_id}'
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    units = models.IntegerField(default=0)
+    revenue = models.FloatField(default=0)
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily category sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='unique_daily_category_sales'),
+        ]
+
+    def __str__(self):
+        return f'{self.date} {self.category_id}'
+
+
+class RankingEpoch(models.Model):
+    """The moment trending weights are measured from (see analytics/rankings.py).
+
+    A single row, moved forward as time passes so the weights stay small.
+    """
+    epoch = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.epoch}'
+
+
+class OrderedTogether(models.Model):
+    """Top-K products most often in the same paid order as `product`.
+
+    Rebuilt offline by the build_ordered_together command; `rank` 1 is the
+    strongest neighbour and `orders` is how many orders held both.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        verbose_name_plural = 'ordered together'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_ordered_together_rank'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.related_id}'
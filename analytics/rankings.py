@@ -0,0 +1,158 @@
+"""Best-seller and trending scores stored on Product.
+
+units_sold is the all-time number of units in paid orders. trending_score
+is a forward-decayed sum: each unit sold adds 2 ** (age of the sale since
+the ranking epoch / half-life), and each approved review adds REVIEW_WEIGHT
+per star above or below neutral with the same weight. Older contributions
+therefore shrink relative to new ones without any row being rewritten, so
+scores are updated with a single F() increment when an order is paid and
+product lists sort on an index. Saving or deleting a review applies the
+change in its contribution, so an edited rating, or a review hidden in the
+admin, counts the same as it would after a rebuild.
+
+The weights grow without bound, so the epoch (RankingEpoch, RANKING_EPOCH
+until first moved) is moved forward: rebuild_rankings recomputes every score
+from today, and a sale more than MAX_EPOCH_AGE past the epoch first rescales
+the stored scores to a new one. Weights therefore never pass
+2 ** (MAX_EPOCH_AGE / half-life).
+"""
+import datetime
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from store.models import Product, ReviewRating
+from orders.models import OrderProduct
+from .models import DailyProductSales, RankingEpoch
+
+RANKING_EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+TRENDING_HALF_LIFE = datetime.timedelta(days=7)
+MAX_EPOCH_AGE = 52 * TRENDING_HALF_LIFE
+NEUTRAL_RATING = 2.5
+REVIEW_WEIGHT = 1.0
+
+# Each sort ends on id, so products with equal scores (every new product has
+# 0) keep one order and OFFSET pagination never repeats or skips them
+PRODUCT_SORTS = {
+    'best_selling': ('-units_sold', '-id'),
+    'trending': ('-trending_score', '-id'),
+    'newest': ('-created_date', '-id'),
+}
+
+
+def decay_weight(when, epoch):
+    return 2 ** ((when - epoch) / TRENDING_HALF_LIFE)
+
+
+def _day_start(moment):
+    return datetime.datetime.combine(moment.astimezone(datetime.timezone.utc).date(), datetime.time(),
+                                     datetime.timezone.utc)
+
+
+def ranking_epoch(lock=False):
+    epochs = RankingEpoch.objects.all()
+    if lock:
+        epochs = epochs.select_for_update()
+    return epochs.values_list('epoch', flat=True).first() or RANKING_EPOCH
+
+
+def advance_epoch(new_epoch):
+    """Measure weights from new_epoch on, rescaling the stored trending scores to match."""
+    with transaction.atomic():
+        epoch = ranking_epoch(lock=True)
+        if new_epoch <= epoch:
+            return epoch
+        Product.objects.update(trending_score=F('trending_score') * decay_weight(epoch, new_epoch))
+        RankingEpoch.objects.update_or_create(pk=1, defaults={'epoch': new_epoch})
+    return new_epoch
+
+
+def _epoch_for(when):
+    """The epoch to weight a contribution made at `when` against; call inside a transaction."""
+    # Locked, so a concurrent advance can't rescale between reading it and the increment
+    epoch = ranking_epoch(lock=True)
+    if when - epoch > MAX_EPOCH_AGE:
+        epoch = advance_epoch(_day_start(when))
+    return epoch
+
+
+def record_order_rankings(order):
+    units = OrderProduct.objects.filter(order=order).order_by().values('product_id').annotate(units=Sum('quantity'))
+    with transaction.atomic():
+        weight = decay_weight(order.created_at, _epoch_for(order.created_at))
+        for line in units:
+            Product.objects.filter(id=line['product_id']).update(
+                units_sold=F('units_sold') + line['units'],
+                trending_score=F('trending_score') + line['units'] * weight,
+            )
+
+
+def review_score(rating, approved):
+    """A review's contribution before decay; hidden reviews count for nothing."""
+    return REVIEW_WEIGHT * (rating - NEUTRAL_RATING) if approved else 0
+
+
+def record_review_rankings(review, previous_score=0, score=None):
+    """Move the product's trending score from the review's previous_score to `score` (its current one)."""
+    if score is None:
+        score = review_score(review.rating, review.status)
+    if score == previous_score:
+        return
+    with transaction.atomic():
+        weight = decay_weight(review.created_at, _epoch_for(review.created_at))
+        Product.objects.filter(id=review.product_id).update(
+            trending_score=F('trending_score') + (score - previous_score) * weight,
+        )
+
+
+@receiver(pre_save, sender=ReviewRating)
+def remember_review_score(sender, instance, **kwargs):
+    old = ReviewRating.objects.filter(pk=instance.pk).values_list('rating', 'status').first() \
+        if instance.pk is not None else None
+    instance._ranking_score = review_score(*old) if old else 0
+
+
+@receiver(post_save, sender=ReviewRating)
+def review_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_review_rankings(instance, instance._ranking_score)
+
+
+@receiver(post_delete, sender=ReviewRating)
+def review_deleted(sender, instance, **kwargs):
+    record_review_rankings(instance, review_score(instance.rating, instance.status), score=0)
+
+
+def rebuild_rankings(batch_size=1000):
+    """Recompute every product's scores from the daily sales rollups and approved reviews.
+
+    Sales are weighted by their day rather than the exact order time. The
+    epoch moves to the start of today, renormalizing every score.
+    """
+    epoch = _day_start(timezone.now())
+    units_sold = Counter()
+    trending = Counter()
+    day_weights = {}
+    for date, product_id, units in DailyProductSales.objects.values_list('date', 'product_id', 'units').iterator():
+        if date not in day_weights:
+            day_weights[date] = decay_weight(datetime.datetime.combine(date, datetime.time(12), epoch.tzinfo), epoch)
+        units_sold[product_id] += units
+        trending[product_id] += units * day_weights[date]
+    reviews = ReviewRating.objects.filter(status=True).values_list('product_id', 'rating', 'created_at')
+    for product_id, rating, created_at in reviews.iterator():
+        trending[product_id] += REVIEW_WEIGHT * (rating - NEUTRAL_RATING) * decay_weight(created_at, epoch)
+
+    products = [
+        Product(id=product_id, units_sold=units_sold[product_id], trending_score=trending[product_id])
+        for product_id in trending
+    ]
+    with transaction.atomic():
+        ranking_epoch(lock=True)
+        RankingEpoch.objects.update_or_create(pk=1, defaults={'epoch': epoch})
+        Product.objects.update(units_sold=0, trending_score=0)
+        Product.objects.bulk_update(products, ['units_sold', 'trending_score'], batch_size=batch_size)
+    return len(products)
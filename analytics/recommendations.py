@@ -0,0 +1,135 @@
+""""Frequently ordered together" neighbours, built offline from paid order lines.
+
+build_ordered_together() streams (order, product) pairs sorted by order,
+counts every pair of distinct products per order in a Counter and keeps the
+top K neighbours of each product in OrderedTogether. Pages read them with
+ordered_together() / ordered_together_for_cart(). The neighbour ids and
+counts are cached until the next build (one indexed query on a miss); the
+products themselves are loaded fresh in one query per call, so price, name
+and availability are always current.
+"""
+import heapq
+import itertools
+import time
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from orders.models import ArchivedOrderProduct, OrderProduct
+from store.models import Product
+from .models import OrderedTogether
+
+ORDERED_TOGETHER_CACHE_TIMEOUT = 60 * 60
+ORDERED_TOGETHER_VERSION_KEY = 'ordered_together_version'
+
+
+def ordered_together_version():
+    version = cache.get(ORDERED_TOGETHER_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(ORDERED_TOGETHER_VERSION_KEY, version, None)
+        version = cache.get(ORDERED_TOGETHER_VERSION_KEY, version)
+    return version
+
+
+def count_pairs(order_lines):
+    """Count how many orders hold each (product, other product) pair.
+
+    order_lines yields (order_id, product_id) sorted by order_id.
+    """
+    counts = Counter()
+    for _, lines in itertools.groupby(order_lines, key=lambda line: line[0]):
+        product_ids = sorted({product_id for _, product_id in lines})
+        if len(product_ids) > 1:
+            counts.update(itertools.permutations(product_ids, 2))
+    return counts
+
+
+def top_neighbours(counts, top_k, min_orders=1):
+    """{product_id: [(related_id, orders), ...]} strongest first, ties by id."""
+    candidates = defaultdict(list)
+    for (product_id, related_id), orders in counts.items():
+        if orders >= min_orders:
+            candidates[product_id].append((-orders, related_id))
+    return {
+        product_id: [(related_id, -negative) for negative, related_id in heapq.nsmallest(top_k, pairs)]
+        for product_id, pairs in candidates.items()
+    }
+
+
+def build_ordered_together(top_k=10, min_orders=1, chunk_size=10000):
+    # Each order is wholly in the hot or the archive table, so the two sorted streams can be chained
+    lines = itertools.chain.from_iterable(
+        line_model.objects.filter(order__is_ordered=True).order_by('order_id')
+        .values_list('order_id', 'product_id').iterator(chunk_size=chunk_size)
+        for line_model in (OrderProduct, ArchivedOrderProduct)
+    )
+    neighbours = top_neighbours(count_pairs(lines), top_k, min_orders)
+
+    rows = (
+        OrderedTogether(product_id=product_id, related_id=related_id, orders=orders, rank=rank)
+        for product_id, related in neighbours.items()
+        for rank, (related_id, orders) in enumerate(related, 1)
+    )
+    created = 0
+    with transaction.atomic():
+        OrderedTogether.objects.all().delete()
+        while True:
+            batch = list(itertools.islice(rows, chunk_size))
+            if not batch:
+                break
+            OrderedTogether.objects.bulk_create(batch)
+            created += len(batch)
+    cache.set(ORDERED_TOGETHER_VERSION_KEY, time.time_ns(), None)
+    return len(neighbours), created
+
+
+def _neighbour_key(product_id):
+    return f'ordered_together:{product_id}'
+
+
+def _neighbours(product_ids):
+    """{product_id: [(related_id, orders), ...]} from the cache, loading misses in one query."""
+    version = ordered_together_version()
+    keys = {_neighbour_key(product_id): product_id for product_id in product_ids}
+    cached = cache.get_many(keys, version=version)
+    found = {keys[key]: value for key, value in cached.items()}
+    missing = [product_id for product_id in product_ids if product_id not in found]
+    if missing:
+        loaded = {product_id: [] for product_id in missing}
+        rows = OrderedTogether.objects.filter(product_id__in=missing).order_by('product_id', 'rank') \
+            .values_list('product_id', 'related_id', 'orders')
+        for product_id, related_id, orders in rows:
+            loaded[product_id].append((related_id, orders))
+        cache.set_many({_neighbour_key(product_id): value for product_id, value in loaded.items()},
+                       ORDERED_TOGETHER_CACHE_TIMEOUT, version=version)
+        found.update(loaded)
+    return found
+
+
+def _available_products(product_ids):
+    if not product_ids:
+        return {}
+    return Product.objects.filter(id__in=product_ids, is_available=True).select_related('category').in_bulk()
+
+
+def ordered_together(product_id, limit=4):
+    related_ids = [related_id for related_id, _ in _neighbours([product_id])[product_id]]
+    products = _available_products(related_ids)
+    return [products[related_id] for related_id in related_ids if related_id in products][:limit]
+
+
+def ordered_together_for_cart(product_ids, limit=4):
+    """Neighbours of everything in the cart, ranked by their combined order counts."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return []
+    scores = Counter()
+    for related in _neighbours(sorted(product_ids)).values():
+        for related_id, orders in related:
+            if related_id not in product_ids:
+                scores[related_id] += orders
+    products = _available_products(list(scores))
+    ranked = sorted(products, key=lambda product_id: (-scores[product_id], product_id))
+    return [products[product_id] for product_id in ranked[:limit]]
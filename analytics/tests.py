@@ -0,0 +1,234 @@
+import datetime
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Account
+from carts.models import CartItem
+from orders.models import Order
+from orders.tests import make_order
+from store.benchmarks import seed_catalog
+from store.models import Product, ReviewRating
+from .models import DailyCategorySales, DailyProductSales, OrderedTogether
+from .rankings import RANKING_EPOCH, decay_weight, ranking_epoch, record_order_rankings, review_score
+from .recommendations import build_ordered_together, ordered_together, ordered_together_for_cart
+from .rollups import record_order_sales
+
+
+def paid_order(user, lines, created_at):
+    order = make_order(user, lines, created_at=created_at)
+    order.refresh_from_db()
+    record_order_sales(order)
+    return order
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('Ana', 'Lytics', 'ana', 'ana@example.com', 'x')
+        cls.categories, cls.products = seed_catalog(products=3, categories=1, reviews_per_product=0)
+        cls.day = timezone.make_aware(datetime.datetime(2025, 1, 15, 12))
+
+    def test_record_order_sales_accumulates(self):
+        p1, p2, _ = self.products
+        paid_order(self.user, [(p1, 2), (p2, 1)], self.day)
+        paid_order(self.user, [(p1, 1)], self.day)
+
+        row = DailyProductSales.objects.get(product=p1)
+        self.assertEqual((row.date, row.units, row.orders), (datetime.date(2025, 1, 15), 3, 2))
+        self.assertEqual(row.revenue, 3 * p1.price)
+        category = DailyCategorySales.objects.get()
+        self.assertEqual((category.units, category.orders), (4, 2))
+        self.assertEqual(category.revenue, 3 * p1.price + p2.price)
+
+    def test_rebuild_matches_incremental(self):
+        p1, p2, p3 = self.products
+        for lines in ([(p1, 2), (p2, 1)], [(p1, 1), (p3, 4)]):
+            paid_order(self.user, lines, self.day)
+        make_order(self.user, [(p2, 5)], is_ordered=False, created_at=self.day)
+        incremental = list(DailyProductSales.objects.order_by('product_id').values_list('product_id', 'units', 'revenue', 'orders'))
+
+        call_command('rebuild_sales_rollups', since='2025-01-01', until='2025-01-31', stdout=StringIO())
+        rebuilt = list(DailyProductSales.objects.order_by('product_id').values_list('product_id', 'units', 'revenue', 'orders'))
+        self.assertEqual(rebuilt, incremental)
+        self.assertEqual(DailyCategorySales.objects.get().orders, 2)
+
+    def test_dashboard_reads_rollups(self):
+        p1 = self.products[0]
+        paid_order(self.user, [(p1, 2)], self.day)
+        url = reverse('sales_dashboard') + '?since=2025-01-01&until=2025-01-31'
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        staff = Account.objects.create_superuser('Staff', 'User', 'staff', 'staff@example.com', 'x')
+        self.client.force_login(staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse(any('orders_orderproduct' in q['sql'] for q in queries.captured_queries))
+        self.assertContains(response, p1.product_name)
+        self.assertEqual(response.context['totals']['units'], 2)
+
+
+class OrderedTogetherTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('Ana', 'Lytics', 'ana', 'ana@example.com', 'x')
+        cls.user.is_active = True
+        cls.user.save()
+        cls.categories, cls.products = seed_catalog(products=4, categories=1, reviews_per_product=0)
+        p0, p1, p2, p3 = cls.products
+        make_order(cls.user, [(p0, 1), (p1, 2)])
+        make_order(cls.user, [(p0, 1), (p1, 1), (p2, 1)])
+        make_order(cls.user, [(p1, 1), (p2, 1)])
+        make_order(cls.user, [(p0, 1), (p3, 1)], is_ordered=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_build_keeps_top_k_neighbours(self):
+        p0, p1, p2, p3 = self.products
+        call_command('build_ordered_together', top_k=1, stdout=StringIO())
+        rows = set(OrderedTogether.objects.values_list('product_id', 'related_id', 'orders', 'rank'))
+        self.assertEqual(rows, {(p0.id, p1.id, 2, 1), (p1.id, p0.id, 2, 1), (p2.id, p1.id, 2, 1)})
+
+    def test_neighbours_are_cached_and_products_loaded_fresh(self):
+        p0, p1, p2, _ = self.products
+        build_ordered_together()
+        with self.assertNumQueries(2):
+            self.assertEqual(ordered_together(p0.id), [p1, p2])
+        with self.assertNumQueries(1):
+            ordered_together(p0.id)
+        self.assertEqual(ordered_together_for_cart([p0.id, p1.id]), [p2])
+
+        Product.objects.filter(id=p1.id).update(price=999)
+        Product.objects.filter(id=p2.id).update(is_available=False)
+        related = ordered_together(p0.id)
+        self.assertEqual(related, [p1])
+        self.assertEqual(related[0].price, 999)
+        self.assertEqual(ordered_together_for_cart([p0.id, p1.id]), [])
+
+    def test_rebuild_replaces_cached_neighbours(self):
+        p0, p1, p2, p3 = self.products
+        build_ordered_together()
+        self.assertEqual(ordered_together(p3.id), [])
+        Order.objects.filter(is_ordered=False).update(is_ordered=True)
+        build_ordered_together()
+        self.assertEqual(ordered_together(p3.id), [p0])
+
+    def test_pages_show_neighbours(self):
+        p0, p1, p2, _ = self.products
+        build_ordered_together()
+        response = self.client.get(p0.get_url())
+        self.assertEqual(response.context['ordered_together'], [p1, p2])
+
+        self.client.force_login(self.user)
+        CartItem.objects.create(user=self.user, product=p2, quantity=1)
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['ordered_together'], [p1, p0])
+
+
+class RankingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('Ana', 'Lytics', 'ana', 'ana@example.com', 'x')
+        cls.categories, cls.products = seed_catalog(products=3, categories=1, reviews_per_product=0)
+
+    def sell(self, lines, days_ago):
+        order = paid_order(self.user, lines, timezone.now() - datetime.timedelta(days=days_ago))
+        record_order_rankings(order)
+
+    def test_recent_sales_trend_above_older_best_sellers(self):
+        p0, p1, p2 = self.products
+        self.sell([(p0, 3)], days_ago=30)
+        self.sell([(p1, 1)], days_ago=0)
+
+        self.assertEqual(Product.objects.get(id=p0.id).units_sold, 3)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(list(response.context['products'])[:2], [p1, p0])
+        response = self.client.get(reverse('store') + '?sort=best_selling')
+        self.assertEqual(list(response.context['products']), [p0, p1, p2])
+        self.assertEqual([o['label'] for o in response.context['sort_options'] if o['selected']], ['Best selling'])
+
+    def test_reviews_move_trending(self):
+        p0, p1, _ = self.products
+        ReviewRating.objects.create(product=p0, user=self.user, rating=5)
+        ReviewRating.objects.create(product=p1, user=self.user, rating=1)
+        self.assertGreater(Product.objects.get(id=p0.id).trending_score, 0)
+        self.assertLess(Product.objects.get(id=p1.id).trending_score, 0)
+
+    def test_edited_hidden_and_deleted_reviews_match_a_rebuild(self):
+        p0, _, _ = self.products
+        self.user.is_active = True
+        self.user.save()
+        self.client.force_login(self.user)
+        url = reverse('submit_review', args=[p0.id])
+        self.client.post(url, {'subject': 'Meh', 'rating': 1, 'review': ''}, HTTP_REFERER='/')
+        self.client.post(url, {'subject': 'Great', 'rating': 5, 'review': ''}, HTTP_REFERER='/')
+
+        def matches_rebuild():
+            incremental = Product.objects.get(id=p0.id).trending_score
+            rebuilt = decay_weight(ReviewRating.objects.get(product=p0).created_at, ranking_epoch()) * \
+                review_score(*ReviewRating.objects.filter(product=p0).values_list('rating', 'status').get())
+            self.assertAlmostEqual(incremental, rebuilt)
+
+        matches_rebuild()
+        review = ReviewRating.objects.get(product=p0)
+        self.assertEqual(review.rating, 5)
+        review.status = False
+        review.save()
+        matches_rebuild()
+        self.assertEqual(Product.objects.get(id=p0.id).trending_score, 0)
+        review.status = True
+        review.save()
+        review.delete()
+        self.assertAlmostEqual(Product.objects.get(id=p0.id).trending_score, 0)
+
+    def test_rebuild_matches_incremental_order(self):
+        p0, p1, p2 = self.products
+        self.sell([(p0, 3), (p2, 1)], days_ago=30)
+        self.sell([(p1, 1), (p2, 1)], days_ago=1)
+        incremental = list(Product.objects.order_by('-trending_score').values_list('id', 'units_sold'))
+
+        Product.objects.update(units_sold=0, trending_score=0)
+        call_command('rebuild_rankings', stdout=StringIO())
+        self.assertEqual(list(Product.objects.order_by('-trending_score').values_list('id', 'units_sold')), incremental)
+        # Rebuilding renormalizes to today, so today's weights are around 1
+        self.assertEqual(ranking_epoch().date(), timezone.now().date())
+        self.assertLess(Product.objects.get(id=p1.id).trending_score, 4)
+
+    def test_distant_sales_advance_the_epoch_instead_of_overflowing(self):
+        p0, p1, _ = self.products
+        self.sell([(p0, 3)], days_ago=1)
+        # 2 ** (40 years / 7 days) is far beyond a float
+        distant = RANKING_EPOCH + datetime.timedelta(days=365 * 40)
+        record_order_rankings(paid_order(self.user, [(p1, 1)], distant))
+        self.assertGreater(ranking_epoch(), distant - datetime.timedelta(days=1))
+        self.assertEqual(Product.objects.get(id=p1.id).trending_score, 1)
+        self.assertLess(Product.objects.get(id=p0.id).trending_score, 1)
+
+
+class RankingPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories, cls.products = seed_catalog(products=7, categories=1, reviews_per_product=0)
+        # Every product tied on every sort
+        Product.objects.update(units_sold=0, trending_score=0, created_date=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tied_products_page_without_repeats_or_gaps(self):
+        expected = sorted((product.id for product in self.products), reverse=True)
+        for sort in ('best_selling', 'trending', 'newest'):
+            seen = []
+            for page in (1, 2, 3):
+                response = self.client.get(reverse('store'), {'sort': sort, 'page': page})
+                seen += [product.id for product in response.context['products']]
+            self.assertEqual(seen, expected, sort)
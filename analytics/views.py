@@ -0,0 +1,39 @@
+import datetime
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db.models import Sum
+from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import DailyCategorySales, DailyProductSales
+
+DEFAULT_DAYS = 30
+
+
+@staff_member_required
+def sales_dashboard(request):
+    until = parse_date(request.GET.get('until') or '') or timezone.localdate()
+    since = parse_date(request.GET.get('since') or '') or until - datetime.timedelta(days=DEFAULT_DAYS - 1)
+
+    # Only the rollup tables are read here, never OrderProduct
+    products = DailyProductSales.objects.filter(date__range=(since, until))
+    categories = DailyCategorySales.objects.filter(date__range=(since, until))
+    daily = categories.values('date').annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('date')
+    top_products = products.values('product__product_name').annotate(
+        units=Sum('units'), revenue=Sum('revenue'), orders=Sum('orders'),
+    ).order_by('-revenue')[:20]
+    top_categories = categories.values('category__category_name').annotate(
+        units=Sum('units'), revenue=Sum('revenue'), orders=Sum('orders'),
+    ).order_by('-revenue')
+    totals = categories.aggregate(units=Sum('units'), revenue=Sum('revenue'))
+
+    context = {
+        'since': since,
+        'until': until,
+        'daily': daily,
+        'top_products': top_products,
+        'top_categories': top_categories,
+        'totals': totals,
+    }
+    return render(request, 'analytics/dashboard.html', context)
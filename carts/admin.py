@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, CartItem
+from .models import Cart, CartItem, cart_item_owners, forget_cart_owners
 # Register your models here.
 
 class CartAdmin(admin.ModelAdmin):
@@ -8,5 +8,16 @@ class CartAdmin(admin.ModelAdmin):
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ('product', 'cart', 'quantity', 'is_active')
 
+    # Saves forget the cached cart maps through post_save; deletes don't
+    def delete_model(self, request, obj):
+        owners = cart_item_owners(CartItem.objects.filter(pk=obj.pk))
+        super().delete_model(request, obj)
+        forget_cart_owners(owners)
+
+    def delete_queryset(self, request, queryset):
+        owners = cart_item_owners(queryset)
+        super().delete_queryset(request, queryset)
+        forget_cart_owners(owners)
+
 admin.site.register(Cart, CartAdmin)
 admin.site.register(CartItem, CartItemAdmin)
@@ -0,0 +1,160 @@
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from mohifoodspro.ratelimit import rate_limit
+from store.models import Product
+from .guest_cart import GUEST_CART_FULL_MESSAGE, guest_cart_is_full, read_guest_cart, uses_cookie_cart, write_guest_cart
+from .models import Cart, CartItem, forget_cart_products, upsert_cart_items
+from .views import _cart_id
+
+
+def _owner(request):
+    """Filter kwargs selecting the current visitor's CartItem rows."""
+    if request.user.is_authenticated:
+        return {'user': request.user}
+    cart, _ = Cart.objects.get_or_create(cart_id=_cart_id(request))
+    return {'cart': cart}
+
+
+def _forget(owner):
+    if 'user' in owner:
+        forget_cart_products(user_id=owner['user'].id)
+    else:
+        forget_cart_products(cart_id=owner['cart'].cart_id)
+
+
+def _summary(lines):
+    """Cart totals from (product_id, quantity, price) rows, computed like the cart page."""
+    items = []
+    total = 0
+    quantity = 0
+    for product_id, qty, price in lines:
+        items.append({'product_id': product_id, 'quantity': qty, 'price': price, 'sub_total': price * qty})
+        total += price * qty
+        quantity += qty
+    tax = (2 * total) / 100
+    return {
+        'items': items,
+        'quantity': quantity,
+        'total': total,
+        'tax': tax,
+        'grand_total': total + tax,
+    }
+
+
+def _respond(request, owner=None, quantities=None, status=200):
+    if quantities is not None:
+        prices = dict(Product.objects.filter(id__in=quantities).values_list('id', 'price'))
+        lines = [(p, q, prices[p]) for p, q in quantities.items() if p in prices]
+        response = JsonResponse(_summary(lines), status=status)
+        write_guest_cart(response, quantities)
+        return response
+    rows = CartItem.objects.filter(is_active=True, **owner).order_by('id') \
+        .values_list('product_id', 'quantity', 'product__price')
+    return JsonResponse(_summary(rows), status=status)
+
+
+def _not_found():
+    return JsonResponse({'error': 'Product not found'}, status=404)
+
+
+def _cart_full():
+    return JsonResponse({'error': GUEST_CART_FULL_MESSAGE}, status=400)
+
+
+@require_POST
+@rate_limit('cart')
+def add_item(request, product_id):
+    if uses_cookie_cart(request):
+        quantities = read_guest_cart(request)
+        if product_id not in quantities and not Product.objects.filter(id=product_id).exists():
+            return _not_found()
+        if guest_cart_is_full(quantities, [product_id]):
+            return _cart_full()
+        quantities[product_id] = quantities.get(product_id, 0) + 1
+        return _respond(request, quantities=quantities)
+
+    owner = _owner(request)
+    items = CartItem.objects.filter(product_id=product_id, **owner)
+    if not items.update(quantity=F('quantity') + 1):
+        if not Product.objects.filter(id=product_id).exists():
+            return _not_found()
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(product_id=product_id, quantity=1, **owner)
+        except IntegrityError:
+            # Another request inserted the row first
+            items.update(quantity=F('quantity') + 1)
+    _forget(owner)
+    return _respond(request, owner)
+
+
+@require_POST
+def remove_item(request, product_id):
+    """Take one unit off, deleting the line when it reaches zero."""
+    if uses_cookie_cart(request):
+        quantities = read_guest_cart(request)
+        if quantities.get(product_id, 0) > 1:
+            quantities[product_id] -= 1
+        else:
+            quantities.pop(product_id, None)
+        return _respond(request, quantities=quantities)
+
+    owner = _owner(request)
+    items = CartItem.objects.filter(product_id=product_id, **owner)
+    with transaction.atomic():
+        if not items.filter(quantity__gt=1).update(quantity=F('quantity') - 1):
+            items.delete()
+    _forget(owner)
+    return _respond(request, owner)
+
+
+@require_POST
+def delete_item(request, product_id):
+    if uses_cookie_cart(request):
+        quantities = read_guest_cart(request)
+        quantities.pop(product_id, None)
+        return _respond(request, quantities=quantities)
+
+    owner = _owner(request)
+    CartItem.objects.filter(product_id=product_id, **owner).delete()
+    _forget(owner)
+    return _respond(request, owner)
+
+
+@require_POST
+def set_quantities(request):
+    """Set several quantities at once from {"items": {"<product_id>": quantity, ...}}.
+
+    A quantity of 0 removes the product from the cart.
+    """
+    try:
+        body = json.loads(request.body)
+        wanted = {int(product_id): int(quantity) for product_id, quantity in body['items'].items()}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Expected {"items": {"<product_id>": <quantity>}}'}, status=400)
+
+    positive = {p: q for p, q in wanted.items() if q > 0}
+    removed = [p for p, q in wanted.items() if q <= 0]
+
+    if uses_cookie_cart(request):
+        quantities = read_guest_cart(request)
+        for product_id in removed:
+            quantities.pop(product_id, None)
+        known = set(Product.objects.filter(id__in=positive).values_list('id', flat=True))
+        if guest_cart_is_full(quantities, known):
+            return _cart_full()
+        quantities.update({p: q for p, q in positive.items() if p in known})
+        return _respond(request, quantities=quantities)
+
+    owner = _owner(request)
+    with transaction.atomic():
+        if removed:
+            CartItem.objects.filter(product_id__in=removed, **owner).delete()
+        upsert_cart_items(positive, **owner)
+    _forget(owner)
+    return _respond(request, owner)
@@ -1,20 +1,17 @@
-from .models import Cart, CartItem
-from .views import _cart_id
+from .models import cart_quantities
+from .guest_cart import guest_cart_quantities
 
 
 def counter(request):
     cart_count = 0
     if 'admin' in request.path:
         return {}
+    elif hasattr(request, 'cart_count'):
+        # Already counted by an async view (see store.async_views.arender)
+        cart_count = request.cart_count
     else:
-        try:
-            cart = Cart.objects.filter(cart_id=_cart_id(request))
-            if request.user.is_authenticated:
-                cart_items = CartItem.objects.all().filter(user=request.user)
-            else:
-                cart_items = CartItem.objects.all().filter(cart=cart[:1])
-            for cart_item in cart_items:
-                cart_count += cart_item.quantity
-        except Cart.DoesNotExist:
-            cart_count = 0
+        if request.user.is_authenticated:
+            cart_count = sum(cart_quantities(user_id=request.user.id).values())
+        else:
+            cart_count = sum(guest_cart_quantities(request).values())
     return dict(cart_count=cart_count)
@@ -0,0 +1,83 @@
+"""Guest carts kept in a signed cookie instead of Cart/CartItem rows.
+
+With GUEST_CART_STORAGE = 'cookie' an anonymous visitor's cart is a compact
+"product_id:quantity|..." string signed with the project SECRET_KEY. Nothing
+is written to the database until the visitor logs in, when the cookie is
+merged into the user's CartItem rows.
+"""
+from django.conf import settings
+from django.core import signing
+
+from .models import acart_quantities, cart_quantities
+
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_SALT = 'carts.guest_cart'
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 30
+# Keeps the cookie comfortably below the 4 KB browser limit
+GUEST_CART_MAX_ITEMS = 100
+GUEST_CART_FULL_MESSAGE = (
+    f'Your cart can hold up to {GUEST_CART_MAX_ITEMS} different products. '
+    'Log in to add more, or remove something first.'
+)
+
+
+def uses_cookie_cart(request):
+    return settings.GUEST_CART_STORAGE == 'cookie' and not request.user.is_authenticated
+
+
+def read_guest_cart(request):
+    try:
+        raw = request.get_signed_cookie(GUEST_CART_COOKIE, default='', salt=GUEST_CART_SALT)
+    except signing.BadSignature:
+        return {}
+    quantities = {}
+    for entry in raw.split('|') if raw else ():
+        try:
+            product_id, quantity = entry.split(':')
+            product_id, quantity = int(product_id), int(quantity)
+        except ValueError:
+            return {}
+        if quantity > 0:
+            quantities[product_id] = quantity
+    return quantities
+
+
+def guest_cart_is_full(quantities, product_ids):
+    """Whether adding `product_ids` would take the cookie cart past GUEST_CART_MAX_ITEMS products."""
+    return len(quantities.keys() | set(product_ids)) > GUEST_CART_MAX_ITEMS
+
+
+def write_guest_cart(response, quantities):
+    if not quantities:
+        clear_guest_cart(response)
+        return
+    value = '|'.join(
+        f'{product_id}:{quantity}'
+        for product_id, quantity in list(quantities.items())[:GUEST_CART_MAX_ITEMS]
+        if quantity > 0
+    )
+    response.set_signed_cookie(
+        GUEST_CART_COOKIE, value, salt=GUEST_CART_SALT,
+        max_age=GUEST_CART_MAX_AGE, httponly=True, samesite='Lax',
+    )
+
+
+def clear_guest_cart(response):
+    response.delete_cookie(GUEST_CART_COOKIE, samesite='Lax')
+
+
+def guest_cart_quantities(request):
+    """{product_id: quantity} for an anonymous visitor, whichever storage is in use."""
+    if settings.GUEST_CART_STORAGE == 'cookie':
+        return read_guest_cart(request)
+    if request.session.session_key:
+        return cart_quantities(cart_id=request.session.session_key)
+    return {}
+
+
+async def aguest_cart_quantities(request):
+    if settings.GUEST_CART_STORAGE == 'cookie':
+        return read_guest_cart(request)
+    if request.session.session_key:
+        return await acart_quantities(cart_id=request.session.session_key)
+    return {}
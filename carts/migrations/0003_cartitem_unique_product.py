@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:19
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """Fold duplicate (owner, product) rows into one before adding the constraints."""
+    CartItem = apps.get_model('carts', 'CartItem')
+    for owner in ('user', 'cart'):
+        duplicates = CartItem.objects.filter(**{f'{owner}__isnull': False}) \
+            .values(owner, 'product').annotate(rows=Count('id'), keep=Min('id'), total=Sum('quantity')) \
+            .filter(rows__gt=1)
+        for group in duplicates:
+            CartItem.objects.filter(id=group['keep']).update(quantity=group['total'])
+            CartItem.objects.filter(**{owner: group[owner], 'product': group['product']}) \
+                .exclude(id=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0002_remove_cartitem_variations'),
+        ('store', '0003_delete_variation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user', 'product'), name='unique_user_cart_product'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('cart__isnull', False)), fields=('cart', 'product'), name='unique_guest_cart_product'),
+        ),
+    ]
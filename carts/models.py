@@ -1,4 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from django.core.cache import cache
 from store.models import Product
 from accounts.models import Account
 
@@ -7,7 +11,7 @@ from accounts.models import Account
 
 class Cart(models.Model):
     cart_id = models.CharField(max_length=250, blank=True)
-    date_added = models.DateField(auto_now_add=True)
+    date_added = models.DateField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         return self.cart_id
@@ -20,8 +24,154 @@ class CartItem(models.Model):
     quantity = models.IntegerField()
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'product'], condition=models.Q(user__isnull=False),
+                name='unique_user_cart_product',
+            ),
+            models.UniqueConstraint(
+                fields=['cart', 'product'], condition=models.Q(cart__isnull=False),
+                name='unique_guest_cart_product',
+            ),
+        ]
+
     def sub_total(self):
         return self.product.price * self.quantity
 
     def __unicode__(self):
         return self.product
+
+
+# A {product_id: quantity} map of each cart is cached per user or per guest
+# session, so product_detail ("already in cart?") and the navbar badge can be
+# answered without a query. Saving a CartItem (including in the admin) and
+# deleting a Product forget the affected maps. There are no CartItem delete
+# receivers, so that bulk deletes stay a single query; code that deletes or
+# bulk-updates cart items calls forget_cart_products() itself.
+def cart_products_key(user_id=None, cart_id=None):
+    if user_id:
+        return f'cart_products:user:{user_id}'
+    return f'cart_products:session:{cart_id}'
+
+
+def cart_quantities(user_id=None, cart_id=None):
+    key = cart_products_key(user_id, cart_id)
+    quantities = cache.get(key)
+    if quantities is None:
+        if user_id:
+            items = CartItem.objects.filter(user_id=user_id)
+        else:
+            items = CartItem.objects.filter(cart__cart_id=cart_id)
+        quantities = {}
+        for product_id, quantity in items.values_list('product_id', 'quantity'):
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        cache.set(key, quantities)
+    return quantities
+
+
+async def acart_quantities(user_id=None, cart_id=None):
+    key = cart_products_key(user_id, cart_id)
+    quantities = await cache.aget(key)
+    if quantities is None:
+        if user_id:
+            items = CartItem.objects.filter(user_id=user_id)
+        else:
+            items = CartItem.objects.filter(cart__cart_id=cart_id)
+        quantities = {}
+        async for product_id, quantity in items.values_list('product_id', 'quantity'):
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        await cache.aset(key, quantities)
+    return quantities
+
+
+def forget_cart_products(user_id=None, cart_id=None):
+    cache.delete(cart_products_key(user_id, cart_id))
+
+
+def cart_item_owners(items):
+    """(user_id, cart_id) of every cart holding one of `items` (a CartItem queryset)."""
+    return list(items.values_list('user_id', 'cart__cart_id').distinct())
+
+
+def forget_cart_owners(owners):
+    for user_id, cart_id in owners:
+        forget_cart_products(user_id=user_id, cart_id=cart_id)
+
+
+@receiver(post_save, sender=CartItem)
+def cart_item_saved(sender, instance, **kwargs):
+    if instance.user_id:
+        forget_cart_products(user_id=instance.user_id)
+    if instance.cart_id:
+        if CartItem.cart.is_cached(instance):
+            cart_id = instance.cart.cart_id
+        else:
+            cart_id = Cart.objects.filter(id=instance.cart_id).values_list('cart_id', flat=True).first()
+        forget_cart_products(cart_id=cart_id)
+
+
+@receiver(pre_delete, sender=Product)
+def forget_carts_holding_product(sender, instance, **kwargs):
+    # The cascade deletes the items; forget once that has committed, or a
+    # request in between could cache them again
+    owners = cart_item_owners(CartItem.objects.filter(product=instance))
+    transaction.on_commit(lambda: forget_cart_owners(owners))
+
+
+def merge_guest_cart(cart_id, user):
+    """Move a guest cart into the user's cart with a fixed number of queries.
+
+    Quantities of products already in the user's cart are summed, the other
+    guest rows are handed over to the user, and the guest Cart is deleted.
+    """
+    if not cart_id:
+        return
+    with transaction.atomic():
+        cart = Cart.objects.filter(cart_id=cart_id).first()
+        if cart is None:
+            return
+        guest_items = CartItem.objects.filter(cart=cart)
+        guest_totals = guest_items.filter(product_id=OuterRef('product_id')) \
+            .values('product_id').annotate(total=Sum('quantity')).values('total')
+        user_product_ids = CartItem.objects.filter(user=user).values('product_id')
+
+        CartItem.objects.filter(user=user, product_id__in=guest_items.values('product_id')) \
+            .update(quantity=F('quantity') + Subquery(guest_totals))
+        guest_items.filter(product_id__in=user_product_ids).delete()
+        guest_items.update(user=user, cart=None)
+        cart.delete()
+    forget_cart_products(cart_id=cart_id)
+    forget_cart_products(user_id=user.id)
+
+
+def upsert_cart_items(quantities, increment=False, **owner):
+    """Add to (increment=True) or set the quantities of one cart's items.
+
+    `quantities` maps product ids to positive quantities and `owner` is
+    user=... or cart=... . Products already in the cart get one CASE UPDATE,
+    the rest one bulk insert; unknown product ids are skipped.
+    """
+    if not quantities:
+        return
+    with transaction.atomic():
+        existing = CartItem.objects.filter(product_id__in=quantities, **owner)
+        existing_ids = set(existing.values_list('product_id', flat=True))
+        if existing_ids:
+            new_quantity = Case(
+                *[When(product_id=product_id, then=Value(quantities[product_id])) for product_id in existing_ids],
+                default=Value(0),
+            )
+            existing.update(quantity=F('quantity') + new_quantity if increment else new_quantity)
+        new_ids = Product.objects.filter(id__in=[p for p in quantities if p not in existing_ids]) \
+            .values_list('id', flat=True)
+        CartItem.objects.bulk_create([
+            CartItem(product_id=product_id, quantity=quantities[product_id], **owner)
+            for product_id in new_ids
+        ])
+
+
+def merge_cart_quantities(quantities, user):
+    """Add a {product_id: quantity} map (e.g. a cookie guest cart) to the user's cart."""
+    upsert_cart_items(quantities, increment=True, user=user)
+    forget_cart_products(user_id=user.id)
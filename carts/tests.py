@@ -1,3 +1,221 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import AdminSite
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+
+from accounts.models import Account
+from store.benchmarks import seed_catalog
+from .guest_cart import GUEST_CART_COOKIE, GUEST_CART_FULL_MESSAGE, GUEST_CART_MAX_ITEMS
+from .admin import CartItemAdmin
+from .models import Cart, CartItem, cart_quantities, merge_guest_cart
+
+
+class MergeGuestCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories, cls.products = seed_catalog(products=40, categories=2, reviews_per_product=0)
+
+    def setUp(self):
+        cache.clear()
+        self.user = Account.objects.create_user('Cart', 'User', 'cart', 'cart@example.com', 'secret')
+        self.user.is_active = True
+        self.user.save()
+
+    def guest_cart(self, cart_id, quantities):
+        cart = Cart.objects.create(cart_id=cart_id)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product=product, quantity=quantity)
+            for product, quantity in quantities
+        ])
+        return cart
+
+    def test_merge_sums_matching_products_and_moves_the_rest(self):
+        p1, p2, p3 = self.products[:3]
+        CartItem.objects.create(user=self.user, product=p1, quantity=2)
+        self.guest_cart('guest', [(p1, 3), (p2, 1)])
+        CartItem.objects.create(user=self.user, product=p3, quantity=1)
+
+        merge_guest_cart('guest', self.user)
+
+        self.assertEqual(cart_quantities(user_id=self.user.id), {p1.id: 5, p2.id: 1, p3.id: 1})
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 3)
+        self.assertFalse(Cart.objects.filter(cart_id='guest').exists())
+        self.assertFalse(CartItem.objects.filter(user=None).exists())
+
+    def test_missing_guest_cart_is_a_no_op(self):
+        merge_guest_cart('nobody', self.user)
+        merge_guest_cart(None, self.user)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        counts = []
+        for size in (2, 20):
+            CartItem.objects.all().delete()
+            for product in self.products[:size // 2]:
+                CartItem.objects.create(user=self.user, product=product, quantity=1)
+            self.guest_cart(f'guest-{size}', [(product, 1) for product in self.products[:size]])
+            with self.assertNumQueries(8) as ctx:
+                merge_guest_cart(f'guest-{size}', self.user)
+            counts.append(len(ctx.captured_queries))
+            self.assertEqual(sum(cart_quantities(user_id=self.user.id).values()), size + size // 2)
+        self.assertEqual(counts[0], counts[1])
+
+    @override_settings(GUEST_CART_STORAGE='database')
+    def test_login_merges_session_cart(self):
+        product = self.products[0]
+        self.client.post(f'/cart/add_cart/{product.id}/')
+        self.client.post(f'/cart/add_cart/{product.id}/')
+        self.client.post('/accounts/login/', {'email': 'cart@example.com', 'password': 'secret'})
+        self.assertEqual(CartItem.objects.get(user=self.user).quantity, 2)
+        self.assertFalse(Cart.objects.exists())
+
+
+@override_settings(GUEST_CART_STORAGE='cookie')
+class CookieGuestCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories, cls.products = seed_catalog(products=3, categories=1, reviews_per_product=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_guest_browsing_writes_nothing(self):
+        p1, p2 = self.products[:2]
+        self.client.post(f'/cart/add_cart/{p1.id}/')
+        self.client.post(f'/cart/add_cart/{p1.id}/')
+        self.client.post(f'/cart/add_cart/{p2.id}/')
+        self.client.get(f'/cart/remove_cart/{p2.id}/{p2.id}/')
+
+        response = self.client.get('/cart/')
+        self.assertEqual(response.context['quantity'], 2)
+        self.assertEqual(response.context['cart_count'], 2)
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_tampered_cookie_is_ignored(self):
+        self.client.cookies[GUEST_CART_COOKIE] = f'{self.products[0].id}:99'
+        self.assertEqual(self.client.get('/cart/').context['quantity'], 0)
+
+    def test_login_materializes_cookie_cart(self):
+        user = Account.objects.create_user('Cookie', 'User', 'cookie', 'cookie@example.com', 'secret')
+        user.is_active = True
+        user.save()
+        p1, p2 = self.products[:2]
+        CartItem.objects.create(user=user, product=p1, quantity=1)
+        self.client.post(f'/cart/add_cart/{p1.id}/')
+        self.client.post(f'/cart/add_cart/{p2.id}/')
+
+        response = self.client.post('/accounts/login/', {'email': 'cookie@example.com', 'password': 'secret'})
+
+        self.assertEqual(cart_quantities(user_id=user.id), {p1.id: 2, p2.id: 1})
+        self.assertEqual(response.cookies[GUEST_CART_COOKIE].value, '')
+
+
+    def test_a_full_cookie_cart_refuses_new_products(self):
+        p1, p2 = self.products[:2]
+        full = {product_id: 1 for product_id in range(100000, 100000 + GUEST_CART_MAX_ITEMS - 1)}
+        full[p1.id] = 1
+        with mock.patch('carts.views.read_guest_cart', return_value=dict(full)):
+            response = self.client.post(f'/cart/add_cart/{p2.id}/', follow=True)
+        self.assertNotIn(GUEST_CART_COOKIE, response.cookies)
+        self.assertIn(GUEST_CART_FULL_MESSAGE, [str(m) for m in response.context['messages']])
+        # More of a product already in the cart still fits
+        with mock.patch('carts.views.read_guest_cart', return_value=dict(full)):
+            response = self.client.post(f'/cart/add_cart/{p1.id}/')
+        self.assertIn(f'{p1.id}:2', response.cookies[GUEST_CART_COOKIE].value)
+
+        with mock.patch('carts.api.read_guest_cart', return_value=dict(full)):
+            response = self.client.post(f'/cart/api/add/{p2.id}/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], GUEST_CART_FULL_MESSAGE)
+
+class CartApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories, cls.products = seed_catalog(products=3, categories=1, reviews_per_product=0)
+        cls.user = Account.objects.create_user('Api', 'User', 'cartapi', 'cartapi@example.com', 'x')
+        cls.user.is_active = True
+        cls.user.save()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post(self, url, data=None):
+        return self.client.post(url, data, content_type='application/json')
+
+    def test_add_and_remove_update_quantities_atomically(self):
+        p1 = self.products[0]
+        self.post(f'/cart/api/add/{p1.id}/')
+        summary = self.post(f'/cart/api/add/{p1.id}/').json()
+        self.assertEqual(summary['quantity'], 2)
+        self.assertEqual(summary['total'], p1.price * 2)
+        self.assertEqual(CartItem.objects.get(user=self.user).quantity, 2)
+
+        self.post(f'/cart/api/remove/{p1.id}/')
+        summary = self.post(f'/cart/api/remove/{p1.id}/').json()
+        self.assertEqual(summary['items'], [])
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_set_quantities_upserts_and_deletes(self):
+        p1, p2, p3 = self.products
+        CartItem.objects.create(user=self.user, product=p1, quantity=5)
+        CartItem.objects.create(user=self.user, product=p2, quantity=1)
+        summary = self.post('/cart/api/set/', {'items': {str(p1.id): 2, str(p2.id): 0, str(p3.id): 4}}).json()
+        self.assertEqual({i['product_id']: i['quantity'] for i in summary['items']}, {p1.id: 2, p3.id: 4})
+
+    def test_repeat_add_query_count_is_fixed(self):
+        p1 = self.products[0]
+        self.post(f'/cart/api/add/{p1.id}/')
+        # session, user, UPDATE, summary SELECT
+        with self.assertNumQueries(4):
+            self.post(f'/cart/api/add/{p1.id}/')
+
+    def test_errors(self):
+        self.assertEqual(self.post('/cart/api/add/999999/').status_code, 404)
+        self.assertEqual(self.post('/cart/api/set/', {'wrong': 1}).status_code, 400)
+        self.assertEqual(self.client.get(f'/cart/api/add/{self.products[0].id}/').status_code, 405)
+
+    @override_settings(GUEST_CART_STORAGE='cookie')
+    def test_guest_cookie_cart(self):
+        self.client.logout()
+        p1 = self.products[0]
+        self.post(f'/cart/api/add/{p1.id}/')
+        summary = self.post(f'/cart/api/add/{p1.id}/').json()
+        self.assertEqual(summary['quantity'], 2)
+        self.assertFalse(CartItem.objects.exists())
+
+
+class CartCacheInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories, cls.products = seed_catalog(products=3, categories=1, reviews_per_product=0)
+        cls.user = Account.objects.create_user('Cache', 'User', 'cacheuser', 'cacheuser@example.com', 'x')
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Cart.objects.create(cart_id='guest')
+        self.item = CartItem.objects.create(user=self.user, product=self.products[0], quantity=1)
+        CartItem.objects.create(cart=self.guest, product=self.products[1], quantity=2)
+        self.admin = CartItemAdmin(CartItem, AdminSite())
+        self.request = RequestFactory().post('/')
+
+    def test_saves_and_admin_deletes_forget_cached_carts(self):
+        self.assertEqual(cart_quantities(user_id=self.user.id), {self.products[0].id: 1})
+        self.item.quantity = 4
+        self.admin.save_model(self.request, self.item, None, change=True)
+        self.assertEqual(cart_quantities(user_id=self.user.id), {self.products[0].id: 4})
+
+        self.admin.delete_model(self.request, self.item)
+        self.assertEqual(cart_quantities(user_id=self.user.id), {})
+
+        self.assertEqual(cart_quantities(cart_id='guest'), {self.products[1].id: 2})
+        self.admin.delete_queryset(self.request, CartItem.objects.filter(cart=self.guest))
+        self.assertEqual(cart_quantities(cart_id='guest'), {})
+
+    def test_deleting_a_product_forgets_carts_holding_it(self):
+        self.assertEqual(cart_quantities(cart_id='guest'), {self.products[1].id: 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[1].delete()
+        self.assertEqual(cart_quantities(cart_id='guest'), {})
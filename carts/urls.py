@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, api
 
 
 urlpatterns = [
@@ -9,4 +9,10 @@ urlpatterns = [
     path('remove_cart_item/<int:product_id>/<int:cart_item_id>/', views.remove_cart_item, name='remove_cart_item'),
 
     path('checkout/', views.checkout, name='checkout'),
+
+    # JSON endpoints returning the updated cart summary
+    path('api/add/<int:product_id>/', api.add_item, name='cart_api_add'),
+    path('api/remove/<int:product_id>/', api.remove_item, name='cart_api_remove'),
+    path('api/delete/<int:product_id>/', api.delete_item, name='cart_api_delete'),
+    path('api/set/', api.set_quantities, name='cart_api_set'),
 ]
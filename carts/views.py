@@ -1,8 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from store.models import Product
-from .models import Cart, CartItem
+from .models import Cart, CartItem, forget_cart_products
+from .guest_cart import (
+    GUEST_CART_FULL_MESSAGE, guest_cart_is_full, read_guest_cart, uses_cookie_cart, write_guest_cart,
+)
+from analytics.recommendations import ordered_together_for_cart
 from django.core.exceptions import ObjectDoesNotExist
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from mohifoodspro.ratelimit import rate_limit
 
 # Create your views here.
 from django.http import HttpResponse
@@ -13,6 +19,13 @@ def _cart_id(request):
         cart = request.session.create()
     return cart
 
+def _forget_cart(request):
+    if request.user.is_authenticated:
+        forget_cart_products(user_id=request.user.id)
+    else:
+        forget_cart_products(cart_id=request.session.session_key)
+
+@rate_limit('cart')
 def add_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id) # Get the product
     current_user = request.user
@@ -32,6 +45,18 @@ def add_cart(request, product_id):
                 user = current_user
             )
             # We don't need to save, .create() does it.
+        forget_cart_products(user_id=current_user.id)
+
+    elif uses_cookie_cart(request):
+        # --- Guest cart kept in a signed cookie, no database writes ---
+        quantities = read_guest_cart(request)
+        if guest_cart_is_full(quantities, [product.id]):
+            messages.error(request, GUEST_CART_FULL_MESSAGE)
+            return redirect('cart')
+        quantities[product.id] = quantities.get(product.id, 0) + 1
+        response = redirect('cart')
+        write_guest_cart(response, quantities)
+        return response
     
     else:
         # --- Logic for Non-Logged-in User ---
@@ -56,11 +81,25 @@ def add_cart(request, product_id):
                 quantity = 1,
                 cart = cart
             )
+        forget_cart_products(cart_id=cart.cart_id)
     
     return redirect('cart')
 
 
+def _update_cookie_cart(request, product_id, quantity):
+    quantities = read_guest_cart(request)
+    if quantity > 0:
+        quantities[product_id] = quantity
+    else:
+        quantities.pop(product_id, None)
+    response = redirect('cart')
+    write_guest_cart(response, quantities)
+    return response
+
+
 def remove_cart(request, product_id, cart_item_id):
+    if uses_cookie_cart(request):
+        return _update_cookie_cart(request, product_id, read_guest_cart(request).get(product_id, 0) - 1)
 
     product = get_object_or_404(Product, id=product_id)
     try:
@@ -74,12 +113,16 @@ def remove_cart(request, product_id, cart_item_id):
             cart_item.save()
         else:
             cart_item.delete()
-    except:
+        _forget_cart(request)
+    except ObjectDoesNotExist:
         pass
     return redirect('cart')
 
 
 def remove_cart_item(request, product_id, cart_item_id):
+    if uses_cookie_cart(request):
+        return _update_cookie_cart(request, product_id, 0)
+
     product = get_object_or_404(Product, id=product_id)
     if request.user.is_authenticated:
         cart_item = CartItem.objects.get(product=product, user=request.user, id=cart_item_id)
@@ -87,15 +130,30 @@ def remove_cart_item(request, product_id, cart_item_id):
         cart = Cart.objects.get(cart_id=_cart_id(request))
         cart_item = CartItem.objects.get(product=product, cart=cart, id=cart_item_id)
     cart_item.delete()
+    _forget_cart(request)
     return redirect('cart')
 
 
+def _cookie_cart_items(request):
+    """Unsaved CartItems built from the cookie cart, in the order they were added."""
+    quantities = read_guest_cart(request)
+    products = Product.objects.in_bulk(list(quantities))
+    cart_items = []
+    for product_id, quantity in quantities.items():
+        if product_id in products:
+            # The cookie has no row ids; the remove URLs only need the product
+            cart_items.append(CartItem(id=product_id, product=products[product_id], quantity=quantity))
+    return cart_items
+
+
 def cart(request, total=0, quantity=0, cart_items=None):
     try:
         tax = 0
         grand_total = 0
         if request.user.is_authenticated:
             cart_items = CartItem.objects.filter(user=request.user, is_active=True)
+        elif uses_cookie_cart(request):
+            cart_items = _cookie_cart_items(request)
         else:
             cart = Cart.objects.get(cart_id=_cart_id(request))
             cart_items = CartItem.objects.filter(cart=cart, is_active=True)
@@ -113,6 +171,7 @@ def cart(request, total=0, quantity=0, cart_items=None):
         'cart_items': cart_items,
         'tax'       : tax,
         'grand_total': grand_total,
+        'ordered_together': ordered_together_for_cart(item.product_id for item in cart_items or ()),
     }
     return render(request, 'store/cart.html', context)
 
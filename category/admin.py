@@ -4,5 +4,5 @@ from .models import Category
 # Register your models here.
 class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields={'slug':('category_name',)}
-    list_display=('category_name','slug')
+    list_display=('category_name','slug','product_count')
 admin.site.register(Category,CategoryAdmin)
\ No newline at end of file
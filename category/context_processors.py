@@ -1,5 +1,8 @@
 from .models import Category
 
 def menu_links(request):
-    links = Category.objects.all()
+    # Async views load the menu beforehand (see store.async_views.arender)
+    links = getattr(request, 'menu_links', None)
+    if links is None:
+        links = Category.objects.all()
     return dict(links=links)
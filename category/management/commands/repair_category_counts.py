@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from category.models import Category
+from store.models import recount_category_products
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized product counts shown in the category menu.'
+
+    def handle(self, *args, **options):
+        before = dict(Category.objects.values_list('id', 'product_count'))
+        recount_category_products()
+        fixed = [
+            f'{name}: {before[category_id]} -> {count}'
+            for category_id, name, count in Category.objects.values_list('id', 'category_name', 'product_count')
+            if before.get(category_id) != count
+        ]
+        for line in fixed:
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f'Repaired {len(fixed)} category counts.'))
@@ -7,11 +7,22 @@ class Category(models.Model):
     slug = models.SlugField(max_length=100, unique=True)
     description = models.TextField(max_length=255, blank=True)
     cat_image = models.ImageField(upload_to='photos/categories', blank=True)
+    # Available products in this category, kept up to date by store.models
+    product_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name='category'
         verbose_name_plural= 'categories'
 
+    def save(self, *args, **kwargs):
+        # An instance loaded earlier holds an old product_count; only store.models writes it
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'product_count'
+            ]
+        super().save(*args, **kwargs)
+
     def get_url(self):
             return reverse('products_by_category', args=[self.slug])
     
@@ -1,3 +1,65 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from store.models import Product
+from .models import Category
+
+
+class CategoryProductCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.snacks = Category.objects.create(category_name='Snacks', slug='snacks')
+        cls.sweets = Category.objects.create(category_name='Sweets', slug='sweets')
+
+    def make_product(self, name, category, **fields):
+        return Product.objects.create(product_name=name, slug=name.lower(), price=10, stock=5,
+                                      images='photos/products/chips1.png', category=category, **fields)
+
+    def counts(self):
+        return dict(Category.objects.values_list('slug', 'product_count'))
+
+    def test_counts_follow_saves_and_deletes(self):
+        chips = self.make_product('Chips', self.snacks)
+        self.make_product('Ladoo', self.sweets)
+        self.make_product('Hidden', self.sweets, is_available=False)
+        self.assertEqual(self.counts(), {'snacks': 1, 'sweets': 1})
+
+        chips = Product.objects.get(id=chips.id)
+        chips.category = self.sweets
+        chips.save()
+        self.assertEqual(self.counts(), {'snacks': 0, 'sweets': 2})
+
+        chips.is_available = False
+        chips.save()
+        chips.save()
+        self.assertEqual(self.counts(), {'snacks': 0, 'sweets': 1})
+
+        hidden = Product.objects.get(slug='hidden')
+        hidden.is_available = True
+        hidden.save()
+        Product.objects.get(slug='ladoo').delete()
+        self.assertEqual(self.counts(), {'snacks': 0, 'sweets': 1})
+
+    def test_stock_only_saves_skip_counter_queries(self):
+        product = Product.objects.get(id=self.make_product('Chips', self.snacks).id)
+        product.stock -= 1
+        with self.assertNumQueries(1):
+            product.save(update_fields=['stock'])
+
+    def test_saving_a_stale_category_keeps_the_count(self):
+        stale = Category.objects.get(slug='snacks')
+        self.make_product('Chips', self.snacks)
+        stale.description = 'Crunchy'
+        stale.save()
+        self.assertEqual(self.counts(), {'snacks': 1, 'sweets': 0})
+        self.assertEqual(Category.objects.get(slug='snacks').description, 'Crunchy')
+
+    def test_repair_command(self):
+        self.make_product('Chips', self.snacks)
+        Category.objects.update(product_count=7)
+        out = StringIO()
+        call_command('repair_category_counts', stdout=out)
+        self.assertEqual(self.counts(), {'snacks': 1, 'sweets': 0})
+        self.assertIn('Repaired 2 category counts', out.getvalue())
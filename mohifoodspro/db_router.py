@@ -0,0 +1,110 @@
+"""Send catalog reads to a read replica.
+
+Views decorated with @replica_reads read store and category models from
+settings.REPLICA_DATABASE; everything else on those pages (cart counter,
+the logged-in user, orders) and every other view stays on 'default'. Once
+a request writes, the rest of it reads from the primary, and the client
+gets a cookie that keeps it on the primary for REPLICA_STICKY_SECONDS so it
+sees its own writes while the replica catches up.
+
+Views whose output is cached under a version bumped by writes (e.g.
+store.views.product_detail) should not use the replica: a lagging replica
+would refill the new cache key with old data.
+"""
+import contextvars
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+REPLICA_APPS = {'store', 'category'}
+# Session rows are saved on most requests and are never read from the replica
+UNTRACKED_APPS = {'sessions'}
+STICKY_COOKIE = 'primary_until'
+
+_request_state = contextvars.ContextVar('replica_request_state', default=None)
+
+
+class _RequestState:
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+def replica_reads(view):
+    view.replica_reads = True
+    return view
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and state.use_replica and settings.REPLICA_DATABASE \
+                and model._meta.app_label in REPLICA_APPS:
+            return settings.REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and model._meta.app_label not in UNTRACKED_APPS:
+            state.wrote = True
+            state.use_replica = False
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary, so rows from either can be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if settings.REPLICA_DATABASE and db == settings.REPLICA_DATABASE:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = _RequestState()
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.set_sticky_cookie(state, response)
+
+    async def __acall__(self, request):
+        state = _RequestState()
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.set_sticky_cookie(state, response)
+
+    def set_sticky_cookie(self, state, response):
+        if state.wrote and settings.REPLICA_DATABASE:
+            sticky = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(STICKY_COOKIE, str(int(time.time()) + sticky), max_age=sticky,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'replica_reads', False) and request.method in ('GET', 'HEAD') \
+                and not self.is_sticky(request):
+            _request_state.get().use_replica = True
+
+    def is_sticky(self, request):
+        try:
+            return int(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
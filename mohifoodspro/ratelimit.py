@@ -0,0 +1,181 @@
+"""Rate limiting for endpoints that are cheap to spam.
+
+settings.RATE_LIMITS maps a limit name to (burst, per_seconds): a client
+may make `burst` requests at once, and `burst` more every per_seconds after
+that. A view decorated with @rate_limit('search') answers 429 once the
+client is over its limit, before it runs a single query. A name missing
+from RATE_LIMITS is not limited.
+
+The limit behaves like a token bucket but is kept as sliding-window
+counters: one counter per client per per_seconds window, and a request is
+allowed while this window's count plus the previous window's, weighted by
+how much of it still overlaps the last per_seconds, stays within `burst`.
+The counters only need cache.add() and incr(), which are atomic in the
+shared cache backends, so no lock is held around a cache round trip and
+every worker process draws on the same allowance. A rejected request gives
+its count back. When the cache is unavailable, limits fall back to token
+buckets in this process's memory.
+
+Clients are keyed by IP, session cookie or user id. 'ip' and 'session'
+read only the request headers; 'user' loads request.user, which is a
+session and a user query, and falls back to the IP for anonymous visitors.
+Session keys come from the client, so use 'ip' where a spammer could simply
+invent new ones. Behind reverse proxies set RATE_LIMIT_TRUSTED_PROXIES, or
+every visitor shares the proxy's address.
+"""
+import functools
+import logging
+import math
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_local_buckets = {}
+
+
+def client_ip(request):
+    """The client's address, read from X-Forwarded-For as written by RATE_LIMIT_TRUSTED_PROXIES proxies."""
+    proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and forwarded:
+        # Each proxy appends the address it was called from, so the entry the
+        # outermost trusted proxy added is the last one the client can't forge
+        addresses = [address.strip() for address in forwarded.split(',') if address.strip()]
+        if addresses:
+            return addresses[max(len(addresses) - proxies, 0)]
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def _client_key(request, key):
+    if key == 'session':
+        session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if session_key:
+            return f'session:{session_key}'
+    elif key == 'user':
+        if request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+    return f'ip:{client_ip(request)}'
+
+
+def _windows(name, client, per_seconds, now):
+    """The current and previous window's counter keys, and the seconds since the current one began."""
+    index, elapsed = divmod(now, per_seconds)
+    prefix = f'ratelimit:{name}:{client}'
+    return f'{prefix}:{int(index)}', f'{prefix}:{int(index) - 1}', elapsed
+
+
+def _wait(count, previous, burst, per_seconds, elapsed):
+    """Seconds until a request would be allowed, or 0 when one counted in `count` is within the limit."""
+    estimate = previous * (1 - elapsed / per_seconds) + count
+    if estimate <= burst:
+        return 0
+    remaining = per_seconds - elapsed
+    if previous:
+        return min(remaining, (estimate - burst) * per_seconds / previous)
+    return remaining
+
+
+def _spend(bucket, burst, rate, now):
+    """Take a token from an in-process `bucket` (tokens, updated); return the new bucket and the wait."""
+    tokens, updated = bucket if bucket is not None else (burst, now)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens < 1:
+        return (tokens, now), (1 - tokens) / rate
+    return (tokens - 1, now), 0
+
+
+def _take_local_token(cache_key, burst, per_seconds, now):
+    logger.warning('Rate limit cache unavailable, using in-process buckets', exc_info=True)
+    with _lock:
+        bucket, wait = _spend(_local_buckets.get(cache_key), burst, burst / per_seconds, now)
+        _local_buckets[cache_key] = bucket
+    return wait
+
+
+def take_token(name, client):
+    """Count a request by `client` against limit `name`; return 0, or the seconds to wait when over it."""
+    limit = settings.RATE_LIMITS.get(name)
+    if not limit:
+        return 0
+    burst, per_seconds = limit
+    now = time.time()
+    current_key, previous_key, elapsed = _windows(name, client, per_seconds, now)
+    try:
+        # Kept through the next window, where it is the previous one
+        cache.add(current_key, 0, math.ceil(per_seconds * 2))
+        try:
+            count = cache.incr(current_key)
+        except ValueError:
+            # Evicted between add() and incr()
+            cache.add(current_key, 0, math.ceil(per_seconds * 2))
+            count = cache.incr(current_key)
+        previous = cache.get(previous_key, 0)
+        wait = _wait(count, previous, burst, per_seconds, elapsed)
+        if wait:
+            cache.decr(current_key)
+        return wait
+    except Exception:
+        return _take_local_token(f'ratelimit:{name}:{client}', burst, per_seconds, now)
+
+
+async def atake_token(name, client):
+    limit = settings.RATE_LIMITS.get(name)
+    if not limit:
+        return 0
+    burst, per_seconds = limit
+    now = time.time()
+    current_key, previous_key, elapsed = _windows(name, client, per_seconds, now)
+    try:
+        await cache.aadd(current_key, 0, math.ceil(per_seconds * 2))
+        try:
+            count = await cache.aincr(current_key)
+        except ValueError:
+            await cache.aadd(current_key, 0, math.ceil(per_seconds * 2))
+            count = await cache.aincr(current_key)
+        previous = await cache.aget(previous_key, 0)
+        wait = _wait(count, previous, burst, per_seconds, elapsed)
+        if wait:
+            await cache.adecr(current_key)
+        return wait
+    except Exception:
+        return _take_local_token(f'ratelimit:{name}:{client}', burst, per_seconds, now)
+
+
+def _too_many_requests(request, wait):
+    message = 'Too many requests. Please try again shortly.'
+    if request.content_type == 'application/json' or 'application/json' in request.headers.get('Accept', ''):
+        response = JsonResponse({'error': message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain')
+    response['Retry-After'] = str(max(1, math.ceil(wait)))
+    return response
+
+
+def rate_limit(name, key='ip'):
+    """Limit a view with the RATE_LIMITS entry `name`, counting per 'ip', 'session' or 'user'."""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if key == 'user':
+                    request.user = await request.auser()
+                wait = await atake_token(name, _client_key(request, key))
+                if wait:
+                    return _too_many_requests(request, wait)
+                return await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                wait = take_token(name, _client_key(request, key))
+                if wait:
+                    return _too_many_requests(request, wait)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
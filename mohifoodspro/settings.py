@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'store',
     'carts',
     'orders',
+    'analytics',
     
 ]
 
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'mohifoodspro.db_router.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,6 +79,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'mohifoodspro.wsgi.application'
 
+# Route home, store, product_detail and search to the async views in
+# store/async_views.py. Turn on when serving mohifoodspro.asgi.application.
+ASYNC_CATALOG_VIEWS = config('ASYNC_CATALOG_VIEWS', default=False, cast=bool)
+
 AUTH_USER_MODEL = 'accounts.Account'
 
 # Database
@@ -89,6 +95,73 @@ DATABASES = {
     }
 }
 
+# Optional read replica for catalog pages (see mohifoodspro/db_router.py).
+# Locally, point DATABASE_REPLICA_NAME at a second SQLite file and refresh it
+# from the primary with `python manage.py sync_replica`.
+DATABASE_REPLICA_NAME = config('DATABASE_REPLICA_NAME', default='')
+REPLICA_DATABASE = None
+if DATABASE_REPLICA_NAME:
+    REPLICA_DATABASE = 'replica'
+    DATABASES[REPLICA_DATABASE] = {
+        'ENGINE': config('DATABASE_REPLICA_ENGINE', default='django.db.backends.sqlite3'),
+        'NAME': DATABASE_REPLICA_NAME,
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['mohifoodspro.db_router.ReplicaRouter']
+# Seconds a client keeps reading from the primary after it wrote something
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+# Completed and cancelled orders older than this move to the archive tables
+# when `python manage.py archive_orders` runs
+ORDER_ARCHIVE_AFTER_DAYS = config('ORDER_ARCHIVE_AFTER_DAYS', default=90, cast=int)
+
+# `python manage.py reap_abandoned` deletes orders left unpaid this long and
+# guest carts this old whose session has expired
+UNPAID_ORDER_TTL_HOURS = config('UNPAID_ORDER_TTL_HOURS', default=24, cast=int)
+GUEST_CART_TTL_DAYS = config('GUEST_CART_TTL_DAYS', default=2, cast=int)
+
+# Open order status streams (orders.views.order_status_stream) re-read the
+# order and send a keepalive this often when nothing was published
+ORDER_STATUS_KEEPALIVE_SECONDS = config('ORDER_STATUS_KEEPALIVE_SECONDS', default=15, cast=int)
+
+# Kitchen capacity (orders/admission.py): orders and items per time slot,
+# how many slots ahead an order is queued without asking and how far ahead
+# a later slot may be offered, and how long an unpaid order holds its slot
+KITCHEN_SLOT_MINUTES = config('KITCHEN_SLOT_MINUTES', default=15, cast=int)
+KITCHEN_SLOT_ORDERS = config('KITCHEN_SLOT_ORDERS', default=20, cast=int)
+KITCHEN_SLOT_ITEMS = config('KITCHEN_SLOT_ITEMS', default=60, cast=int)
+KITCHEN_QUEUE_SLOTS = config('KITCHEN_QUEUE_SLOTS', default=2, cast=int)
+KITCHEN_OFFER_SLOTS = config('KITCHEN_OFFER_SLOTS', default=8, cast=int)
+KITCHEN_PAYMENT_HOLD_MINUTES = config('KITCHEN_PAYMENT_HOLD_MINUTES', default=15, cast=int)
+
+# Rate limits (mohifoodspro/ratelimit.py), as (burst, per_seconds): a client
+# may make `burst` requests at once and gets them back over per_seconds.
+# Remove an entry to lift that limit.
+RATE_LIMITS = {
+    'search': (config('RATE_LIMIT_SEARCH', default=30, cast=int), 60),
+    'cart': (config('RATE_LIMIT_CART', default=30, cast=int), 60),
+    'payment': (config('RATE_LIMIT_PAYMENT', default=10, cast=int), 60),
+    'review': (config('RATE_LIMIT_REVIEW', default=5, cast=int), 300),
+}
+# How many reverse proxies in front of the app append to X-Forwarded-For.
+# Clients are told apart by the address the outermost of them saw; leave at 0
+# when the app is reached directly, or clients could forge the header.
+RATE_LIMIT_TRUSTED_PROXIES = config('RATE_LIMIT_TRUSTED_PROXIES', default=0, cast=int)
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='mohifoodspro'),
+    }
+}
+
+# Where anonymous visitors' carts live: 'cookie' keeps them in a signed
+# cookie until login, 'database' stores Cart/CartItem rows per session.
+GUEST_CART_STORAGE = config('GUEST_CART_STORAGE', default='cookie')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
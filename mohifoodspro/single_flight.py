@@ -0,0 +1,96 @@
+"""Single-flight cache fills, so a cold key is computed once, not once per request.
+
+get_or_compute(key, compute, timeout) returns the cached value or, on a
+miss, takes a lock key with cache.add() before calling compute(). Requests
+that miss while another request holds the lock don't compute. They return
+the last value computed for the key (kept under a separate stale key for
+STALE_TIMEOUT) if there is one. Otherwise they poll the cache for up to
+WAIT_SECONDS and compute anyway only if the value still hasn't appeared.
+
+A lock expires after LOCK_SECONDS, so a worker that dies mid-computation
+holds the others up for that long at most. The lock lives in the default
+cache, so requests are coalesced across worker processes when the cache
+backend is shared, and within a process otherwise.
+
+aget_or_compute() is the same for async views, with an async compute.
+"""
+import asyncio
+import time
+import uuid
+
+from django.core.cache import cache
+
+LOCK_SECONDS = 10
+WAIT_SECONDS = 2
+POLL_SECONDS = 0.02
+STALE_TIMEOUT = 60 * 60 * 24
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _stale_key(key):
+    return f'{key}:stale'
+
+
+def get_or_compute(key, compute, timeout, version=None, stale=True):
+    value = cache.get(key, version=version)
+    if value is not None:
+        return value
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + WAIT_SECONDS
+    while not cache.add(_lock_key(key), token, LOCK_SECONDS, version=version):
+        if stale:
+            value = cache.get(_stale_key(key))
+            if value is not None:
+                return value
+        if time.monotonic() >= deadline:
+            # The lock holder is too slow, or died: give up waiting
+            return compute()
+        time.sleep(POLL_SECONDS)
+        value = cache.get(key, version=version)
+        if value is not None:
+            return value
+    try:
+        # The holder we waited on may have filled the key just before we got the lock
+        value = cache.get(key, version=version)
+        if value is None:
+            value = compute()
+            cache.set(key, value, timeout, version=version)
+            if stale:
+                cache.set(_stale_key(key), value, STALE_TIMEOUT)
+        return value
+    finally:
+        if cache.get(_lock_key(key), version=version) == token:
+            cache.delete(_lock_key(key), version=version)
+
+
+async def aget_or_compute(key, compute, timeout, version=None, stale=True):
+    value = await cache.aget(key, version=version)
+    if value is not None:
+        return value
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + WAIT_SECONDS
+    while not await cache.aadd(_lock_key(key), token, LOCK_SECONDS, version=version):
+        if stale:
+            value = await cache.aget(_stale_key(key))
+            if value is not None:
+                return value
+        if time.monotonic() >= deadline:
+            return await compute()
+        await asyncio.sleep(POLL_SECONDS)
+        value = await cache.aget(key, version=version)
+        if value is not None:
+            return value
+    try:
+        value = await cache.aget(key, version=version)
+        if value is None:
+            value = await compute()
+            await cache.aset(key, value, timeout, version=version)
+            if stale:
+                await cache.aset(_stale_key(key), value, STALE_TIMEOUT)
+        return value
+    finally:
+        if await cache.aget(_lock_key(key), version=version) == token:
+            await cache.adelete(_lock_key(key), version=version)
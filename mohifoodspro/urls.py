@@ -18,16 +18,21 @@ from django.urls import path, include
 from . import views
 from django.conf.urls.static import static
 from django.conf import settings
+from store import async_views
+
+home = async_views.home if settings.ASYNC_CATALOG_VIEWS else views.home
 
 urlpatterns = [
     path('admin/', admin.site.urls),
    # path('admin/', include('admin_honeypot.urls', namespace='admin_honeypot')),
     path('securelogin/', admin.site.urls),
-    path('', views.home, name='home'),
+    path('', home, name='home'),
     path('store/', include('store.urls')),
+    path('api/', include('store.api_urls')),
     path('cart/', include('carts.urls')),
    path('accounts/', include('accounts.urls')),
 
     # ORDERS
     path('orders/', include('orders.urls')),
+    path('analytics/', include('analytics.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
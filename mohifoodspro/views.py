@@ -1,8 +1,19 @@
+from django.db.models import Avg, Q
 from django.shortcuts import render
 from store.models import Product, ReviewRating
+from .db_router import replica_reads
 
+
+def home_products():
+    # Category and rating come with the products, so the cards don't query per product
+    return Product.objects.filter(is_available=True).select_related('category').annotate(
+        average_rating=Avg('reviewrating__rating', filter=Q(reviewrating__status=True)),
+    ).order_by('-trending_score', '-id')
+
+
+@replica_reads
 def home(request):
-    products = Product.objects.all().filter(is_available=True).order_by('created_date')
+    products = home_products()
 
     # Get the reviews
     reviews = None
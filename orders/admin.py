@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Payment, Order, OrderProduct
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .models import Payment, Order, OrderProduct, ArchivedOrder, ArchivedOrderProduct
+from .exports import order_lines, stream_csv
 # Register your models here.
 
 
@@ -10,11 +13,49 @@ class OrderProductInline(admin.TabularInline):
 
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['order_number', 'full_name', 'phone', 'email', 'city', 'order_total', 'tax', 'status', 'is_ordered', 'created_at']
-    list_filter = ['status', 'is_ordered']
+    list_filter = ['status', 'is_ordered', 'created_at']
     search_fields = ['order_number', 'first_name', 'last_name', 'phone', 'email']
     list_per_page = 20
+    date_hierarchy = 'created_at'
     inlines = [OrderProductInline]
+    actions = ['export_csv']
+
+    @admin.action(description='Export order lines as CSV')
+    def export_csv(self, request, queryset):
+        lines = order_lines(paid_only=False).filter(order__in=queryset)
+        response = StreamingHttpResponse(stream_csv(lines), content_type='text/csv')
+        filename = timezone.now().strftime('orders-%Y%m%d-%H%M%S.csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class ArchivedOrderProductInline(admin.TabularInline):
+    model = ArchivedOrderProduct
+    readonly_fields = ('payment', 'user', 'product', 'quantity', 'product_price', 'ordered')
+    extra = 0
+    can_delete = False
+
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ['order_number', 'full_name', 'email', 'order_total', 'status', 'created_at', 'archived_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['order_number', 'first_name', 'last_name', 'phone', 'email']
+    list_per_page = 20
+    date_hierarchy = 'created_at'
+    inlines = [ArchivedOrderProductInline]
+    actions = ['export_csv']
+
+    @admin.action(description='Export order lines as CSV')
+    def export_csv(self, request, queryset):
+        lines = order_lines(paid_only=False, archived=True).filter(order__in=queryset)
+        response = StreamingHttpResponse(stream_csv(lines), content_type='text/csv')
+        filename = timezone.now().strftime('archived-orders-%Y%m%d-%H%M%S.csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def has_add_permission(self, request):
+        return False
 
 admin.site.register(Payment)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderProduct)
+admin.site.register(ArchivedOrder, ArchivedOrderAdmin)
@@ -0,0 +1,175 @@
+"""Kitchen capacity admission for new orders.
+
+Time is cut into KITCHEN_SLOT_MINUTES slots, each able to take
+KITCHEN_SLOT_ORDERS orders and KITCHEN_SLOT_ITEMS items. place_order asks
+admit() for a slot before creating the Order and stores it on
+Order.kitchen_slot:
+
+- 'accept': the current slot has room.
+- 'queue': a slot within the next KITCHEN_QUEUE_SLOTS has room, so the order
+  goes ahead and is prepared then.
+- 'later': the first slot with room is further out (up to
+  KITCHEN_OFFER_SLOTS). The customer is offered it and must confirm; the
+  offer goes through the checkout form signed (Admission.offer), and
+  offered_slot() only honours an untampered offer inside the horizon.
+- 'full': nothing within that horizon.
+
+Each slot's load is a pair of cache counters. A reservation increments
+them and backs out if that overshot the capacity, so concurrent checkouts
+can never overbook a slot and a check costs a few cache operations, never a
+query. Counters are seeded from Order rows on first use, and
+reconcile_slots() (the reconcile_kitchen_slots command, run from cron every
+minute or so) resets them from the rows. That releases cancelled orders and
+unpaid orders older than KITCHEN_PAYMENT_HOLD_MINUTES, and repairs drift.
+With more than one worker process the cache must be shared (CACHE_BACKEND),
+or each process counts only its own orders.
+"""
+import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Order
+
+COUNTER_TIMEOUT = 60 * 60 * 24
+OFFER_SALT = 'orders.admission.offer'
+
+
+class Admission:
+    def __init__(self, decision, slot=None):
+        self.decision = decision
+        self.slot = slot
+
+    @property
+    def admitted(self):
+        return self.decision in ('accept', 'queue')
+
+    @property
+    def offer(self):
+        """Signed token naming the offered slot, for the customer to confirm with."""
+        return signing.dumps(int(self.slot.timestamp()), salt=OFFER_SALT)
+
+
+def slot_length():
+    return datetime.timedelta(minutes=settings.KITCHEN_SLOT_MINUTES)
+
+
+def slot_start(moment):
+    seconds = settings.KITCHEN_SLOT_MINUTES * 60
+    timestamp = int(moment.timestamp()) // seconds * seconds
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+
+def _keys(slot):
+    stamp = int(slot.timestamp())
+    return f'kitchen_slot:{stamp}:orders', f'kitchen_slot:{stamp}:items'
+
+
+def slot_load_from_orders(slot):
+    """(orders, items) holding the slot according to Order rows."""
+    hold = timezone.now() - datetime.timedelta(minutes=settings.KITCHEN_PAYMENT_HOLD_MINUTES)
+    load = Order.objects.filter(kitchen_slot=slot).exclude(status='Cancelled') \
+        .filter(Q(is_ordered=True) | Q(created_at__gte=hold)) \
+        .aggregate(orders=Count('id'), items=Sum('kitchen_items'))
+    return load['orders'], load['items'] or 0
+
+
+def offered_slot(token):
+    """The slot an Admission.offer token names, or None if it is missing, forged, stale or out of range."""
+    if not token:
+        return None
+    try:
+        stamp = signing.loads(token, salt=OFFER_SALT, max_age=settings.KITCHEN_SLOT_MINUTES * 60)
+        slot = datetime.datetime.fromtimestamp(stamp, datetime.timezone.utc)
+    except (signing.BadSignature, TypeError, ValueError, OverflowError, OSError):
+        return None
+    current = slot_start(timezone.now())
+    if not current <= slot <= current + settings.KITCHEN_OFFER_SLOTS * slot_length():
+        return None
+    return slot
+
+
+def _seed(slot):
+    orders_key, items_key = _keys(slot)
+    orders, items = slot_load_from_orders(slot)
+    # add() so a counter another request seeded meanwhile isn't overwritten
+    cache.add(orders_key, orders, COUNTER_TIMEOUT)
+    cache.add(items_key, items, COUNTER_TIMEOUT)
+
+
+def _incr(slot, key, delta=1):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # The counter expired or was evicted since it was seeded
+        _seed(slot)
+        return cache.incr(key, delta)
+
+
+def _reserve(slot, items):
+    orders_key, items_key = _keys(slot)
+    if orders_key not in cache or items_key not in cache:
+        _seed(slot)
+    orders = _incr(slot, orders_key)
+    if orders > settings.KITCHEN_SLOT_ORDERS:
+        release(slot, 0)
+        return False
+    if _incr(slot, items_key, items) > settings.KITCHEN_SLOT_ITEMS and orders > 1:
+        # An order bigger than a whole slot still gets a slot to itself
+        release(slot, items)
+        return False
+    return True
+
+
+def release(slot, items):
+    """Give a reservation back, e.g. when the order it was for is not created after all."""
+    orders_key, items_key = _keys(slot)
+    for key, delta in ((orders_key, 1), (items_key, items)):
+        try:
+            cache.decr(key, delta)
+        except ValueError:
+            # Counter expired; the next reservation seeds it from the rows
+            pass
+
+
+def admit(items, earliest=None):
+    """Reserve the first slot with room for an order of `items` items.
+
+    `earliest` is a later slot the customer confirmed. Only that slot is
+    reserved; if it filled up meanwhile the next one with room is offered
+    instead, so the customer never ends up in a slot they didn't see.
+    """
+    current = slot_start(timezone.now())
+    horizon = current + settings.KITCHEN_OFFER_SLOTS * slot_length()
+    slot = max(current, slot_start(earliest)) if earliest else current
+    if earliest is not None:
+        if _reserve(slot, items):
+            return Admission('accept' if slot == current else 'queue', slot)
+        slot += slot_length()
+    while slot <= horizon:
+        if _reserve(slot, items):
+            if slot == current:
+                return Admission('accept', slot)
+            if earliest is None and slot <= current + settings.KITCHEN_QUEUE_SLOTS * slot_length():
+                return Admission('queue', slot)
+            # Only offered: hand the reservation back until the customer confirms
+            release(slot, items)
+            return Admission('later', slot)
+        slot += slot_length()
+    return Admission('full')
+
+
+def reconcile_slots(slots=None):
+    """Reset the counters of `slots` (the current slot and the offer horizon by default) from Order rows."""
+    if slots is None:
+        current = slot_start(timezone.now())
+        slots = [current + offset * slot_length() for offset in range(settings.KITCHEN_OFFER_SLOTS + 1)]
+    loads = {}
+    for slot in slots:
+        loads[slot] = slot_load_from_orders(slot)
+        orders_key, items_key = _keys(slot)
+        cache.set_many({orders_key: loads[slot][0], items_key: loads[slot][1]}, COUNTER_TIMEOUT)
+    return loads
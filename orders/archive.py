@@ -0,0 +1,86 @@
+"""Hot/cold storage for orders.
+
+archive_batch() moves up to batch_size completed or cancelled orders older
+than a cutoff, with their lines, into ArchivedOrder/ArchivedOrderProduct in
+one short transaction, keeping ids and timestamps. The helpers below look
+in both places so customers see their whole history either way.
+"""
+import heapq
+import itertools
+
+from django.db import transaction
+from django.http import Http404
+
+from .models import ArchivedOrder, ArchivedOrderProduct, Order, OrderProduct
+
+ARCHIVE_STATUSES = ('Completed', 'Cancelled')
+ORDER_COLUMNS = [field.attname for field in Order._meta.concrete_fields]
+LINE_COLUMNS = [field.attname for field in OrderProduct._meta.concrete_fields]
+
+
+def archivable_orders(cutoff):
+    # Served by the (status, created_at) index
+    return Order.objects.filter(status__in=ARCHIVE_STATUSES, created_at__lt=cutoff)
+
+
+def archive_batch(cutoff, batch_size=500):
+    """Archive one batch; returns (orders, lines) moved."""
+    with transaction.atomic():
+        ids = list(archivable_orders(cutoff).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0, 0
+        orders = [ArchivedOrder(**row) for row in Order.objects.filter(id__in=ids).values(*ORDER_COLUMNS)]
+        lines = [
+            ArchivedOrderProduct(**row)
+            for row in OrderProduct.objects.filter(order_id__in=ids).values(*LINE_COLUMNS)
+        ]
+        ArchivedOrder.objects.bulk_create(orders)
+        ArchivedOrderProduct.objects.bulk_create(lines, batch_size=1000)
+        OrderProduct.objects.filter(order_id__in=ids).delete()
+        Order.objects.filter(id__in=ids).delete()
+    return len(orders), len(lines)
+
+
+class OrderHistory:
+    """A user's paid orders from both tables, newest first, for a Paginator.
+
+    Slicing runs one ordered LIMIT query per table and merges the two, so a
+    page costs offset + page size rows at most rather than the whole history.
+    """
+
+    def __init__(self, user):
+        self.querysets = [
+            model.objects.filter(user=user, is_ordered=True).order_by('-created_at', '-id')
+            for model in (Order, ArchivedOrder)
+        ]
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        newest = [queryset if stop is None else queryset[:stop] for queryset in self.querysets]
+        merged = heapq.merge(*newest, key=lambda order: (order.created_at, order.id), reverse=True)
+        return list(itertools.islice(merged, start, stop))
+
+
+def user_orders(user):
+    return OrderHistory(user)
+
+
+def user_order_count(user):
+    return OrderHistory(user).count()
+
+
+def find_user_order(user, order_number):
+    """Return (order, lines) for one of the user's orders, hot or archived."""
+    for order_model, line_model in ((Order, OrderProduct), (ArchivedOrder, ArchivedOrderProduct)):
+        order = order_model.objects.filter(user=user, order_number=order_number).first()
+        if order is not None:
+            return order, line_model.objects.filter(order=order).select_related('product')
+    raise Http404('No such order')
@@ -0,0 +1,78 @@
+"""The kitchen's live order queue.
+
+The queue screen polls an incremental feed: each poll returns only paid
+orders whose updated_at is past the cursor the previous poll handed out,
+with their lines, in one query over OrderProduct joined to Order and
+Product (backed by the order_updated index). The cursor is re-read with a
+few seconds of overlap, because a transaction can commit after a later one
+that took a newer timestamp. The screen keys orders by id and ignores rows
+it already has.
+
+Status changes are single conditional UPDATEs (WHERE status IN the allowed
+previous statuses), so when two cooks press Accept on the same order only
+one UPDATE matches a row and the other gets a conflict.
+"""
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import status_events
+from .models import Order, OrderProduct
+
+OPEN_STATUSES = ('New', 'Accepted')
+# action: (statuses it may start from, status it sets)
+KITCHEN_TRANSITIONS = {
+    'accept': (('New',), 'Accepted'),
+    'complete': (('Accepted',), 'Completed'),
+    'cancel': (('New', 'Accepted'), 'Cancelled'),
+}
+FEED_OVERLAP = datetime.timedelta(seconds=5)
+
+LINE_FIELDS = (
+    'order_id', 'order__order_number', 'order__status', 'order__first_name', 'order__last_name',
+    'order__order_note', 'order__created_at', 'order__updated_at', 'product__product_name', 'quantity',
+)
+
+
+def queue_feed(since=None):
+    """Orders changed after `since` (all open orders when None) and the cursor for the next call."""
+    lines = OrderProduct.objects.filter(order__is_ordered=True)
+    if since is None:
+        lines = lines.filter(order__status__in=OPEN_STATUSES)
+    else:
+        lines = lines.filter(order__updated_at__gt=since - FEED_OVERLAP)
+    orders = {}
+    cursor = since
+    for row in lines.order_by('order__updated_at', 'order_id', 'id').values_list(*LINE_FIELDS):
+        order_id, number, status, first_name, last_name, note, created_at, updated_at, product_name, quantity = row
+        order = orders.get(order_id)
+        if order is None:
+            order = orders[order_id] = {
+                'id': order_id,
+                'order_number': number,
+                'status': status,
+                'name': f'{first_name} {last_name}',
+                'note': note,
+                'created_at': created_at,
+                'updated_at': updated_at,
+                'lines': [],
+            }
+        order['lines'].append({'product': product_name, 'quantity': quantity})
+        if cursor is None or updated_at > cursor:
+            cursor = updated_at
+    return list(orders.values()), cursor or timezone.now()
+
+
+def transition_order(order_id, action):
+    """Apply a kitchen action; return (True, new status) or (False, current status) when it no longer applies."""
+    from_statuses, to_status = KITCHEN_TRANSITIONS[action]
+    with transaction.atomic():
+        changed = Order.objects.filter(id=order_id, is_ordered=True, status__in=from_statuses) \
+            .update(status=to_status, updated_at=timezone.now())
+        if changed:
+            # update() skips post_save, so tell the customers' status streams directly
+            transaction.on_commit(lambda: status_events.publish(order_id, to_status))
+            return True, to_status
+    current = Order.objects.filter(id=order_id).values_list('status', flat=True).first()
+    return False, current
@@ -0,0 +1,38 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.archive import archivable_orders, archive_batch
+
+
+class Command(BaseCommand):
+    help = 'Move completed and cancelled orders older than --days into the archive tables, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help='Seconds to sleep between batches so checkout writes get the database')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+        if options['dry_run']:
+            self.stdout.write(f'{archivable_orders(cutoff).count()} orders would be archived.')
+            return
+
+        total_orders = total_lines = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            orders, lines = archive_batch(cutoff, options['batch_size'])
+            if not orders:
+                break
+            total_orders += orders
+            total_lines += lines
+            batches += 1
+            self.stdout.write(f'Batch {batches}: {orders} orders, {lines} lines')
+            time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {total_orders} orders and {total_lines} lines.'))
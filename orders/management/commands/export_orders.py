@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from orders.exports import order_lines, stream_csv
+
+
+class Command(BaseCommand):
+    help = 'Stream paid order lines with order and payment columns as CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First order date to include (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Last order date to include (YYYY-MM-DD)')
+        parser.add_argument('--include-unpaid', action='store_true')
+        parser.add_argument('--archived', action='store_true', help='Export from the order archive instead')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ('since', 'until'):
+            if options[name]:
+                dates[name] = parse_date(options[name])
+                if dates[name] is None:
+                    raise CommandError(f'--{name} must be a date like 2025-01-31')
+
+        lines = order_lines(paid_only=not options['include_unpaid'], archived=options['archived'], **dates)
+        rows = stream_csv(lines, options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                f.writelines(rows)
+        else:
+            sys.stdout.writelines(rows)
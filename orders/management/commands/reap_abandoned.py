@@ -0,0 +1,103 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from carts.models import Cart, CartItem
+from orders.models import Order
+
+DB_SESSION_ENGINES = ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db')
+
+
+def unpaid_orders(now):
+    # Matches the partial index order_unpaid_created
+    cutoff = now - datetime.timedelta(hours=settings.UNPAID_ORDER_TTL_HOURS)
+    return Order.objects.filter(is_ordered=False, created_at__lt=cutoff)
+
+
+def stale_guest_carts(now):
+    live_session = Session.objects.filter(session_key=OuterRef('cart_id'), expire_date__gt=now)
+    cutoff = now.date() - datetime.timedelta(days=settings.GUEST_CART_TTL_DAYS)
+    return Cart.objects.filter(date_added__lt=cutoff).filter(~Exists(live_session))
+
+
+def expired_sessions(now):
+    return Session.objects.filter(expire_date__lt=now)
+
+
+# Each delete repeats its predicate, so a row that stopped matching after it
+# was selected (an order paid, a session renewed) is left alone.
+
+def delete_unpaid_orders(ids, now):
+    # Locked first: verify_payment locks the order too, so a payment either
+    # lands before this (and the order no longer matches) or waits for it
+    ids = list(unpaid_orders(now).filter(id__in=ids).select_for_update().values_list('id', flat=True))
+    return Order.objects.filter(id__in=ids).delete()[0] if ids else 0
+
+
+def delete_guest_carts(ids, now):
+    # Neither model has delete receivers, so both are plain DELETEs
+    carts = stale_guest_carts(now).filter(id__in=ids)
+    items = CartItem.objects.filter(cart__in=carts).delete()[0]
+    return items + carts.delete()[0]
+
+
+def delete_sessions(keys, now):
+    return expired_sessions(now).filter(session_key__in=keys).delete()[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete orders never paid for, guest carts whose session expired and expired '
+        'sessions, in small batches with pauses. Safe to run from cron every few minutes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches so other writers get the database')
+        parser.add_argument('--max-seconds', type=float, default=60,
+                            help='Stop starting new batches after this long, so cron runs never pile up')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be deleted')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        steps = [('unpaid orders', unpaid_orders(now).order_by('created_at'), delete_unpaid_orders)]
+        if settings.SESSION_ENGINE in DB_SESSION_ENGINES:
+            steps += [
+                ('guest carts', stale_guest_carts(now).order_by('date_added'), delete_guest_carts),
+                ('expired sessions', expired_sessions(now).order_by('session_key'), delete_sessions),
+            ]
+        else:
+            # Sessions aren't in the session table, so its absence says nothing about a cart
+            self.stdout.write('guest carts: skipped, sessions are not stored in the database')
+
+        if options['dry_run']:
+            for label, queryset, _ in steps:
+                self.stdout.write(f'{label}: {queryset.count()} would be deleted')
+            return
+
+        deadline = time.monotonic() + options['max_seconds']
+        for label, queryset, delete in steps:
+            rows = batches = 0
+            start = time.monotonic()
+            while time.monotonic() < deadline:
+                with transaction.atomic():
+                    # Ordered on the indexed column so each batch is a range scan
+                    keys = list(queryset.values_list('pk', flat=True)[:options['batch_size']])
+                    if not keys:
+                        break
+                    rows += delete(keys, now)
+                batches += 1
+                time.sleep(options['pause'])
+            elapsed = time.monotonic() - start
+            self.stdout.write(f'{label}: {rows} rows deleted in {batches} batches ({elapsed:.1f}s)')
+            if time.monotonic() >= deadline:
+                self.stdout.write(self.style.WARNING('Time budget used up; the rest is left for the next run.'))
+                break
+        self.stdout.write(self.style.SUCCESS('Done.'))
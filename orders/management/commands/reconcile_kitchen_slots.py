@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.admission import reconcile_slots
+
+
+class Command(BaseCommand):
+    help = (
+        "Reset the kitchen capacity counters of the current and upcoming slots from Order rows, "
+        "releasing cancelled and long-unpaid orders. Run from cron every minute or so."
+    )
+
+    def handle(self, *args, **options):
+        for slot, (orders, items) in reconcile_slots().items():
+            self.stdout.write(f'{slot:%Y-%m-%d %H:%M} {orders:4} orders {items:5} items')
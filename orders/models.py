@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.core.cache import cache
 from accounts.models import Account
 from store.models import Product
+from . import status_events
 
 
 
@@ -16,7 +20,8 @@ class Payment(models.Model):
         return self.payment_id
 
 
-class Order(models.Model):
+class OrderFields(models.Model):
+    """Columns shared by Order and ArchivedOrder."""
     STATUS = (
         ('New', 'New'),
         ('Accepted', 'Accepted'),
@@ -42,9 +47,12 @@ class Order(models.Model):
     status = models.CharField(max_length=10, choices=STATUS, default='New')
     ip = models.CharField(blank=True, max_length=20)
     is_ordered = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # Kitchen time slot the order was admitted to and the items it takes (admission.py)
+    kitchen_slot = models.DateTimeField(null=True, blank=True)
+    kitchen_items = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        abstract = True
 
     def full_name(self):
         return f'{self.first_name} {self.last_name}'
@@ -56,16 +64,108 @@ class Order(models.Model):
         return self.first_name
 
 
-class OrderProduct(models.Model):
-    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+class Order(OrderFields):
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='order_status_created'),
+            models.Index(fields=['created_at'], condition=models.Q(is_ordered=False), name='order_unpaid_created'),
+            # The kitchen queue feed reads orders changed since a cursor (kitchen.py)
+            models.Index(fields=['updated_at'], name='order_updated'),
+            models.Index(fields=['kitchen_slot'], name='order_kitchen_slot'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in instance.__dict__:
+            instance._published_status = instance.status
+        return instance
+
+
+class OrderProductFields(models.Model):
+    """Columns shared by OrderProduct and ArchivedOrderProduct, apart from the order."""
     payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, blank=True, null=True)
     user = models.ForeignKey(Account, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
     product_price = models.FloatField()
     ordered = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
 
     def __str__(self):
         return self.product.product_name
+
+
+class OrderProduct(OrderProductFields):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+# Completed and cancelled orders past ORDER_ARCHIVE_AFTER_DAYS are moved here
+# by the archive_orders command (see archive.py), keeping their ids, so the
+# hot tables only hold recent orders. Timestamps are copied, not auto-set.
+class ArchivedOrder(OrderFields):
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='archived_order_user'),
+            models.Index(fields=['order_number'], name='archived_order_number'),
+        ]
+
+
+class ArchivedOrderProduct(OrderProductFields):
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+
+# Cached set of product ids a user has ordered, used to gate review posting.
+def ordered_products_key(user_id):
+    return f'ordered_products:{user_id}'
+
+
+def ordered_product_ids(user_id):
+    key = ordered_products_key(user_id)
+    product_ids = cache.get(key)
+    if product_ids is None:
+        hot = OrderProduct.objects.filter(user_id=user_id).values_list('product_id', flat=True)
+        archived = ArchivedOrderProduct.objects.filter(user_id=user_id).values_list('product_id', flat=True)
+        product_ids = frozenset(hot.union(archived))
+        cache.set(key, product_ids)
+    return product_ids
+
+
+async def aordered_product_ids(user_id):
+    key = ordered_products_key(user_id)
+    product_ids = await cache.aget(key)
+    if product_ids is None:
+        hot = OrderProduct.objects.filter(user_id=user_id).values_list('product_id', flat=True)
+        archived = ArchivedOrderProduct.objects.filter(user_id=user_id).values_list('product_id', flat=True)
+        product_ids = frozenset([product_id async for product_id in hot.union(archived)])
+        await cache.aset(key, product_ids)
+    return product_ids
+
+
+@receiver([post_save, post_delete], sender=OrderProduct)
+def order_product_changed(sender, instance, **kwargs):
+    cache.delete(ordered_products_key(instance.user_id))
+
+
+@receiver(post_save, sender=Order)
+def publish_order_status(sender, instance, created, **kwargs):
+    """Tell open status streams (status_events.py) about a new status once it's committed."""
+    if 'status' not in instance.__dict__ or instance.status == getattr(instance, '_published_status', None):
+        return
+    instance._published_status = instance.status
+    if not created:
+        order_id, status = instance.id, instance.status
+        transaction.on_commit(lambda: status_events.publish(order_id, status))
@@ -0,0 +1,55 @@
+"""In-process pub/sub of Order.status changes for the order status stream.
+
+Saving an Order whose status changed publishes the new status once the
+transaction commits (see the post_save receiver in models.py). Each open
+order_status_stream connection subscribes an asyncio queue for its order,
+and publish() hands the status to every queue on that queue's own event
+loop, so a save made in a sync view or the admin thread reaches them safely.
+
+Only saves in this process are seen. Bulk update() calls skip save(), so
+code that changes statuses that way calls publish() itself. Streams also
+re-read the status every ORDER_STATUS_KEEPALIVE_SECONDS, which picks up
+changes made by other worker processes.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+FINAL_ORDER_STATUSES = {'Completed', 'Cancelled'}
+
+_subscribers = defaultdict(set)
+_lock = threading.Lock()
+
+
+def subscribe(order_id):
+    """Register a queue for the order's status changes. Call from the event loop that reads it."""
+    queue = asyncio.Queue()
+    with _lock:
+        _subscribers[order_id].add((asyncio.get_running_loop(), queue))
+    return queue
+
+
+def unsubscribe(order_id, queue):
+    with _lock:
+        subscribers = _subscribers.get(order_id, set())
+        subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+        if not subscribers:
+            _subscribers.pop(order_id, None)
+
+
+def subscriber_count(order_id=None):
+    with _lock:
+        if order_id is None:
+            return sum(len(subscribers) for subscribers in _subscribers.values())
+        return len(_subscribers.get(order_id, ()))
+
+
+def publish(order_id, status):
+    with _lock:
+        subscribers = list(_subscribers.get(order_id, ()))
+    for loop, queue in subscribers:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, status)
+        except RuntimeError:
+            # The loop has closed; its stream's finally block will unsubscribe
+            pass
@@ -1,3 +1,511 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import AdminSite
+from django.contrib.sessions.backends.db import SessionStore
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Account
+from analytics.models import DailyProductSales
+from analytics.rollups import rebuild_sales_rollups
+from carts.models import Cart, CartItem
+from store.benchmarks import seed_catalog
+from .admin import OrderAdmin
+from .admission import OFFER_SALT, admit, reconcile_slots, slot_start
+from . import status_events
+from .archive import archive_batch, user_orders
+from .kitchen import queue_feed, transition_order
+from .management.commands.reap_abandoned import delete_guest_carts, delete_unpaid_orders
+from .models import ArchivedOrder, ArchivedOrderProduct, Order, OrderProduct, Payment, ordered_product_ids
+
+
+def make_order(user, lines, is_ordered=True, status='New', created_at=None):
+    """Create an order with (product, quantity) lines, paid unless is_ordered=False."""
+    payment = None
+    if is_ordered:
+        payment = Payment.objects.create(user=user, payment_id=f'pay_{Payment.objects.count()}',
+                                         payment_method='Razorpay', amount_paid='0', status='Completed')
+    total = sum(product.price * quantity for product, quantity in lines)
+    order = Order.objects.create(
+        user=user, payment=payment, first_name=user.first_name, last_name=user.last_name,
+        phone='999', email=user.email, address_line_1='1 Street', country='IN', state='KA',
+        city='Bengaluru', order_total=total * 1.02, tax=total * 0.02, status=status, is_ordered=is_ordered,
+    )
+    order.order_number = f'20250101{order.id}'
+    order.save()
+    for product, quantity in lines:
+        OrderProduct.objects.create(order=order, payment=payment, user=user, product=product,
+                                    quantity=quantity, product_price=product.price, ordered=is_ordered)
+    if created_at:
+        Order.objects.filter(id=order.id).update(created_at=created_at)
+    return order
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('Fin', 'Ance', 'fin', 'fin@example.com', 'x')
+        cls.categories, cls.products = seed_catalog(products=3, categories=1, reviews_per_product=0)
+        p1, p2, p3 = cls.products
+        cls.old = make_order(cls.user, [(p1, 1)], created_at=timezone.make_aware(datetime.datetime(2024, 12, 31)))
+        cls.new = make_order(cls.user, [(p1, 2), (p2, 1)], created_at=timezone.make_aware(datetime.datetime(2025, 1, 15)))
+        cls.unpaid = make_order(cls.user, [(p3, 1)], is_ordered=False)
+
+    def export(self, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'orders.csv')
+            call_command('export_orders', output=path, **options)
+            with open(path, newline='') as f:
+                return list(csv.DictReader(f))
+
+    def test_command_exports_paid_lines_in_chunks(self):
+        rows = self.export(chunk_size=1)
+        self.assertEqual(len(rows), 3)
+        line = next(r for r in rows if r['order_number'] == self.new.order_number and r['quantity'] == '2')
+        self.assertEqual(line['payment_method'], 'Razorpay')
+        self.assertEqual(float(line['line_total']), self.products[0].price * 2)
+
+    def test_date_range(self):
+        rows = self.export(since='2025-01-01', until='2025-01-31')
+        self.assertEqual({r['order_number'] for r in rows}, {self.new.order_number})
+        self.assertEqual(len(self.export(include_unpaid=True)), 4)
+
+    def test_admin_action_streams_selected_orders(self):
+        request = RequestFactory().post('/admin/orders/order/')
+        response = OrderAdmin(Order, AdminSite()).export_csv(request, Order.objects.filter(id=self.unpaid.id))
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([r['order_number'] for r in rows], [self.unpaid.order_number])
+
+
+class VerifyPaymentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('Pay', 'Er', 'payer', 'payer@example.com', 'x')
+        cls.user.is_active = True
+        cls.user.save()
+        cls.categories, cls.products = seed_catalog(products=2, categories=1, reviews_per_product=0)
+
+    def setUp(self):
+        p1, p2 = self.products
+        self.order = make_order(self.user, [], is_ordered=False)
+        CartItem.objects.create(user=self.user, product=p1, quantity=2)
+        CartItem.objects.create(user=self.user, product=p2, quantity=1)
+        self.client.force_login(self.user)
+
+    def verify(self):
+        with mock.patch('razorpay.Client'):
+            return self.client.post(reverse('verify_payment'), {
+                'razorpay_order_id': 'order_1', 'razorpay_payment_id': 'pay_1',
+                'razorpay_signature': 'sig', 'django_order_number': self.order.order_number,
+            }, content_type='application/json')
+
+    def test_payment_finalizes_the_order(self):
+        p1, p2 = self.products
+        response = self.verify()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.is_ordered)
+        self.assertEqual(OrderProduct.objects.filter(order=self.order).count(), 2)
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+        units = dict(DailyProductSales.objects.values_list('product_id', 'units'))
+        self.assertEqual(units, {p1.id: 2, p2.id: 1})
+        p1.refresh_from_db()
+        self.assertEqual(p1.units_sold, 2)
+        self.assertGreater(p1.trending_score, 0)
+
+    def test_a_failure_leaves_the_order_unpaid(self):
+        with mock.patch('orders.views.record_order_rankings', side_effect=RuntimeError):
+            response = self.verify()
+        self.assertEqual(response.status_code, 500)
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.is_ordered)
+        self.assertFalse(OrderProduct.objects.filter(order=self.order).exists())
+        self.assertFalse(Payment.objects.filter(payment_id='pay_1').exists())
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 2)
+
+
+class OrderArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('Arch', 'Ive', 'arch', 'arch@example.com', 'x')
+        cls.user.is_active = True
+        cls.user.save()
+        cls.other = Account.objects.create_user('Oth', 'Er', 'other', 'other@example.com', 'x')
+        cls.other.is_active = True
+        cls.other.save()
+        cls.categories, cls.products = seed_catalog(products=3, categories=1, reviews_per_product=0)
+        p1, p2, p3 = cls.products
+        long_ago = timezone.now() - datetime.timedelta(days=200)
+        cls.old = make_order(cls.user, [(p1, 2), (p2, 1)], status='Completed', created_at=long_ago)
+        cls.old_open = make_order(cls.user, [(p3, 1)], status='Accepted', created_at=long_ago)
+        cls.recent = make_order(cls.user, [(p2, 1)], status='Completed')
+
+    def test_command_moves_old_finished_orders(self):
+        out = StringIO()
+        call_command('archive_orders', days=90, batch_size=1, pause=0, stdout=out)
+        self.assertIn('Archived 1 orders and 2 lines', out.getvalue())
+        self.assertFalse(Order.objects.filter(id=self.old.id).exists())
+        self.assertFalse(OrderProduct.objects.filter(order_id=self.old.id).exists())
+        archived = ArchivedOrder.objects.get(id=self.old.id)
+        self.assertEqual(archived.order_number, self.old.order_number)
+        self.assertEqual(archived.created_at, Order.objects.filter(id=self.old_open.id).get().created_at)
+        self.assertEqual(ArchivedOrderProduct.objects.filter(order=archived).count(), 2)
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {self.old_open.id, self.recent.id})
+
+    def test_customer_pages_find_archived_orders(self):
+        archive_batch(timezone.now() - datetime.timedelta(days=90))
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('my_orders'))
+        self.assertEqual([o.order_number for o in response.context['orders']],
+                         [self.recent.order_number, self.old_open.order_number, self.old.order_number])
+        self.assertEqual(self.client.get(reverse('dashboard')).context['orders_count'], 3)
+
+        response = self.client.get(reverse('order_detail', args=[self.old.order_number]))
+        self.assertEqual(response.context['subtotal'], self.products[0].price * 2 + self.products[1].price)
+        self.assertIn(self.products[0].id, ordered_product_ids(self.user.id))
+
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(reverse('order_detail', args=[self.old.order_number])).status_code, 404)
+
+    def test_order_history_pages_merge_both_tables(self):
+        archive_batch(timezone.now() - datetime.timedelta(days=90))
+        self.client.force_login(self.user)
+        with mock.patch('accounts.views.ORDERS_PAGE_SIZE', 2):
+            first = self.client.get(reverse('my_orders')).context['orders']
+            second = self.client.get(reverse('my_orders'), {'page': 2}).context['orders']
+        self.assertEqual([o.order_number for o in first], [self.recent.order_number, self.old_open.order_number])
+        self.assertEqual([o.order_number for o in second], [self.old.order_number])
+        self.assertEqual(first.paginator.num_pages, 2)
+        # Each table is read only as far as the page needs
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(user_orders(self.user)[:1]), 1)
+        self.assertTrue(all('LIMIT 1' in query['sql'] for query in queries))
+
+    def test_rebuilt_rollups_include_archived_lines(self):
+        archive_batch(timezone.now() - datetime.timedelta(days=90))
+        rebuild_sales_rollups()
+        units = DailyProductSales.objects.filter(product=self.products[0]).values_list('units', flat=True)
+        self.assertEqual(sum(units), 2)
+
+
+class ReapAbandonedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('Re', 'Aper', 'reaper', 'reaper@example.com', 'x')
+        cls.categories, cls.products = seed_catalog(products=2, categories=1, reviews_per_product=0)
+        p1, p2 = cls.products
+        long_ago = timezone.now() - datetime.timedelta(days=3)
+        cls.stale_unpaid = make_order(cls.user, [(p1, 1)], is_ordered=False, created_at=long_ago)
+        cls.fresh_unpaid = make_order(cls.user, [(p1, 1)], is_ordered=False)
+        cls.old_paid = make_order(cls.user, [(p2, 1)], created_at=long_ago)
+
+        live = SessionStore()
+        live.create()
+        cls.live_cart = Cart.objects.create(cart_id=live.session_key)
+        cls.dead_cart = Cart.objects.create(cart_id='gone')
+        cls.new_cart = Cart.objects.create(cart_id='fresh')
+        Cart.objects.filter(id__in=[cls.live_cart.id, cls.dead_cart.id]).update(date_added=long_ago.date())
+        for cart in (cls.live_cart, cls.dead_cart, cls.new_cart):
+            CartItem.objects.create(cart=cart, product=p1, quantity=1)
+
+    def test_reaps_only_abandoned_rows(self):
+        out = StringIO()
+        call_command('reap_abandoned', batch_size=1, pause=0, stdout=out)
+        self.assertIn('unpaid orders: 2 rows deleted in 1 batches', out.getvalue())
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {self.fresh_unpaid.id, self.old_paid.id})
+        self.assertFalse(OrderProduct.objects.filter(order_id=self.stale_unpaid.id).exists())
+        self.assertEqual(set(Cart.objects.values_list('id', flat=True)), {self.live_cart.id, self.new_cart.id})
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_dry_run_deletes_nothing(self):
+        out = StringIO()
+        call_command('reap_abandoned', dry_run=True, stdout=out)
+        self.assertIn('unpaid orders: 1 would be deleted', out.getvalue())
+        self.assertIn('guest carts: 1 would be deleted', out.getvalue())
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(Cart.objects.count(), 3)
+
+    def test_rows_that_stop_matching_after_selection_are_kept(self):
+        now = timezone.now()
+        # Paid and renewed between the batch select and the delete
+        Order.objects.filter(id=self.stale_unpaid.id).update(is_ordered=True)
+        Cart.objects.filter(id=self.dead_cart.id).update(date_added=now.date())
+        self.assertEqual(delete_unpaid_orders([self.stale_unpaid.id], now), 0)
+        self.assertEqual(delete_guest_carts([self.dead_cart.id], now), 0)
+        self.assertTrue(OrderProduct.objects.filter(order_id=self.stale_unpaid.id).exists())
+        self.assertTrue(CartItem.objects.filter(cart=self.dead_cart).exists())
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cache')
+    def test_keeps_guest_carts_when_sessions_are_not_in_the_database(self):
+        out = StringIO()
+        call_command('reap_abandoned', pause=0, stdout=out)
+        self.assertIn('guest carts: skipped', out.getvalue())
+        self.assertEqual(Cart.objects.count(), 3)
+        self.assertEqual(CartItem.objects.count(), 3)
+
+
+class OrderStatusStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('Stre', 'Am', 'stream', 'stream@example.com', 'x')
+        cls.user.is_active = True
+        cls.user.save()
+        cls.other = Account.objects.create_user('Oth', 'Er', 'other', 'other@example.com', 'x')
+        cls.other.is_active = True
+        cls.other.save()
+        cls.categories, cls.products = seed_catalog(products=1, categories=1, reviews_per_product=0)
+        cls.order = make_order(cls.user, [(cls.products[0], 1)])
+
+    def url(self):
+        return reverse('order_status_stream', args=[self.order.order_number])
+
+    def test_save_publishes_only_status_changes(self):
+        order = Order.objects.get(id=self.order.id)
+        with mock.patch.object(status_events, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                order.order_note = 'Ring twice'
+                order.save()
+            publish.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                order.status = 'Accepted'
+                order.save()
+            publish.assert_called_once_with(order.id, 'Accepted')
+
+    def test_wsgi_gets_current_status_once(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url())
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn(b'"status": "New"', response.content)
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(self.url()).status_code, 404)
+
+    async def test_stream_pushes_published_statuses(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url())
+        events = aiter(response.streaming_content)
+        self.assertIn(b'"status": "New"', await anext(events))
+        self.assertEqual(status_events.subscriber_count(self.order.id), 1)
+
+        # Published from another thread, as a sync view or the admin would
+        await asyncio.to_thread(status_events.publish, self.order.id, 'Accepted')
+        self.assertIn(b'"status": "Accepted"', await asyncio.wait_for(anext(events), 5))
+        await asyncio.to_thread(status_events.publish, self.order.id, 'Completed')
+        self.assertIn(b'"status": "Completed"', await asyncio.wait_for(anext(events), 5))
+        with self.assertRaises(StopAsyncIteration):
+            await anext(events)
+        self.assertEqual(status_events.subscriber_count(self.order.id), 0)
+
+
+class KitchenQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cook = Account.objects.create_user('Co', 'Ok', 'cook', 'cook@example.com', 'x')
+        cls.cook.is_active = True
+        cls.cook.is_staff = True
+        cls.cook.save()
+        cls.customer = Account.objects.create_user('Cus', 'Tomer', 'customer', 'customer@example.com', 'x')
+        cls.customer.is_active = True
+        cls.customer.save()
+        cls.categories, cls.products = seed_catalog(products=2, categories=1, reviews_per_product=0)
+        p1, p2 = cls.products
+        cls.first = make_order(cls.customer, [(p1, 2), (p2, 1)])
+        cls.second = make_order(cls.customer, [(p2, 3)])
+        cls.done = make_order(cls.customer, [(p1, 1)], status='Completed')
+        cls.unpaid = make_order(cls.customer, [(p1, 1)], is_ordered=False)
+
+    def test_feed_returns_open_orders_with_lines_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            orders, cursor = queue_feed()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([order['id'] for order in orders], [self.first.id, self.second.id])
+        self.assertEqual([line['quantity'] for line in orders[0]['lines']], [2, 1])
+
+        # Only orders changed since the cursor come back, plus the short overlap window
+        long_ago = cursor - datetime.timedelta(hours=1)
+        Order.objects.update(updated_at=long_ago)
+        self.assertEqual(queue_feed(cursor)[0], [])
+        transition_order(self.second.id, 'accept')
+        orders, next_cursor = queue_feed(cursor)
+        self.assertEqual([(order['id'], order['status']) for order in orders], [(self.second.id, 'Accepted')])
+        self.assertGreater(next_cursor, cursor)
+
+    def test_only_one_cook_can_accept(self):
+        self.client.force_login(self.cook)
+        url = reverse('kitchen_transition', args=[self.first.id, 'accept'])
+        with mock.patch.object(status_events, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                first = self.client.post(url)
+                second = self.client.post(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 409)
+        self.assertEqual(second.json()['status'], 'Accepted')
+        publish.assert_called_once_with(self.first.id, 'Accepted')
+
+        complete = self.client.post(reverse('kitchen_transition', args=[self.first.id, 'complete']))
+        self.assertEqual(complete.json()['status'], 'Completed')
+        unpaid = self.client.post(reverse('kitchen_transition', args=[self.unpaid.id, 'accept']))
+        self.assertEqual(unpaid.status_code, 409)
+
+    def test_queue_is_staff_only(self):
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get(reverse('kitchen_feed')).status_code, 302)
+        self.client.force_login(self.cook)
+        response = self.client.get(reverse('kitchen_feed'), {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('kitchen_feed'), {'since': '2025-13-45T00:00:00'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('kitchen_queue')).status_code, 200)
+
+
+@override_settings(KITCHEN_SLOT_MINUTES=15, KITCHEN_SLOT_ORDERS=2, KITCHEN_SLOT_ITEMS=10,
+                   KITCHEN_QUEUE_SLOTS=1, KITCHEN_OFFER_SLOTS=3, KITCHEN_PAYMENT_HOLD_MINUTES=15)
+class KitchenAdmissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Account.objects.create_user('Cus', 'Tomer', 'customer', 'customer@example.com', 'x')
+        cls.customer.is_active = True
+        cls.customer.save()
+        cls.categories, cls.products = seed_catalog(products=1, categories=1, reviews_per_product=0)
+
+    def setUp(self):
+        cache.clear()
+        # Two minutes into a slot, so the test never straddles a boundary
+        self.now = slot_start(timezone.now()) + datetime.timedelta(minutes=2)
+        patcher = mock.patch('django.utils.timezone.now', return_value=self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.slot = slot_start(self.now)
+        self.step = datetime.timedelta(minutes=15)
+
+    def test_decisions_as_slots_fill(self):
+        decisions = [(admission.decision, admission.slot) for admission in (admit(1) for _ in range(6))]
+        self.assertEqual(decisions, [
+            ('accept', self.slot), ('accept', self.slot),
+            ('queue', self.slot + self.step), ('queue', self.slot + self.step),
+            # Offered only, so nothing is held until the customer confirms
+            ('later', self.slot + 2 * self.step), ('later', self.slot + 2 * self.step),
+        ])
+        self.assertEqual(admit(1, earliest=self.slot + 2 * self.step).decision, 'queue')
+        admit(1, earliest=self.slot + 2 * self.step)
+        admit(1, earliest=self.slot + 3 * self.step)
+        admit(1, earliest=self.slot + 3 * self.step)
+        self.assertEqual(admit(1).decision, 'full')
+
+    def test_a_confirmed_slot_that_filled_is_offered_again(self):
+        offered = self.slot + 2 * self.step
+        for _ in range(2):
+            admit(1, earliest=offered)
+        # Another customer took the last places meanwhile: offer the next slot, hold nothing
+        admission = admit(1, earliest=offered)
+        self.assertEqual((admission.decision, admission.slot), ('later', offered + self.step))
+        self.assertEqual(cache.get(f'kitchen_slot:{int((offered + self.step).timestamp())}:orders'), 0)
+        for _ in range(2):
+            admit(1, earliest=offered + self.step)
+        # Nothing left before the offer horizon
+        self.assertEqual(admit(1, earliest=offered + self.step).decision, 'full')
+
+    def test_item_limit_and_oversized_orders(self):
+        self.assertEqual(admit(8).decision, 'accept')
+        self.assertEqual(admit(3).slot, self.slot + self.step)
+        # Bigger than a whole slot: it still gets an empty slot to itself
+        self.assertEqual(admit(25).slot, self.slot + 2 * self.step)
+
+    def test_concurrent_checkouts_never_overbook(self):
+        reconcile_slots()
+        with override_settings(KITCHEN_SLOT_ORDERS=5, KITCHEN_QUEUE_SLOTS=0, KITCHEN_OFFER_SLOTS=0):
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                decisions = list(pool.map(lambda _: admit(1).decision, range(64)))
+            self.assertEqual(decisions.count('accept'), 5)
+            self.assertEqual(decisions.count('full'), 59)
+            self.assertEqual(cache.get(f'kitchen_slot:{int(self.slot.timestamp())}:orders'), 5)
+
+    def test_reconcile_releases_cancelled_and_stale_unpaid_orders(self):
+        product = self.products[0]
+        paid = make_order(self.customer, [(product, 2)])
+        cancelled = make_order(self.customer, [(product, 1)], status='Cancelled')
+        fresh = make_order(self.customer, [(product, 3)], is_ordered=False)
+        stale = make_order(self.customer, [(product, 4)], is_ordered=False,
+                           created_at=self.now - datetime.timedelta(hours=1))
+        for order, items in ((paid, 2), (cancelled, 1), (fresh, 3), (stale, 4)):
+            Order.objects.filter(id=order.id).update(kitchen_slot=self.slot, kitchen_items=items)
+
+        self.assertEqual(reconcile_slots([self.slot]), {self.slot: (2, 5)})
+        self.assertEqual(admit(1).decision, 'queue')
+        out = StringIO()
+        call_command('reconcile_kitchen_slots', stdout=out)
+        self.assertIn('2 orders', out.getvalue())
+
+    def test_place_order_when_kitchen_is_full(self):
+        CartItem.objects.create(user=self.customer, product=self.products[0], quantity=2)
+        self.client.force_login(self.customer)
+        form = {
+            'first_name': 'Cus', 'last_name': 'Tomer', 'phone': '999', 'email': 'customer@example.com',
+            'address_line_1': '1 Street', 'country': 'IN', 'state': 'KA', 'city': 'Bengaluru',
+        }
+        response = self.client.post(reverse('place_order'), form)
+        self.assertTemplateUsed(response, 'orders/payments.html')
+        self.assertEqual(Order.objects.get().kitchen_slot, self.slot)
+
+        with override_settings(KITCHEN_SLOT_ORDERS=1, KITCHEN_QUEUE_SLOTS=0, KITCHEN_OFFER_SLOTS=0):
+            response = self.client.post(reverse('place_order'), form)
+        self.assertTemplateUsed(response, 'store/checkout.html')
+        self.assertEqual(response.context['admission'].decision, 'full')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_only_a_genuine_offer_books_a_later_slot(self):
+        for _ in range(4):
+            admit(1)
+        CartItem.objects.create(user=self.customer, product=self.products[0], quantity=1)
+        self.client.force_login(self.customer)
+        form = {
+            'first_name': 'Cus', 'last_name': 'Tomer', 'phone': '999', 'email': 'customer@example.com',
+            'address_line_1': '1 Street', 'country': 'IN', 'state': 'KA', 'city': 'Bengaluru',
+        }
+        response = self.client.post(reverse('place_order'), form)
+        admission = response.context['admission']
+        self.assertEqual((admission.decision, admission.slot), ('later', self.slot + 2 * self.step))
+
+        forged = [
+            '2099-01-01T00:00:00+00:00',
+            '2026-13-45T00:00',
+            signing.dumps(int(datetime.datetime(2099, 1, 1, tzinfo=datetime.timezone.utc).timestamp()), salt=OFFER_SALT),
+        ]
+        for kitchen_slot in forged:
+            response = self.client.post(reverse('place_order'), dict(form, kitchen_slot=kitchen_slot))
+            self.assertEqual(response.context['admission'].decision, 'later')
+        self.assertFalse(Order.objects.exists())
+
+        response = self.client.post(reverse('place_order'), dict(form, kitchen_slot=admission.offer))
+        self.assertTemplateUsed(response, 'orders/payments.html')
+        self.assertEqual(Order.objects.get().kitchen_slot, self.slot + 2 * self.step)
+
+    def test_counter_evicted_mid_reservation_is_reseeded(self):
+        reconcile_slots()
+        incr = cache.incr
+        evicted = []
+
+        def evict_once(key, delta=1):
+            if not evicted:
+                evicted.append(key)
+                cache.delete(key)
+            return incr(key, delta)
+
+        with mock.patch.object(cache, 'incr', side_effect=evict_once):
+            self.assertEqual(admit(1).decision, 'accept')
+        self.assertEqual(cache.get(evicted[0]), 1)
@@ -7,4 +7,8 @@ urlpatterns = [
     path('order_complete/', views.order_complete, name='order_complete'),
     path('start_payment/', views.start_payment, name='start_payment'),
     path('verify_payment/', views.verify_payment, name='verify_payment'),
+    path('status/<str:order_number>/', views.order_status_stream, name='order_status_stream'),
+    path('kitchen/', views.kitchen_queue, name='kitchen_queue'),
+    path('kitchen/feed/', views.kitchen_feed, name='kitchen_feed'),
+    path('kitchen/<int:order_id>/<str:action>/', views.kitchen_transition, name='kitchen_transition'),
 ]
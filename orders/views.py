@@ -1,18 +1,30 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, JsonResponse
-from carts.models import CartItem
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from carts.models import CartItem, forget_cart_products
 from .forms import OrderForm
 import datetime
-from .models import Order, Payment, OrderProduct
+from .models import ArchivedOrder, Order, Payment, OrderProduct
+from . import status_events
+from analytics.rollups import record_order_sales
+from analytics.rankings import record_order_rankings
+import asyncio
 import json
 from store.models import Product
 from django.core.mail import EmailMessage
+from django.db import transaction
 from django.template.loader import render_to_string
 
 # --- Add these imports for Razorpay ---
-import razorpay
+# razorpay itself is imported inside the payment views: it pulls in requests
+# and urllib3 (~45 ms), which every worker would otherwise pay at startup
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt # To allow POST from Razorpay JS
+from django.views.decorators.http import require_POST
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.dateparse import parse_datetime
+from mohifoodspro.ratelimit import rate_limit
+from .admission import admit, offered_slot
+from .kitchen import KITCHEN_TRANSITIONS, queue_feed, transition_order
 # ------------------------------------
 
 
@@ -61,8 +73,12 @@ def payments(request):
                 # Handle case where product might have been deleted
                 pass # Or log an error
 
+        record_order_sales(order)
+        record_order_rankings(order)
+
         # Clear cart
         CartItem.objects.filter(user=request.user).delete()
+        forget_cart_products(user_id=request.user.id)
 
         # Send order recieved email to customer
         mail_subject = 'Thank you for your order!'
@@ -116,6 +132,19 @@ def place_order(request, total=0, quantity=0,):
     if request.method == 'POST':
         form = OrderForm(request.POST)
         if form.is_valid():
+            # Reserve kitchen capacity; a confirmed later slot comes back signed as kitchen_slot
+            admission = admit(quantity, earliest=offered_slot(request.POST.get('kitchen_slot')))
+            if not admission.admitted:
+                context = {
+                    'form': form,
+                    'cart_items': cart_items,
+                    'total': total,
+                    'tax': tax,
+                    'grand_total': grand_total,
+                    'admission': admission,
+                }
+                return render(request, 'store/checkout.html', context)
+
             # Store all the billing information inside Order table
             data = Order()
             data.user = current_user
@@ -132,6 +161,8 @@ def place_order(request, total=0, quantity=0,):
             data.order_total = grand_total # Store original total
             data.tax = tax
             data.ip = request.META.get('REMOTE_ADDR')
+            data.kitchen_slot = admission.slot
+            data.kitchen_items = quantity
             data.save()
             # Generate order number
             yr = int(datetime.date.today().strftime('%Y'))
@@ -156,6 +187,7 @@ def place_order(request, total=0, quantity=0,):
                 'grand_total': grand_total,
                 'grand_total_paisa': grand_total_paisa, # Amount for Razorpay
                 'razorpay_key_id': settings.RAZORPAY_KEY_ID, # Pass Key ID
+                'admission': admission,
             }
             return render(request, 'orders/payments.html', context)
         else:
@@ -177,8 +209,10 @@ def place_order(request, total=0, quantity=0,):
 
 # --- NEW: Razorpay Start Payment View ---
 @csrf_exempt # Use this decorator initially, consider proper CSRF later
+@rate_limit('payment')
 def start_payment(request):
     if request.method == 'POST':
+        import razorpay
         try:
             data = json.loads(request.body)
             amount = int(data['amount']) # Amount should be in paisa
@@ -227,6 +261,7 @@ def start_payment(request):
 @csrf_exempt # Use this decorator initially
 def verify_payment(request):
     if request.method == 'POST':
+        import razorpay
         try:
             data = json.loads(request.body)
             razorpay_order_id = data.get('razorpay_order_id')
@@ -252,57 +287,55 @@ def verify_payment(request):
 
             # --- Critical Section: Update Database ---
             try:
-                # Find your internal order - ensure it belongs to the logged-in user and is not already paid
-                order = Order.objects.get(user=request.user, is_ordered=False, order_number=django_order_number)
-
-                # Create Payment record
-                payment = Payment(
-                    user=request.user,
-                    payment_id=razorpay_payment_id, # Store Razorpay's ID
-                    payment_method='Razorpay',
-                    amount_paid=order.order_total, # Amount from your order record
-                    status='Completed' # Status from signature verification success
-                )
-                payment.save()
-
-                # Update Order
-                order.payment = payment
-                order.is_ordered = True
-                order.save()
-
-                # Move cart items to OrderProduct (Your existing logic)
-                cart_items = CartItem.objects.filter(user=request.user)
-                for item in cart_items:
-                    orderproduct = OrderProduct()
-                    orderproduct.order_id = order.id
-                    orderproduct.payment = payment
-                    orderproduct.user_id = request.user.id
-                    orderproduct.product_id = item.product_id
-                    orderproduct.quantity = item.quantity
-                    orderproduct.product_price = item.product.price
-                    orderproduct.ordered = True
-                    orderproduct.save()
-
-                    # Link variations
-                    try:
-                        cart_item_obj = CartItem.objects.get(id=item.id) # Fetch again to be safe
-                        product_variation = cart_item_obj.variations.all()
-                        orderproduct_saved = OrderProduct.objects.get(id=orderproduct.id)
-                        orderproduct_saved.variations.set(product_variation)
-                        orderproduct_saved.save()
-                    except CartItem.DoesNotExist:
-                        print(f"Warning: CartItem {item.id} not found during OrderProduct variation linking.")
-                    
-                    # Reduce stock
-                    try:
-                        product = Product.objects.get(id=item.product_id)
-                        product.stock -= item.quantity
-                        product.save()
-                    except Product.DoesNotExist:
-                         print(f"Warning: Product {item.product_id} not found during stock reduction.")
-
-                # Clear cart
-                CartItem.objects.filter(user=request.user).delete()
+                # All or nothing, so a failure can't leave a paid order without its lines or sales
+                with transaction.atomic():
+                    # Find your internal order - ensure it belongs to the logged-in user and is not already paid
+                    order = Order.objects.select_for_update().get(
+                        user=request.user, is_ordered=False, order_number=django_order_number,
+                    )
+
+                    # Create Payment record
+                    payment = Payment(
+                        user=request.user,
+                        payment_id=razorpay_payment_id, # Store Razorpay's ID
+                        payment_method='Razorpay',
+                        amount_paid=order.order_total, # Amount from your order record
+                        status='Completed' # Status from signature verification success
+                    )
+                    payment.save()
+
+                    # Update Order
+                    order.payment = payment
+                    order.is_ordered = True
+                    order.save()
+
+                    # Move cart items to OrderProduct (Your existing logic)
+                    cart_items = CartItem.objects.filter(user=request.user).select_related('product')
+                    for item in cart_items:
+                        orderproduct = OrderProduct()
+                        orderproduct.order_id = order.id
+                        orderproduct.payment = payment
+                        orderproduct.user_id = request.user.id
+                        orderproduct.product_id = item.product_id
+                        orderproduct.quantity = item.quantity
+                        orderproduct.product_price = item.product.price
+                        orderproduct.ordered = True
+                        orderproduct.save()
+
+                        # Reduce stock
+                        try:
+                            product = Product.objects.get(id=item.product_id)
+                            product.stock -= item.quantity
+                            product.save()
+                        except Product.DoesNotExist:
+                             print(f"Warning: Product {item.product_id} not found during stock reduction.")
+
+                    record_order_sales(order)
+                    record_order_rankings(order)
+
+                    # Clear cart
+                    CartItem.objects.filter(user=request.user).delete()
+                forget_cart_products(user_id=request.user.id)
 
                 # Send email (Your existing logic)
                 mail_subject = 'Thank you for your order!'
@@ -381,4 +414,91 @@ def order_complete(request):
         return redirect('home') # Redirect if order/payment not found for the user
     except Exception as e:
         print(f"Error in order_complete view: {e}")
-        return redirect('home') # Generic error handling
\ No newline at end of file
+        return redirect('home') # Generic error handling
+
+
+# --- Server-Sent Events stream of one order's status ---
+def _status_event(order_number, status):
+    return f'event: status\ndata: {json.dumps({"order_number": order_number, "status": status})}\n\n'
+
+
+async def _status_events(order_id, order_number, status):
+    queue = status_events.subscribe(order_id)
+    try:
+        # Re-read after subscribing so a change made in between isn't missed
+        status = await Order.objects.filter(id=order_id).values_list('status', flat=True).afirst() or status
+        yield 'retry: 5000\n' + _status_event(order_number, status)
+        while status not in status_events.FINAL_ORDER_STATUSES:
+            try:
+                new_status = await asyncio.wait_for(queue.get(), settings.ORDER_STATUS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # Catches changes saved by other processes, and keeps proxies from closing the connection
+                new_status = await Order.objects.filter(id=order_id).values_list('status', flat=True).afirst()
+                if new_status is None:
+                    return
+            if new_status == status:
+                yield ': keepalive\n\n'
+                continue
+            status = new_status
+            yield _status_event(order_number, status)
+    finally:
+        status_events.unsubscribe(order_id, queue)
+
+
+async def order_status_stream(request, order_number):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    order = await Order.objects.filter(user=user, order_number=order_number).values('id', 'status').afirst()
+    if order is None:
+        # Archived orders are finished, so there's nothing to wait for
+        order = await ArchivedOrder.objects.filter(user=user, order_number=order_number).values('id', 'status').afirst()
+        if order is None:
+            raise Http404('No order matches the given query.')
+        return HttpResponse(_status_event(order_number, order['status']), content_type='text/event-stream')
+
+    if 'wsgi.version' in request.META or order['status'] in status_events.FINAL_ORDER_STATUSES:
+        # Under WSGI a held-open stream would tie up a worker thread, so send the
+        # current status and let EventSource reconnect after the retry delay
+        return HttpResponse('retry: 5000\n' + _status_event(order_number, order['status']),
+                            content_type='text/event-stream')
+
+    response = StreamingHttpResponse(_status_events(order['id'], order_number, order['status']),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# --- Kitchen order queue (staff) ---
+@staff_member_required
+def kitchen_queue(request):
+    transitions = {action: {'from': list(from_statuses), 'to': to_status}
+                   for action, (from_statuses, to_status) in KITCHEN_TRANSITIONS.items()}
+    return render(request, 'orders/kitchen.html', {'transitions': transitions})
+
+
+@staff_member_required
+def kitchen_feed(request):
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = parse_datetime(request.GET['since'])
+        except ValueError:
+            # Well formed but out of range, like month 13
+            since = None
+        if since is None:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    orders, cursor = queue_feed(since)
+    return JsonResponse({'orders': orders, 'cursor': cursor.isoformat()})
+
+
+@staff_member_required
+@require_POST
+def kitchen_transition(request, order_id, action):
+    if action not in KITCHEN_TRANSITIONS:
+        return JsonResponse({'error': 'Unknown action'}, status=400)
+    changed, status = transition_order(order_id, action)
+    if status is None:
+        return JsonResponse({'error': 'Order not found'}, status=404)
+    return JsonResponse({'id': order_id, 'status': status}, status=200 if changed else 409)
@@ -0,0 +1,190 @@
+import hashlib
+import json
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Avg, Count, Q
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_GET
+
+from category.models import Category
+from mohifoodspro.db_router import replica_reads
+from .models import Product, ProductGallery
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+API_CACHE_SECONDS = 60
+
+PRODUCT_FIELDS = (
+    'id', 'product_name', 'slug', 'description', 'price', 'stock', 'is_available',
+    'category', 'image', 'url', 'rating', 'review_count', 'gallery',
+    'created_date', 'modified_date',
+)
+DEFAULT_PRODUCT_FIELDS = (
+    'id', 'product_name', 'slug', 'price', 'stock', 'category', 'image', 'url',
+    'rating', 'review_count',
+)
+CATEGORY_FIELDS = ('id', 'category_name', 'slug', 'description', 'image', 'url')
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+
+def api_response(request, data):
+    """Serialize data and answer If-None-Match with a 304 when the body is unchanged."""
+    body = dumps(data)
+    etag = '"%s"' % hashlib.md5(body).hexdigest()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=API_CACHE_SECONDS)
+    return response
+
+
+def api_error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _selected_fields(request, allowed, default):
+    raw = request.GET.get('fields')
+    if not raw:
+        return default
+    fields = tuple(f for f in (part.strip() for part in raw.split(',')) if f)
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError('Unknown fields: ' + ', '.join(unknown))
+    return fields
+
+
+def _int_param(request, name, default):
+    raw = request.GET.get(name)
+    if raw in (None, ''):
+        return default
+    return int(raw)
+
+
+def _product_rows(queryset, fields):
+    """Return (id, item) pairs, adding only the joins and aggregates the fields need."""
+    columns = ['id', 'slug', 'category__slug']
+    for name in ('product_name', 'description', 'price', 'stock', 'is_available', 'created_date', 'modified_date'):
+        if name in fields:
+            columns.append(name)
+    if 'image' in fields:
+        columns.append('images')
+    if 'category' in fields:
+        columns.extend(['category_id', 'category__category_name'])
+
+    annotations = {}
+    if 'rating' in fields:
+        annotations['avg_rating'] = Avg('reviewrating__rating', filter=Q(reviewrating__status=True))
+    if 'review_count' in fields:
+        annotations['num_reviews'] = Count('reviewrating', filter=Q(reviewrating__status=True))
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+        columns.extend(annotations)
+
+    rows = list(queryset.values(*columns))
+
+    gallery = {}
+    if 'gallery' in fields and rows:
+        images = ProductGallery.objects.filter(product_id__in=[row['id'] for row in rows]).order_by('id')
+        for product_id, image in images.values_list('product_id', 'image'):
+            gallery.setdefault(product_id, []).append(default_storage.url(image))
+
+    results = []
+    for row in rows:
+        item = {}
+        for name in fields:
+            if name == 'image':
+                item['image'] = default_storage.url(row['images']) if row['images'] else None
+            elif name == 'url':
+                item['url'] = reverse('product_detail', args=[row['category__slug'], row['slug']])
+            elif name == 'category':
+                item['category'] = {
+                    'id': row['category_id'],
+                    'slug': row['category__slug'],
+                    'name': row['category__category_name'],
+                }
+            elif name == 'rating':
+                item['rating'] = float(row['avg_rating']) if row['avg_rating'] is not None else 0
+            elif name == 'review_count':
+                item['review_count'] = row['num_reviews']
+            elif name == 'gallery':
+                item['gallery'] = gallery.get(row['id'], [])
+            else:
+                item[name] = row[name]
+        results.append((row['id'], item))
+    return results
+
+
+@replica_reads
+@require_GET
+def product_list(request):
+    try:
+        fields = _selected_fields(request, PRODUCT_FIELDS, DEFAULT_PRODUCT_FIELDS)
+        after = _int_param(request, 'after', 0)
+        limit = min(max(_int_param(request, 'limit', DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    except ValueError as e:
+        return api_error(str(e))
+
+    products = Product.objects.filter(is_available=True, id__gt=after).order_by('id')
+    category = request.GET.get('category')
+    if category:
+        products = products.filter(category__slug__in=category.split(','))
+
+    rows = _product_rows(products[:limit + 1], fields)
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        params = request.GET.copy()
+        params['after'] = rows[-1][0]
+        next_url = request.path + '?' + params.urlencode()
+
+    return api_response(request, {'results': [item for _, item in rows], 'next': next_url})
+
+
+@replica_reads
+@require_GET
+def product_detail(request, product_slug):
+    try:
+        fields = _selected_fields(request, PRODUCT_FIELDS, PRODUCT_FIELDS)
+    except ValueError as e:
+        return api_error(str(e))
+    rows = _product_rows(Product.objects.filter(slug=product_slug, is_available=True), fields)
+    if not rows:
+        raise Http404('Product not found')
+    return api_response(request, rows[0][1])
+
+
+@replica_reads
+@require_GET
+def category_list(request):
+    try:
+        fields = _selected_fields(request, CATEGORY_FIELDS, CATEGORY_FIELDS)
+    except ValueError as e:
+        return api_error(str(e))
+
+    results = []
+    for row in Category.objects.order_by('id').values('id', 'category_name', 'slug', 'description', 'cat_image'):
+        item = {}
+        for name in fields:
+            if name == 'image':
+                item['image'] = default_storage.url(row['cat_image']) if row['cat_image'] else None
+            elif name == 'url':
+                item['url'] = reverse('products_by_category', args=[row['slug']])
+            else:
+                item[name] = row[name]
+        results.append(item)
+    return api_response(request, {'results': results})
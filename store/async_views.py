@@ -0,0 +1,120 @@
+"""Async versions of the catalog pages for ASGI deployments.
+
+With ASYNC_CATALOG_VIEWS on, the URLconf routes home, store, product_detail
+and search here instead of the sync views. They build the same querysets
+(shared with store.views) but run them with the async ORM, so a request
+waiting on the database doesn't hold a worker thread.
+
+Templates and context processors still run synchronously, and a query
+started there raises SynchronousOnlyOperation in an async view. arender()
+therefore loads everything they would fetch lazily (the user, the session,
+the category menu and the cart counter) before rendering, and the views
+hand templates lists, never querysets.
+"""
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.http import Http404
+from django.shortcuts import render
+
+from analytics.recommendations import ordered_together
+from carts.guest_cart import aguest_cart_quantities
+from carts.models import acart_quantities
+from category.models import Category
+from mohifoodspro.db_router import replica_reads
+from mohifoodspro.ratelimit import rate_limit
+from mohifoodspro.single_flight import aget_or_compute
+from mohifoodspro.views import home_products
+from orders.models import aordered_product_ids
+from .facets import facet_index
+from .models import Product, ProductGallery, aproduct_detail_version
+from .views import (
+    PRODUCT_DETAIL_CACHE_TIMEOUT, REVIEWS_PAGE_SIZE, product_detail_cache_key, product_detail_data,
+    product_detail_queryset, review_page, review_query, search_products, store_context, store_listing,
+)
+
+
+async def cart_for(request):
+    if request.user.is_authenticated:
+        return await acart_quantities(user_id=request.user.id)
+    return await aguest_cart_quantities(request)
+
+
+async def arender(request, template_name, context, cart=None):
+    """render() for async views, with the context processors' data loaded first."""
+    request.user = await request.auser()
+    # Loads the session, so messages and the guest cart read it without a query
+    await request.session.aitems()
+    if cart is None:
+        cart = await cart_for(request)
+    request.cart_count = sum(cart.values())
+    request.menu_links = [category async for category in Category.objects.all()]
+    return render(request, template_name, context)
+
+
+@replica_reads
+async def home(request):
+    products = [product async for product in home_products()]
+    return await arender(request, 'home.html', {'products': products})
+
+
+@replica_reads
+async def store(request, category_slug=None):
+    categories = None
+    if category_slug is not None:
+        try:
+            categories = await Category.objects.aget(slug=category_slug)
+        except Category.DoesNotExist:
+            raise Http404('No Category matches the given query.')
+
+    # May rebuild the bitmap index, which is CPU work plus two queries
+    index = await sync_to_async(facet_index)()
+    state, counts, products, per_page = store_listing(request, index, categories)
+    paginator = Paginator(products, per_page)
+    # count is a cached_property, so filling it in keeps get_page() from querying
+    paginator.count = await products.acount()
+    paged_products = paginator.get_page(request.GET.get('page'))
+    paged_products.object_list = [product async for product in paged_products.object_list]
+
+    context = store_context(index, state, counts, paged_products, show_categories=category_slug is None)
+    return await arender(request, 'store/store.html', context)
+
+
+async def _product_detail_data(category_slug, product_slug):
+    async def load():
+        try:
+            single_product = await product_detail_queryset().aget(category__slug=category_slug, slug=product_slug)
+        except Product.DoesNotExist:
+            raise Http404('No Product matches the given query.')
+        rows = [review async for review in review_query(single_product.id)[:REVIEWS_PAGE_SIZE + 1]]
+        reviews, next_cursor = review_page(rows)
+        product_gallery = [image async for image in ProductGallery.objects.filter(product_id=single_product.id)]
+        return product_detail_data(single_product, reviews, next_cursor, product_gallery)
+
+    version = await aproduct_detail_version(product_slug)
+    key = product_detail_cache_key(category_slug, product_slug)
+    return await aget_or_compute(key, load, PRODUCT_DETAIL_CACHE_TIMEOUT, version=version)
+
+
+async def product_detail(request, category_slug, product_slug):
+    context = dict(await _product_detail_data(category_slug, product_slug))
+    product_id = context['single_product'].id
+
+    request.user = await request.auser()
+    cart = await cart_for(request)
+    context['in_cart'] = product_id in cart
+    context['orderproduct'] = None
+    if request.user.is_authenticated:
+        context['orderproduct'] = product_id in await aordered_product_ids(request.user.id)
+    context['ordered_together'] = await sync_to_async(ordered_together)(product_id)
+    return await arender(request, 'store/product_detail.html', context, cart=cart)
+
+
+@replica_reads
+@rate_limit('search')
+async def search(request):
+    products = [product async for product in search_products(request)]
+    context = {
+        'products': products,
+        'product_count': len(products),
+    }
+    return await arender(request, 'store/store.html', context)
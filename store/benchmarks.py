@@ -0,0 +1,100 @@
+"""Helpers shared by the bench_* management commands.
+
+Benchmarks run against a throwaway test database so they never touch real
+data, and seed a synthetic catalog sized by the caller.
+"""
+import importlib
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import clear_url_caches
+
+from category.models import Category
+from .models import Product, ReviewRating, recount_category_products
+
+
+@contextmanager
+def temporary_database(verbosity=0):
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        # Load tests send every request from one address
+        with override_settings(RATE_LIMITS={}):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def _reload_urlconf():
+    import mohifoodspro.urls
+    import store.urls
+
+    clear_url_caches()
+    importlib.reload(store.urls)
+    importlib.reload(mohifoodspro.urls)
+
+
+@contextmanager
+def catalog_views(use_async):
+    """Route the catalog pages to the async or the sync views while inside the block."""
+    with override_settings(ASYNC_CATALOG_VIEWS=use_async):
+        _reload_urlconf()
+        try:
+            yield
+        finally:
+            clear_url_caches()
+    _reload_urlconf()
+
+
+def seed_catalog(products=200, categories=5, reviews_per_product=3, user=None):
+    """Create categories and products, plus reviews when a user is given."""
+    cats = Category.objects.bulk_create([
+        Category(category_name=f'Category {i}', slug=f'category-{i}')
+        for i in range(categories)
+    ])
+    items = Product.objects.bulk_create([
+        Product(
+            product_name=f'Product {i}',
+            slug=f'product-{i}',
+            description=f'Description for product {i}',
+            price=50 + i % 200,
+            images='photos/products/chips1.png',
+            stock=i % 30,
+            category=cats[i % categories],
+        )
+        for i in range(products)
+    ], batch_size=500)
+    recount_category_products([category.id for category in cats])
+    if user is not None and reviews_per_product:
+        ReviewRating.objects.bulk_create([
+            ReviewRating(product=product, user=user, subject='Tasty', rating=(j % 10 + 1) / 2)
+            for product in items
+            for j in range(reviews_per_product)
+        ], batch_size=500)
+    return cats, items
+
+
+def requests_per_second(func, duration=2.0):
+    """Call func repeatedly for about `duration` seconds and return calls per second."""
+    count = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while time.perf_counter() < deadline:
+        func()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def parse_importtime(output):
+    """Turn `python -X importtime` stderr into (module, self us, cumulative us) tuples."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
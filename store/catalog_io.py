@@ -0,0 +1,84 @@
+"""Record format shared by the export_catalog and import_catalog commands.
+
+Each record is a category or a product. In JSONL every line is one record
+object; in CSV the same keys are columns and a product's gallery images are
+joined with '|'. Products refer to their category by slug, and image values
+are storage names relative to MEDIA_ROOT (e.g. 'photos/products/chips1.png').
+
+read_records() yields each record with its line number, and clean_record()
+checks and converts it, raising ValueError with the reason for a bad one.
+"""
+import csv
+import json
+
+CATALOG_FIELDS = [
+    'type', 'slug', 'name', 'description', 'category', 'price', 'stock',
+    'is_available', 'image', 'gallery',
+]
+GALLERY_SEPARATOR = '|'
+REQUIRED_FIELDS = {
+    'category': ('slug', 'name'),
+    'product': ('slug', 'name', 'category', 'price', 'stock'),
+}
+
+
+def write_records(f, fmt, records):
+    if fmt == 'csv':
+        writer = csv.DictWriter(f, fieldnames=CATALOG_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for record in records:
+            if 'gallery' in record:
+                record = dict(record, gallery=GALLERY_SEPARATOR.join(record['gallery']))
+            writer.writerow(record)
+    else:
+        for record in records:
+            f.write(json.dumps(record, separators=(',', ':')))
+            f.write('\n')
+
+
+def read_records(f, fmt):
+    """Yield (line number, record) pairs. A JSONL line that doesn't parse comes back as its text."""
+    if fmt == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            record = {key: value for key, value in row.items() if key is not None and value not in (None, '')}
+            if record.get('type') == 'product' and 'gallery' in row:
+                gallery = row['gallery'] or ''
+                record['gallery'] = [name for name in gallery.split(GALLERY_SEPARATOR) if name]
+            yield reader.line_num, record
+    else:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError:
+                    yield number, line
+
+
+def clean_record(record):
+    """Check a record's type and required fields and convert its values; raise ValueError if it is bad."""
+    if not isinstance(record, dict) or record.get('type') not in REQUIRED_FIELDS:
+        raise ValueError('not a category or product record')
+    missing = [key for key in REQUIRED_FIELDS[record['type']] if record.get(key) in (None, '')]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    if record['type'] == 'product':
+        for key in ('price', 'stock'):
+            try:
+                record[key] = int(record[key])
+            except (TypeError, ValueError):
+                raise ValueError(f'{key} {record[key]!r} is not a whole number')
+            if record[key] < 0:
+                raise ValueError(f'{key} is negative')
+        if isinstance(record.get('is_available'), str):
+            record['is_available'] = record['is_available'].lower() in ('1', 'true', 'yes')
+        gallery = record.get('gallery', [])
+        if not isinstance(gallery, list) or not all(isinstance(name, str) for name in gallery):
+            raise ValueError('gallery is not a list of image names')
+    return record
+
+
+def guess_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'jsonl' if path.endswith(('.jsonl', '.json')) else 'csv'
@@ -0,0 +1,244 @@
+"""Faceted filtering for the store page.
+
+Facet counts come from an in-memory bitmap index over the available
+products. Every facet value is a Python int with bit i set when the i-th
+product has that value, so applying filters is a few ANDs and ORs and each
+count is one int.bit_count(). The index is built with two queries, kept per
+process and rebuilt when facet_index_version() moves (any product or review
+change). The product list itself is still a SQL query with the same filters.
+
+Filter state lives only in the query string (category, price, rating,
+in_stock, sort) and FilterState.query() always writes it in one canonical
+order, so equal filters give equal URLs.
+"""
+import threading
+from collections import defaultdict
+from urllib.parse import urlencode
+
+from django.db.models import Avg, Q
+
+from .models import Product, ReviewRating, facet_index_version
+
+PRICE_RANGES = {
+    'under-100': (None, 100),
+    '100-200': (100, 200),
+    '200-500': (200, 500),
+    '500-up': (500, None),
+}
+PRICE_LABELS = {
+    'under-100': 'Under $100',
+    '100-200': '$100 to $200',
+    '200-500': '$200 to $500',
+    '500-up': '$500 and up',
+}
+MIN_RATINGS = (4, 3, 2, 1)
+
+
+def _bitmap(positions, size):
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _in_range(price, price_range):
+    low, high = price_range
+    return (low is None or price >= low) and (high is None or price < high)
+
+
+class FacetIndex:
+    def __init__(self, products, ratings):
+        """products holds (id, category slug, category name, price, stock); ratings maps id to average rating."""
+        self.size = len(products)
+        self.all = (1 << self.size) - 1
+        positions = defaultdict(list)
+        self.category_names = {}
+        for position, (product_id, category, category_name, price, stock) in enumerate(products):
+            self.category_names[category] = category_name
+            positions['category', category].append(position)
+            for key, price_range in PRICE_RANGES.items():
+                if _in_range(price, price_range):
+                    positions['price', key].append(position)
+            if stock > 0:
+                positions['in_stock', True].append(position)
+            rating = ratings.get(product_id)
+            for minimum in MIN_RATINGS:
+                if rating is not None and rating >= minimum:
+                    positions['rating', minimum].append(position)
+        self.bitmaps = {key: _bitmap(found, self.size) for key, found in positions.items()}
+        self.categories = sorted(self.category_names)
+
+    @classmethod
+    def build(cls):
+        # Always from the primary: the index is kept until the next version bump
+        products = list(
+            Product.objects.using('default').filter(is_available=True).order_by('id')
+            .values_list('id', 'category__slug', 'category__category_name', 'price', 'stock')
+        )
+        ratings = dict(
+            ReviewRating.objects.using('default').filter(status=True).order_by().values('product_id')
+            .annotate(average=Avg('rating')).values_list('product_id', 'average')
+        )
+        return cls(products, ratings)
+
+    def bitmap(self, facet, value):
+        return self.bitmaps.get((facet, value), 0)
+
+
+_index = (None, None)
+_build_lock = threading.Lock()
+
+
+def facet_index():
+    global _index
+    version = facet_index_version()
+    if _index[0] != version:
+        # One thread rebuilds; the others keep using the previous index
+        # meanwhile, and only wait when there is none yet
+        if _build_lock.acquire(blocking=_index[1] is None):
+            try:
+                if _index[0] != version:
+                    _index = (version, FacetIndex.build())
+            finally:
+                _build_lock.release()
+    return _index[1]
+
+
+class FilterState:
+    def __init__(self, categories=(), prices=(), rating=None, in_stock=False, sort=None):
+        self.categories = tuple(sorted(set(categories)))
+        self.prices = tuple(key for key in PRICE_RANGES if key in prices)
+        self.rating = rating
+        self.in_stock = in_stock
+        self.sort = sort
+
+    @classmethod
+    def from_query(cls, params, sorts=()):
+        rating = params.get('rating')
+        return cls(
+            categories=params.getlist('category'),
+            prices=params.getlist('price'),
+            rating=int(rating) if rating in {str(minimum) for minimum in MIN_RATINGS} else None,
+            in_stock=params.get('in_stock') == '1',
+            sort=params.get('sort') if params.get('sort') in sorts else None,
+        )
+
+    def replace(self, **changes):
+        values = dict(categories=self.categories, prices=self.prices, rating=self.rating,
+                      in_stock=self.in_stock, sort=self.sort)
+        values.update(changes)
+        return FilterState(**values)
+
+    def query(self, **changes):
+        state = self.replace(**changes) if changes else self
+        params = [('category', slug) for slug in state.categories]
+        params += [('price', key) for key in state.prices]
+        if state.rating:
+            params.append(('rating', state.rating))
+        if state.in_stock:
+            params.append(('in_stock', 1))
+        if state.sort:
+            params.append(('sort', state.sort))
+        return urlencode(params)
+
+    @property
+    def is_filtered(self):
+        return bool(self.categories or self.prices or self.rating or self.in_stock)
+
+    def apply(self, products):
+        """Filter a Product queryset the same way the bitmaps do."""
+        if self.categories:
+            products = products.filter(category__slug__in=self.categories)
+        if self.prices:
+            in_ranges = Q()
+            for key in self.prices:
+                low, high = PRICE_RANGES[key]
+                in_range = Q()
+                if low is not None:
+                    in_range &= Q(price__gte=low)
+                if high is not None:
+                    in_range &= Q(price__lt=high)
+                in_ranges |= in_range
+            products = products.filter(in_ranges)
+        if self.in_stock:
+            products = products.filter(stock__gt=0)
+        if self.rating:
+            products = products.annotate(
+                average_rating=Avg('reviewrating__rating', filter=Q(reviewrating__status=True)),
+            ).filter(average_rating__gte=self.rating)
+        return products
+
+    def masks(self, index):
+        """The bitmap each facet's selection allows (index.all when unselected)."""
+        def union(facet, values):
+            mask = 0
+            for value in values:
+                mask |= index.bitmap(facet, value)
+            return mask
+
+        return {
+            'category': union('category', self.categories) if self.categories else index.all,
+            'price': union('price', self.prices) if self.prices else index.all,
+            'rating': index.bitmap('rating', self.rating) if self.rating else index.all,
+            'in_stock': index.bitmap('in_stock', True) if self.in_stock else index.all,
+        }
+
+
+def facet_counts(index, state, within=None):
+    """Counts per facet value, each ignoring that facet's own selection.
+
+    within optionally limits everything to one bitmap (e.g. a category page).
+    """
+    masks = state.masks(index)
+
+    def others(facet):
+        mask = index.all if within is None else within
+        for name, facet_mask in masks.items():
+            if name != facet:
+                mask &= facet_mask
+        return mask
+
+    category_base = others('category')
+    price_base = others('price')
+    rating_base = others('rating')
+    return {
+        'total': others(None).bit_count(),
+        'category': {slug: (category_base & index.bitmap('category', slug)).bit_count() for slug in index.categories},
+        'price': {key: (price_base & index.bitmap('price', key)).bit_count() for key in PRICE_RANGES},
+        'rating': {minimum: (rating_base & index.bitmap('rating', minimum)).bit_count() for minimum in MIN_RATINGS},
+        'in_stock': (others('in_stock') & index.bitmap('in_stock', True)).bit_count(),
+    }
+
+
+def facet_options(index, state, counts, show_categories=True):
+    """Sidebar entries: label, count, whether selected and the canonical query that toggles it."""
+    def toggle(values, value):
+        return tuple(v for v in values if v != value) if value in values else values + (value,)
+
+    facets = {}
+    if show_categories:
+        facets['category'] = [{
+            'label': index.category_names[slug],
+            'count': count,
+            'selected': slug in state.categories,
+            'query': state.query(categories=toggle(state.categories, slug)),
+        } for slug, count in counts['category'].items()]
+    facets['price'] = [{
+        'label': PRICE_LABELS[key],
+        'count': count,
+        'selected': key in state.prices,
+        'query': state.query(prices=toggle(state.prices, key)),
+    } for key, count in counts['price'].items()]
+    facets['rating'] = [{
+        'label': f'{minimum}+ stars',
+        'count': count,
+        'selected': state.rating == minimum,
+        'query': state.query(rating=None if state.rating == minimum else minimum),
+    } for minimum, count in counts['rating'].items()]
+    facets['in_stock'] = [{
+        'label': 'In stock',
+        'count': counts['in_stock'],
+        'selected': state.in_stock,
+        'query': state.query(in_stock=not state.in_stock),
+    }]
+    return facets
@@ -0,0 +1,115 @@
+import asyncio
+import statistics
+import threading
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+
+from accounts.models import Account
+from store.benchmarks import catalog_views, seed_catalog, temporary_database
+
+
+async def asgi_get(app, url):
+    """Send one GET through the ASGI application, as an ASGI server would, and return the status."""
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'headers': [(b'host', b'testserver')], 'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+    }
+    body_sent = False
+    disconnected = asyncio.Event()
+    status = None
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Django listens for a disconnect while the view runs; the client never leaves
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+async def load(app, urls, concurrency, total):
+    """Run total requests with at most `concurrency` in flight; return req/s and the peak thread count."""
+    peak_threads = threading.active_count()
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal peak_threads
+        async with gate:
+            status = await asgi_get(app, urls[i % len(urls)])
+            peak_threads = max(peak_threads, threading.active_count())
+            if status != 200:
+                raise RuntimeError(f'{urls[i % len(urls)]} returned {status}')
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return total / (time.perf_counter() - start), peak_threads
+
+
+def peak_memory(app, urls, concurrency):
+    """Peak memory allocated while `concurrency` requests are in flight together, in bytes."""
+    tracemalloc.start()
+    try:
+        asyncio.run(load(app, urls, concurrency, concurrency))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the sync and async catalog views through the ASGI handler at several '
+        'concurrency levels, reporting throughput, threads and memory per in-flight request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per concurrency level')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+        parser.add_argument('--rounds', type=int, default=2, help='Best-of rounds per measurement')
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            user = Account.objects.create_user('Bench', 'User', 'bench', 'bench@example.com', 'x')
+            categories, products = seed_catalog(options['products'], user=user)
+            urls = [
+                '/',
+                '/store/?price=under-100&sort=trending',
+                f'/store/{categories[0].slug}/',
+                products[0].get_url(),
+                '/store/search/?keyword=Product+1',
+            ]
+
+            self.stdout.write(f"{'views':6} {'in flight':>9} {'req/s':>9} {'threads':>8} {'KB/request':>11}")
+            for use_async in (False, True):
+                with catalog_views(use_async):
+                    app = ASGIHandler()
+                    cache.clear()
+                    asyncio.run(load(app, urls, 1, len(urls)))  # warm caches and the facet index
+                    for concurrency in options['concurrency']:
+                        runs = [
+                            asyncio.run(load(app, urls, concurrency, options['requests']))
+                            for _ in range(options['rounds'])
+                        ]
+                        rps = max(run[0] for run in runs)
+                        threads = max(run[1] for run in runs)
+                        # Measured separately, since tracing allocations slows everything down
+                        memory = statistics.median(peak_memory(app, urls, concurrency) for _ in range(options['rounds']))
+                        self.stdout.write(
+                            f"{'async' if use_async else 'sync':6} {concurrency:9} {rps:9.1f} "
+                            f'{threads:8} {memory / concurrency / 1024:11.1f}'
+                        )
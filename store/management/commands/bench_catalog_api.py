@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from accounts.models import Account
+from store.benchmarks import requests_per_second, seed_catalog, temporary_database
+
+
+class Command(BaseCommand):
+    help = 'Compare responses per second of the JSON catalog API and the HTML store page.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--duration', type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            user = Account.objects.create_user('Bench', 'User', 'bench', 'bench@example.com', 'x')
+            seed_catalog(options['products'], user=user)
+            client = Client()
+
+            pages = [
+                ('HTML /store/', '/store/', {}),
+                ('JSON /api/products/', '/api/products/', {}),
+                ('JSON /api/products/ (3 fields)', '/api/products/?fields=id,slug,price', {}),
+            ]
+            first = client.get('/api/products/')
+            pages.append(('JSON /api/products/ (304)', '/api/products/', {'HTTP_IF_NONE_MATCH': first['ETag']}))
+
+            for label, url, headers in pages:
+                rps = requests_per_second(lambda: client.get(url, **headers), options['duration'])
+                self.stdout.write(f'{label:34} {rps:9.1f} req/s')
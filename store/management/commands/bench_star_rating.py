@@ -0,0 +1,63 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+
+
+LEGACY_CARD = (
+    '<div class="rating-star"><span>'
+    '<i class="fa fa-star{% if product.averageReview < 0.5 %}-o{% elif product.averageReview >= 0.5 and product.averageReview < 1 %}-half-o {% endif %}" aria-hidden="true"></i>'
+    '<i class="fa fa-star{% if product.averageReview < 1.5 %}-o{% elif product.averageReview >= 1.5 and product.averageReview < 2 %}-half-o {% endif %}" aria-hidden="true"></i>'
+    '<i class="fa fa-star{% if product.averageReview < 2.5 %}-o{% elif product.averageReview >= 2.5 and product.averageReview < 3 %}-half-o {% endif %}" aria-hidden="true"></i>'
+    '<i class="fa fa-star{% if product.averageReview < 3.5 %}-o{% elif product.averageReview >= 3.5 and product.averageReview < 4 %}-half-o {% endif %}" aria-hidden="true"></i>'
+    '<i class="fa fa-star{% if product.averageReview < 4.5 %}-o{% elif product.averageReview >= 4.5 and product.averageReview < 5 %}-half-o {% endif %}" aria-hidden="true"></i>'
+    '</span></div>'
+)
+
+TAG_CARD = '<div class="rating-star">{% star_rating product.averageReview %}</div>'
+
+
+class FakeProduct:
+    """Stands in for Product so the benchmark measures rendering, not queries."""
+
+    def __init__(self, average):
+        self.average = average
+        self.calls = 0
+
+    def averageReview(self):
+        self.calls += 1
+        return self.average
+
+
+class Command(BaseCommand):
+    help = 'Benchmark star rating rendering: inline conditionals vs the star_rating tag.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        engine = engines['django']
+        templates = {
+            'inline': engine.from_string('{% for product in products %}' + LEGACY_CARD + '{% endfor %}'),
+            'star_rating tag': engine.from_string('{% load store_tags %}{% for product in products %}' + TAG_CARD + '{% endfor %}'),
+        }
+
+        rng = random.Random(0)
+        averages = [rng.choice([0, 1, 2.5, 3.3, 3.5, 4, 4.25, 4.5, 5]) for _ in range(options['cards'])]
+
+        for name, tpl in templates.items():
+            best = None
+            calls = 0
+            for _ in range(options['repeat']):
+                products = [FakeProduct(avg) for avg in averages]
+                start = time.perf_counter()
+                tpl.render({'products': products})
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+                calls = sum(p.calls for p in products)
+            self.stdout.write(
+                f'{name:16} {options["cards"]} cards: {best * 1000:8.2f} ms '
+                f'({calls} averageReview calls)'
+            )
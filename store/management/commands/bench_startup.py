@@ -0,0 +1,70 @@
+import os
+import statistics
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.benchmarks import parse_importtime
+
+# Runs in a fresh interpreter, like a new worker: import the application and,
+# unless --no-urls, load the URLconf the way the first request would
+STARTUP_SCRIPT = '''
+import time
+start = time.perf_counter()
+from mohifoodspro.{app} import application
+if {urls}:
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+print((time.perf_counter() - start) * 1000)
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Start the WSGI or ASGI application in fresh interpreters and report the startup time '
+        'and where the import time goes, grouped by top-level package.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--app', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help='Packages and project modules to list')
+        parser.add_argument('--no-urls', action='store_true',
+                            help='Stop after importing the application, before the URLconf and views load')
+
+    def handle(self, *args, **options):
+        script = STARTUP_SCRIPT.format(app=options['app'], urls=not options['no_urls'])
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'mohifoodspro.settings'))
+        timings = []
+        for _ in range(options['runs']):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', script],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            )
+            if result.returncode:
+                raise CommandError(result.stderr.strip().splitlines()[-1])
+            timings.append(float(result.stdout.strip().splitlines()[-1]))
+
+        self.stdout.write(
+            f"{options['app']} startup over {len(timings)} runs: "
+            f'median {statistics.median(timings):.1f} ms, best {min(timings):.1f} ms'
+        )
+
+        # Breakdown from the last run, once .pyc files and the OS file cache are warm
+        rows = parse_importtime(result.stderr)
+        by_package = Counter()
+        for module, self_us, _ in rows:
+            by_package[module.split('.')[0]] += self_us
+        total = sum(by_package.values())
+        self.stdout.write(f'\nImport time by package ({total / 1000:.1f} ms in total):')
+        for package, self_us in by_package.most_common(options['top']):
+            self.stdout.write(f'  {package:28} {self_us / 1000:8.1f} ms {100 * self_us / total:5.1f}%')
+
+        project = {path.name for path in settings.BASE_DIR.iterdir() if (path / '__init__.py').exists()}
+        modules = sorted((row for row in rows if row[0].split('.')[0] in project), key=lambda row: -row[2])
+        self.stdout.write('\nSlowest project modules (including what they import):')
+        for module, _, cumulative_us in modules[:options['top']]:
+            self.stdout.write(f'  {module:28} {cumulative_us / 1000:8.1f} ms')
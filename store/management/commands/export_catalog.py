@@ -0,0 +1,66 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from category.models import Category
+from store.catalog_io import guess_format, write_records
+from store.models import Product, ProductGallery
+
+
+class Command(BaseCommand):
+    help = 'Stream categories, products and gallery images to CSV or JSONL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or '-' for stdout")
+        parser.add_argument('--format', choices=['csv', 'jsonl'])
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = guess_format(path, options['format']) if path != '-' else (options['format'] or 'jsonl')
+        if path == '-':
+            write_records(sys.stdout, fmt, self.records(options['chunk_size']))
+            return
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            write_records(f, fmt, self.records(options['chunk_size']))
+
+    def records(self, chunk_size):
+        for category in Category.objects.order_by('id').values(
+                'slug', 'category_name', 'description', 'cat_image').iterator(chunk_size=chunk_size):
+            yield {
+                'type': 'category',
+                'slug': category['slug'],
+                'name': category['category_name'],
+                'description': category['description'],
+                'image': category['cat_image'] or '',
+            }
+
+        # Keyset chunks so each chunk's gallery images come from one query
+        last_id = 0
+        while True:
+            products = list(
+                Product.objects.filter(id__gt=last_id).order_by('id').values(
+                    'id', 'slug', 'product_name', 'description', 'category__slug',
+                    'price', 'stock', 'is_available', 'images',
+                )[:chunk_size]
+            )
+            if not products:
+                break
+            last_id = products[-1]['id']
+            gallery = {}
+            images = ProductGallery.objects.filter(product_id__in=[p['id'] for p in products]).order_by('id')
+            for product_id, image in images.values_list('product_id', 'image'):
+                gallery.setdefault(product_id, []).append(image)
+            for product in products:
+                yield {
+                    'type': 'product',
+                    'slug': product['slug'],
+                    'name': product['product_name'],
+                    'description': product['description'],
+                    'category': product['category__slug'],
+                    'price': product['price'],
+                    'stock': product['stock'],
+                    'is_available': product['is_available'],
+                    'image': product['images'] or '',
+                    'gallery': gallery.get(product['id'], []),
+                }
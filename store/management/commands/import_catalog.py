@@ -0,0 +1,221 @@
+import hashlib
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from category.models import Category
+from store.catalog_io import clean_record, guess_format, read_records
+from store.models import (
+    Product, ProductGallery, bump_facet_index_version, bump_product_detail_version, recount_category_products,
+)
+
+PRODUCT_UPDATE_FIELDS = [
+    'product_name', 'description', 'category', 'price', 'stock', 'is_available', 'images', 'modified_date',
+]
+
+
+def file_digest(f):
+    digest = hashlib.sha256()
+    for block in iter(lambda: f.read(1024 * 1024), b''):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        'Upsert categories, products and gallery images from CSV or JSONL, keyed on slug. '
+        'With --images, image files are copied from a local directory when their content changed. '
+        'Invalid records are reported and skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'])
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--images', help='Directory holding the image files named in the records')
+        parser.add_argument('--workers', type=int, default=8, help='Threads used to hash and copy images')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        if options['images'] and not os.path.isdir(options['images']):
+            raise CommandError(f"{options['images']} is not a directory")
+
+        self.category_ids = dict(Category.objects.values_list('slug', 'id'))
+        self.totals = dict.fromkeys(
+            ['categories', 'created', 'updated', 'skipped', 'images copied', 'images unchanged'], 0,
+        )
+        self.pool = ThreadPoolExecutor(max_workers=options['workers']) if options['images'] else None
+        try:
+            with open(path, newline='', encoding='utf-8') as f:
+                records = read_records(f, guess_format(path, options['format']))
+                while True:
+                    batch = list(itertools.islice(records, options['batch_size']))
+                    if not batch:
+                        break
+                    self.import_batch(batch, options)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{count} {name}' for name, count in self.totals.items())
+        ))
+
+    def skip(self, line, reason):
+        self.stderr.write(f'Line {line}: {reason}, skipped')
+        self.totals['skipped'] += 1
+
+    def import_batch(self, batch, options):
+        # {slug: (line, record)}
+        categories = {}
+        products = {}
+        for line, record in batch:
+            try:
+                record = clean_record(record)
+                if options['images']:
+                    for name in [record.get('image')] + record.get('gallery', []):
+                        if not name:
+                            continue
+                        source = self.image_path(name, options['images'])
+                        if source is None:
+                            raise ValueError(f'image {name!r} is outside {options["images"]}')
+                        # Checked here, so one missing file skips its record rather than the rest of the import
+                        if not os.path.isfile(source):
+                            raise ValueError(f'image {name!r} not found in {options["images"]}')
+            except ValueError as e:
+                self.skip(line, e)
+                continue
+            records = categories if record['type'] == 'category' else products
+            records[record['slug']] = (line, record)
+        categories = self.drop_name_clashes(Category, 'category_name', categories)
+        products = self.drop_name_clashes(Product, 'product_name', products)
+
+        if options['images']:
+            names = set()
+            for _, record in itertools.chain(categories.values(), products.values()):
+                names.update(name for name in [record.get('image')] + record.get('gallery', []) if name)
+            self.copy_images(names, options['images'])
+
+        try:
+            with transaction.atomic():
+                if categories:
+                    self.upsert_categories(categories)
+                if products:
+                    self.upsert_products(products)
+        except IntegrityError as e:
+            raise CommandError(f'Lines {batch[0][0]}-{batch[-1][0]}: {e}')
+
+    def drop_name_clashes(self, model, name_field, records):
+        """Skip records that take a unique name another slug already has, here or earlier in the batch."""
+        names = [record['name'] for _, record in records.values()]
+        owners = dict(model.objects.filter(**{f'{name_field}__in': names}).values_list(name_field, 'slug'))
+        kept = {}
+        for slug, (line, record) in records.items():
+            owner = owners.setdefault(record['name'], slug)
+            if owner != slug:
+                self.skip(line, f"name {record['name']!r} is already used by {owner}")
+                continue
+            kept[slug] = (line, record)
+        return kept
+
+    def upsert_categories(self, records):
+        existing = {c.slug: c for c in Category.objects.filter(slug__in=records)}
+        new = []
+        for _, record in records.values():
+            category = existing.get(record['slug']) or Category(slug=record['slug'])
+            category.category_name = record['name']
+            category.description = record.get('description', '')
+            category.cat_image = record.get('image', '')
+            if category.pk is None:
+                new.append(category)
+        Category.objects.bulk_update(existing.values(), ['category_name', 'description', 'cat_image'])
+        Category.objects.bulk_create(new)
+        self.category_ids.update(Category.objects.filter(slug__in=[c.slug for c in new]).values_list('slug', 'id'))
+        self.totals['categories'] += len(records)
+
+    def upsert_products(self, records):
+        existing = {p.slug: p for p in Product.objects.filter(slug__in=records)}
+        touched_categories = {p.category_id for p in existing.values()}
+        now = timezone.now()
+        new = []
+        for slug, (line, record) in list(records.items()):
+            category_id = self.category_ids.get(record['category'])
+            if category_id is None:
+                self.skip(line, f"unknown category {record['category']}")
+                del records[slug]
+                existing.pop(slug, None)
+                continue
+            product = existing.get(slug) or Product(slug=slug)
+            product.product_name = record['name']
+            product.description = record.get('description', '')
+            product.category_id = category_id
+            product.price = record['price']
+            product.stock = record['stock']
+            product.is_available = record.get('is_available', True)
+            product.images = record.get('image', '')
+            product.modified_date = now
+            if product.pk is None:
+                new.append(product)
+
+        # Bulk writes skip save() signals, so bump the caches and recount categories here
+        Product.objects.bulk_update(existing.values(), PRODUCT_UPDATE_FIELDS, batch_size=500)
+        Product.objects.bulk_create(new, batch_size=500)
+        for slug in records:
+            bump_product_detail_version(slug)
+        bump_facet_index_version()
+        touched_categories.update(p.category_id for p in existing.values())
+        touched_categories.update(p.category_id for p in new)
+        recount_category_products(touched_categories)
+        self.totals['created'] += len(new)
+        self.totals['updated'] += len(existing)
+
+        with_gallery = {slug: r['gallery'] for slug, (_, r) in records.items() if 'gallery' in r}
+        if with_gallery:
+            self.sync_gallery(with_gallery)
+
+    def sync_gallery(self, galleries):
+        product_ids = dict(Product.objects.filter(slug__in=galleries).values_list('slug', 'id'))
+        wanted = {(product_ids[slug], image) for slug, images in galleries.items() for image in images}
+        current = ProductGallery.objects.filter(product_id__in=product_ids.values())
+        have = {(product_id, image): pk for pk, product_id, image in current.values_list('id', 'product_id', 'image')}
+        stale = [pk for key, pk in have.items() if key not in wanted]
+        if stale:
+            ProductGallery.objects.filter(id__in=stale).delete()
+        ProductGallery.objects.bulk_create([
+            ProductGallery(product_id=product_id, image=image)
+            for product_id, image in sorted(wanted - have.keys())
+        ])
+
+    def image_path(self, name, source_dir):
+        """The file `name` refers to under source_dir, or None when it resolves outside it."""
+        root = os.path.realpath(source_dir)
+        path = os.path.realpath(os.path.join(root, name))
+        return path if path.startswith(root + os.sep) else None
+
+    def copy_images(self, names, source_dir):
+        """Copy images whose content differs from the stored file, hashing in parallel."""
+        def copy_if_changed(name):
+            source = self.image_path(name, source_dir)
+            if not os.path.exists(source):
+                raise CommandError(f'Image {source} not found')
+            with open(source, 'rb') as f:
+                source_hash = file_digest(f)
+            if default_storage.exists(name):
+                with default_storage.open(name, 'rb') as f:
+                    if file_digest(f) == source_hash:
+                        return False
+                default_storage.delete(name)
+            with open(source, 'rb') as f:
+                default_storage.save(name, File(f))
+            return True
+
+        for copied in self.pool.map(copy_if_changed, sorted(names)):
+            self.totals['images copied' if copied else 'images unchanged'] += 1
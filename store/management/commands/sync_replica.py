@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into the replica file, for trying the '
+        'read replica router locally. With --interval it keeps copying, which '
+        'also simulates replication lag.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Repeat every N seconds until interrupted')
+
+    def handle(self, *args, **options):
+        replica = settings.REPLICA_DATABASE
+        if not replica:
+            raise CommandError('No replica configured; set DATABASE_REPLICA_NAME.')
+        primary, copy = connections['default'].settings_dict, connections[replica].settings_dict
+        if not all(db['ENGINE'] == 'django.db.backends.sqlite3' for db in (primary, copy)):
+            raise CommandError("sync_replica only copies SQLite files; use the database's own replication.")
+
+        while True:
+            start = time.perf_counter()
+            self.copy(primary['NAME'], copy['NAME'])
+            self.stdout.write(f"Copied {primary['NAME']} to {copy['NAME']} in {time.perf_counter() - start:.2f}s")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, source_name, target_name):
+        # The backup API takes a consistent snapshot even while the primary is being written
+        source = sqlite3.connect(source_name)
+        target = sqlite3.connect(target_name)
+        try:
+            with target:
+                source.backup(target)
+        finally:
+            source.close()
+            target.close()
@@ -2,7 +2,12 @@ from django.db import models
 from category.models import Category
 from django.urls import reverse
 from accounts.models import Account
-from django.db.models import Avg, Count
+from django.db.models import Avg, Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.core.cache import cache
+import time
 
 # Create your models here.
 
@@ -17,6 +22,24 @@ class Product(models.Model):
     category        = models.ForeignKey(Category, on_delete=models.CASCADE)
     created_date    = models.DateTimeField(auto_now_add=True)
     modified_date   = models.DateTimeField(auto_now=True)
+    # Popularity, maintained by analytics.rankings as orders are paid
+    units_sold      = models.IntegerField(default=0)
+    trending_score  = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-units_sold', '-id'], name='product_best_sellers'),
+            models.Index(fields=['-trending_score', '-id'], name='product_trending'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'category_id' in instance.__dict__ and 'is_available' in instance.__dict__:
+            instance._counted_category = counted_category(instance)
+        if all(field in instance.__dict__ for field in ('category_id', 'is_available', 'price', 'stock')):
+            instance._facet_fields = facet_fields(instance)
+        return instance
 
     def get_url(self):
         return reverse('product_detail', args=[self.category.slug, self.slug])
@@ -65,3 +88,143 @@ class ProductGallery(models.Model):
         verbose_name = 'productgallery'
         verbose_name_plural = 'product gallery'
 
+
+
+# Product detail pages are cached under a per-product version, so any change
+# to the product, its reviews or its gallery just moves readers to a new key.
+def product_detail_version_key(product_slug):
+    return f'product_detail_version:{product_slug}'
+
+
+def product_detail_version(product_slug):
+    key = product_detail_version_key(product_slug)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+async def aproduct_detail_version(product_slug):
+    key = product_detail_version_key(product_slug)
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        await cache.aadd(key, version, None)
+        version = await cache.aget(key, version)
+    return version
+
+
+def bump_product_detail_version(product_slug):
+    cache.set(product_detail_version_key(product_slug), time.time_ns(), None)
+
+
+# The store page's facet index (see facets.py) is rebuilt whenever a review
+# changes, or a product or category changes in a way the facets can see.
+# Products remember their faceted fields when loaded, so checkout's stock
+# updates only rebuild it when a product runs out or comes back.
+FACET_INDEX_VERSION_KEY = 'facet_index_version'
+
+
+def facet_index_version():
+    version = cache.get(FACET_INDEX_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(FACET_INDEX_VERSION_KEY, version, None)
+        version = cache.get(FACET_INDEX_VERSION_KEY, version)
+    return version
+
+
+def bump_facet_index_version():
+    cache.set(FACET_INDEX_VERSION_KEY, time.time_ns(), None)
+
+
+def facet_fields(product):
+    return product.category_id, product.is_available, product.price, product.stock > 0
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    bump_product_detail_version(instance.slug)
+    fields = facet_fields(instance)
+    if created or getattr(instance, '_facet_fields', None) != fields:
+        bump_facet_index_version()
+    instance._facet_fields = fields
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    bump_product_detail_version(instance.slug)
+    bump_facet_index_version()
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_labels(sender, instance, **kwargs):
+    instance._facet_labels = Category.objects.filter(pk=instance.pk).values_list('category_name', 'slug').first() \
+        if instance.pk is not None else None
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    # Facets label and link categories by name and slug
+    if instance._facet_labels != (instance.category_name, instance.slug):
+        bump_facet_index_version()
+
+
+@receiver([post_save, post_delete], sender=ReviewRating)
+def review_changed(sender, instance, **kwargs):
+    bump_facet_index_version()
+
+
+# Category.product_count counts available products. Products remember the
+# category they were counted under when loaded, so a save only touches the
+# counters when the category or availability actually changed.
+def counted_category(product):
+    return product.category_id if product.is_available else None
+
+
+def _adjust_product_count(category_id, delta):
+    if category_id is not None:
+        Category.objects.filter(id=category_id).update(product_count=F('product_count') + delta)
+
+
+def recount_category_products(category_ids=None):
+    """Recompute product_count from Product, for all categories or the given ids."""
+    available = Product.objects.filter(category=OuterRef('pk'), is_available=True) \
+        .order_by().values('category').annotate(count=Count('id')).values('count')
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(id__in=category_ids)
+    return categories.update(product_count=Coalesce(Subquery(available), 0))
+
+
+@receiver(pre_save, sender=Product)
+def remember_counted_category(sender, instance, **kwargs):
+    if not hasattr(instance, '_counted_category'):
+        old = Product.objects.filter(pk=instance.pk).values('category_id', 'is_available').first() \
+            if instance.pk is not None else None
+        instance._counted_category = old['category_id'] if old and old['is_available'] else None
+
+
+@receiver(post_save, sender=Product)
+def update_category_count(sender, instance, created, **kwargs):
+    old = None if created else instance._counted_category
+    new = counted_category(instance)
+    if old != new:
+        _adjust_product_count(old, -1)
+        _adjust_product_count(new, 1)
+    instance._counted_category = new
+
+
+@receiver(post_delete, sender=Product)
+def release_category_count(sender, instance, **kwargs):
+    _adjust_product_count(getattr(instance, '_counted_category', counted_category(instance)), -1)
+
+
+@receiver([post_save, post_delete], sender=ReviewRating)
+@receiver([post_save, post_delete], sender=ProductGallery)
+def product_content_changed(sender, instance, **kwargs):
+    slug = Product.objects.filter(id=instance.product_id).values_list('slug', flat=True).first()
+    if slug:
+        bump_product_detail_version(slug)
@@ -0,0 +1,53 @@
+from django import template
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+# Star suffixes for every half-step rating from 0 to 5, built once at import.
+# Index is the rating rounded down to the nearest half star, times two.
+def _build_star_table():
+    table = []
+    for half_steps in range(11):
+        value = half_steps / 2
+        stars = []
+        for position in range(1, 6):
+            if value < position - 0.5:
+                stars.append('-o')
+            elif value < position:
+                stars.append('-half-o')
+            else:
+                stars.append('')
+        table.append(tuple(stars))
+    return tuple(table)
+
+
+STAR_TABLE = _build_star_table()
+
+STAR_HTML = tuple(
+    mark_safe(''.join(
+        '<i class="fa fa-star%s" aria-hidden="true"></i>' % suffix for suffix in stars
+    ))
+    for stars in STAR_TABLE
+)
+
+
+def _star_index(value):
+    try:
+        index = int(float(value) * 2)
+    except (TypeError, ValueError):
+        index = 0
+    return min(max(index, 0), 10)
+
+
+def star_suffixes(value):
+    return STAR_TABLE[_star_index(value)]
+
+
+@register.simple_tag
+def star_rating(value, count=None):
+    stars = STAR_HTML[_star_index(value)]
+    if count is None:
+        return format_html('<span>{}</span>', stars)
+    return format_html('<span>{}<span>{} reviews</span></span>', stars, count)
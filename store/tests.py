@@ -1,3 +1,635 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.template import engines
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from accounts.models import Account
+from carts.models import CartItem
+from category.models import Category
+from mohifoodspro.db_router import STICKY_COOKIE, ReplicaMiddleware, ReplicaRouter, replica_reads
+from mohifoodspro import single_flight
+from mohifoodspro.ratelimit import take_token
+from mohifoodspro.views import home
+from . import api, views as store_views
+from .models import Product, ProductGallery, ReviewRating, facet_index_version
+from .benchmarks import catalog_views, parse_importtime, seed_catalog
+from .facets import FilterState, facet_counts, facet_index, facet_options
+from .templatetags.store_tags import STAR_TABLE, star_suffixes
+
+
+class StarRatingTagTests(SimpleTestCase):
+    def legacy_suffixes(self, value):
+        stars = []
+        for position in range(1, 6):
+            if value < position - 0.5:
+                stars.append('-o')
+            elif value < position:
+                stars.append('-half-o')
+            else:
+                stars.append('')
+        return tuple(stars)
+
+    def test_lookup_matches_inline_conditionals(self):
+        for value in [0, 0.2, 0.5, 1, 1.49, 2.5, 3.3, 3.75, 4.5, 4.99, 5]:
+            self.assertEqual(star_suffixes(value), self.legacy_suffixes(value))
+
+    def test_out_of_range_values_are_clamped(self):
+        self.assertEqual(star_suffixes(-1), STAR_TABLE[0])
+        self.assertEqual(star_suffixes(7), STAR_TABLE[10])
+        self.assertEqual(star_suffixes(None), STAR_TABLE[0])
+
+    def test_renders_count(self):
+        tpl = engines['django'].from_string('{% load store_tags %}{% star_rating 3.5 12 %}')
+        html = tpl.render({})
+        self.assertEqual(html.count('<i class="fa fa-star"'), 3)
+        self.assertIn('fa-star-half-o', html)
+        self.assertIn('12 reviews', html)
+
+
+class CatalogApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = Account.objects.create_user('Api', 'User', 'api', 'api@example.com', 'x')
+        cls.categories, cls.products = seed_catalog(products=7, categories=2, reviews_per_product=2, user=user)
+
+    def test_keyset_pagination_walks_all_products(self):
+        seen = []
+        url = '/api/products/?limit=3'
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(item['id'] for item in data['results'])
+            url = data['next']
+        self.assertEqual(seen, sorted(p.id for p in self.products))
+
+    def test_field_selection_and_category_filter(self):
+        slug = self.categories[0].slug
+        data = self.client.get(f'/api/products/?fields=slug,rating,review_count&category={slug}').json()
+        self.assertEqual(len(data['results']), 4)
+        self.assertEqual(set(data['results'][0]), {'slug', 'rating', 'review_count'})
+        self.assertEqual(data['results'][0]['review_count'], 2)
+
+    def test_unknown_field_is_rejected(self):
+        self.assertEqual(self.client.get('/api/products/?fields=secret').status_code, 400)
+
+    def test_etag_returns_not_modified(self):
+        first = self.client.get('/api/categories/')
+        second = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_detail_includes_gallery(self):
+        data = self.client.get(f'/api/products/{self.products[0].slug}/').json()
+        self.assertEqual(data['gallery'], [])
+        self.assertEqual(data['category']['slug'], self.categories[0].slug)
+
+
+class ProductDetailCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('Detail', 'User', 'detail', 'detail@example.com', 'x')
+        cls.user.is_active = True
+        cls.user.save()
+        cls.categories, cls.products = seed_catalog(products=2, categories=1, reviews_per_product=3, user=cls.user)
+        cls.product = cls.products[0]
+        cls.url = cls.product.get_url()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_warm_anonymous_page_costs_one_query(self):
+        self.client.get(self.url)
+        # The only remaining query is the category menu from menu_links
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['review_count'], 3)
+        self.assertFalse(response.context['in_cart'])
+
+    def test_review_invalidates_cached_page(self):
+        self.client.get(self.url)
+        ReviewRating.objects.create(product=self.product, user=self.user, subject='More', rating=5)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['review_count'], 4)
+
+    def test_per_user_flags_follow_cart_and_orders(self):
+        self.client.force_login(self.user)
+        self.assertFalse(self.client.get(self.url).context['in_cart'])
+        self.client.post(f'/cart/add_cart/{self.product.id}/')
+        self.client.post(f'/cart/add_cart/{self.product.id}/')
+        response = self.client.get(self.url)
+        self.assertTrue(response.context['in_cart'])
+        self.assertEqual(response.context['cart_count'], 2)
+
+    def test_unknown_product_is_404(self):
+        self.assertEqual(self.client.get('/store/category/category-0/missing/').status_code, 404)
+
+
+class ProductReviewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = Account.objects.create_user('Review', 'User', 'review', 'review@example.com', 'x')
+        cls.categories, cls.products = seed_catalog(products=1, categories=1, reviews_per_product=25, user=user)
+        cls.url = f'/store/reviews/{cls.products[0].id}/'
+
+    def walk(self, sort):
+        seen = []
+        url = f'{self.url}?sort={sort}'
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(data['results'])
+            url = data['next']
+        return seen
+
+    def test_newest_pages_cover_every_review_once(self):
+        ids = [review['id'] for review in self.walk('newest')]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(set(ids)), 25)
+
+    def test_highest_pages_are_ordered_by_rating(self):
+        reviews = self.walk('highest')
+        keys = [(review['rating'], review['id']) for review in reviews]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        self.assertEqual(len(keys), 25)
+
+    def test_page_query_count_is_constant(self):
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_html_fragment_links_next_page(self):
+        response = self.client.get(f'{self.url}?format=html')
+        self.assertContains(response, '<article class="box mb-3">', count=10)
+        self.assertIn('after=', response['X-Next-Page'])
+
+    def test_detail_page_renders_first_page_only(self):
+        cache.clear()
+        response = self.client.get(self.products[0].get_url())
+        self.assertEqual(len(response.context['reviews']), 10)
+        self.assertIn('after=', response.context['reviews_next'])
+
+
+class CatalogImportExportTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_round_trip_upserts_by_slug(self):
+        categories, products = seed_catalog(products=5, categories=2, reviews_per_product=0)
+        ProductGallery.objects.create(product=products[0], image='store/products/chips1.png')
+        for fmt in ('jsonl', 'csv'):
+            out = self.path(f'catalog.{fmt}')
+            call_command('export_catalog', out)
+            with open(out) as f:
+                text = f.read()
+            with open(out, 'w') as f:
+                f.write(text.replace('Product 1', 'Renamed 1').replace('product-4', 'product-new').replace('Product 4', 'New product'))
+
+            call_command('import_catalog', out, batch_size=2, stdout=StringIO())
+
+            self.assertEqual(Product.objects.get(slug='product-1').product_name, 'Renamed 1')
+            self.assertTrue(Product.objects.filter(slug='product-new').exists())
+            self.assertEqual(
+                list(ProductGallery.objects.filter(product=products[0]).values_list('image', flat=True)),
+                ['store/products/chips1.png'],
+            )
+            Product.objects.filter(slug='product-new').delete()
+        self.assertEqual(Category.objects.count(), 2)
+
+    def test_images_are_copied_only_when_changed(self):
+        source = self.path('source')
+        os.makedirs(os.path.join(source, 'photos/products'))
+        with open(os.path.join(source, 'photos/products/new.png'), 'wb') as f:
+            f.write(b'image-bytes')
+        catalog = self.path('catalog.jsonl')
+        with open(catalog, 'w') as f:
+            f.write(json.dumps({'type': 'category', 'slug': 'snacks', 'name': 'Snacks'}) + '\n')
+            f.write(json.dumps({
+                'type': 'product', 'slug': 'crisps', 'name': 'Crisps', 'category': 'snacks',
+                'price': 10, 'stock': 3, 'image': 'photos/products/new.png', 'gallery': [],
+            }) + '\n')
+
+        with self.settings(MEDIA_ROOT=self.path('media')):
+            out = StringIO()
+            call_command('import_catalog', catalog, images=source, stdout=out)
+            self.assertIn('1 images copied', out.getvalue())
+            out = StringIO()
+            call_command('import_catalog', catalog, images=source, stdout=out)
+            self.assertIn('1 images unchanged', out.getvalue())
+            with open(self.path('media/photos/products/new.png'), 'rb') as f:
+                self.assertEqual(f.read(), b'image-bytes')
+
+    def test_bad_records_are_reported_and_skipped(self):
+        seed_catalog(products=2, categories=1, reviews_per_product=0)
+        catalog = self.path('catalog.csv')
+        with open(catalog, 'w') as f:
+            f.write('type,slug,name,category,price,stock\n')
+            f.write('product,good,Good,category-0,10,1\n')
+            f.write('product,no-price,No price,category-0,,1\n')
+            f.write('product,bad-price,Bad price,category-0,abc,1\n')
+            # Renames product-1 onto product-0's unique name
+            f.write('product,product-1,Product 0,category-0,10,1\n')
+            f.write('product,lost,Lost,no-such-category,10,1\n')
+        err = StringIO()
+        out = StringIO()
+        call_command('import_catalog', catalog, stdout=out, stderr=err)
+        self.assertIn('1 created', out.getvalue())
+        self.assertIn('4 skipped', out.getvalue())
+        for line in ('Line 3: missing price', 'Line 4: price', 'Line 5: name', 'Line 6: unknown category'):
+            self.assertIn(line, err.getvalue())
+        self.assertEqual(Product.objects.get(slug='product-1').product_name, 'Product 1')
+
+        broken = self.path('broken.jsonl')
+        with open(broken, 'w') as f:
+            f.write('{"type": "product", "slug": \n')
+        err = StringIO()
+        call_command('import_catalog', broken, stdout=StringIO(), stderr=err)
+        self.assertIn('Line 1: not a category or product record', err.getvalue())
+
+    def test_image_names_cannot_escape_the_source_directory(self):
+        source = self.path('source')
+        os.makedirs(source)
+        with open(self.path('secret.png'), 'wb') as f:
+            f.write(b'secret')
+        catalog = self.path('catalog.jsonl')
+        with open(catalog, 'w') as f:
+            f.write(json.dumps({'type': 'category', 'slug': 'snacks', 'name': 'Snacks'}) + '\n')
+            f.write(json.dumps({
+                'type': 'product', 'slug': 'crisps', 'name': 'Crisps', 'category': 'snacks',
+                'price': 10, 'stock': 3, 'image': '../secret.png',
+            }) + '\n')
+        err = StringIO()
+        with self.settings(MEDIA_ROOT=self.path('media')):
+            call_command('import_catalog', catalog, images=source, stdout=StringIO(), stderr=err)
+        self.assertIn("Line 2: image '../secret.png' is outside", err.getvalue())
+        self.assertFalse(Product.objects.filter(slug='crisps').exists())
+        self.assertFalse(os.path.exists(self.path('media/secret.png')))
+
+
+    def test_a_missing_image_skips_only_its_record(self):
+        source = self.path('source')
+        os.makedirs(source)
+        for name in ('first.png', 'last.png'):
+            with open(os.path.join(source, name), 'wb') as f:
+                f.write(name.encode())
+        catalog = self.path('catalog.jsonl')
+        with open(catalog, 'w') as f:
+            f.write(json.dumps({'type': 'category', 'slug': 'snacks', 'name': 'Snacks'}) + '\n')
+            for slug, image in (('first', 'first.png'), ('missing', 'gone.png'), ('last', 'last.png')):
+                f.write(json.dumps({
+                    'type': 'product', 'slug': slug, 'name': slug.title(), 'category': 'snacks',
+                    'price': 10, 'stock': 3, 'image': image,
+                }) + '\n')
+        out = StringIO()
+        err = StringIO()
+        with self.settings(MEDIA_ROOT=self.path('media')):
+            call_command('import_catalog', catalog, images=source, batch_size=2, stdout=out, stderr=err)
+        self.assertIn("Line 3: image 'gone.png' not found", err.getvalue())
+        self.assertIn('2 created', out.getvalue())
+        self.assertIn('2 images copied', out.getvalue())
+        self.assertEqual(set(Product.objects.values_list('slug', flat=True)), {'first', 'last'})
+
+class StoreFacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('Fay', 'Set', 'fay', 'fay@example.com', 'x')
+        cls.categories, cls.products = seed_catalog(products=6, categories=2, reviews_per_product=0)
+        for product, price, stock in zip(cls.products, [50, 150, 250, 90, 600, 120], [0, 5, 5, 1, 0, 2]):
+            Product.objects.filter(id=product.id).update(price=price, stock=stock)
+        for product, rating in zip(cls.products, [5, 4, 2, 3]):
+            ReviewRating.objects.create(product=product, user=cls.user, rating=rating)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_match_filtered_queries(self):
+        index = facet_index()
+        states = [
+            FilterState(),
+            FilterState(prices=['100-200', 'under-100']),
+            FilterState(categories=['category-0'], in_stock=True),
+            FilterState(rating=3, prices=['under-100', '200-500']),
+        ]
+        available = Product.objects.filter(is_available=True)
+        for state in states:
+            counts = facet_counts(index, state)
+            self.assertEqual(counts['total'], state.apply(available).count())
+            for slug, count in counts['category'].items():
+                self.assertEqual(count, state.replace(categories=[slug]).apply(available).count())
+            for key, count in counts['price'].items():
+                self.assertEqual(count, state.replace(prices=[key]).apply(available).count())
+            for minimum, count in counts['rating'].items():
+                self.assertEqual(count, state.replace(rating=minimum).apply(available).count())
+
+    def test_store_page_filters_and_keeps_canonical_links(self):
+        response = self.client.get(reverse('store') + '?in_stock=1&price=under-100&price=100-200')
+        products = self.products
+        self.assertEqual(response.context['product_count'], 3)
+        self.assertEqual(response.context['filter_query'], 'price=under-100&price=100-200&in_stock=1')
+        price_counts = {option['label']: option['count'] for option in response.context['facets']['price']}
+        self.assertEqual(price_counts['$200 to $500'], 1)
+        self.assertEqual(list(response.context['products']), [products[1], products[3], products[5]])
+
+    def test_category_page_counts_stay_in_category(self):
+        category = self.categories[1]
+        response = self.client.get(reverse('products_by_category', args=[category.slug]) + '?price=100-200')
+        self.assertNotIn('category', response.context['facets'])
+        self.assertEqual(response.context['product_count'], 2)
+        self.assertEqual(response.context['filter_query'], 'price=100-200')
+        price_counts = {option['label']: option['count'] for option in response.context['facets']['price']}
+        self.assertEqual(price_counts, {'Under $100': 1, '$100 to $200': 2, '$200 to $500': 0, '$500 and up': 0})
+
+    def test_index_rebuilds_after_product_save(self):
+        self.assertEqual(facet_counts(facet_index(), FilterState())['in_stock'], 4)
+        product = Product.objects.get(id=self.products[0].id)
+        product.stock = 3
+        product.save()
+        self.assertEqual(facet_counts(facet_index(), FilterState())['in_stock'], 5)
+
+    def test_only_faceted_changes_rebuild_the_index(self):
+        version = facet_index_version()
+        # Checkout selling stock that doesn't run out
+        product = Product.objects.get(id=self.products[1].id)
+        product.stock -= 1
+        product.description = 'Crunchier'
+        product.save()
+        self.assertEqual(facet_index_version(), version)
+
+        product.stock = 0
+        product.save()
+        self.assertNotEqual(facet_index_version(), version)
+
+        version = facet_index_version()
+        category = Category.objects.get(id=self.categories[0].id)
+        category.description = 'Snacks'
+        category.save()
+        self.assertEqual(facet_index_version(), version)
+        category.category_name = 'Renamed'
+        category.save()
+        self.assertNotEqual(facet_index_version(), version)
+        index = facet_index()
+        options = facet_options(index, FilterState(), facet_counts(index, FilterState()))
+        self.assertIn('Renamed', [option['label'] for option in options['category']])
+
+
+class AsyncCatalogViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user('Ay', 'Sync', 'async', 'async@example.com', 'x')
+        cls.user.is_active = True
+        cls.user.save()
+        cls.categories, cls.products = seed_catalog(products=6, categories=2, user=cls.user)
+        ProductGallery.objects.create(product=cls.products[0], image='photos/products/chips1.png')
+        CartItem.objects.create(user=cls.user, product=cls.products[0], quantity=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def pages(self):
+        product = self.products[0]
+        return [
+            reverse('home'),
+            reverse('store') + '?price=under-100&sort=trending&page=2',
+            reverse('products_by_category', args=[self.categories[1].slug]),
+            product.get_url(),
+            reverse('search') + '?keyword=Product+1',
+        ]
+
+    def summary(self, response):
+        context = response.context
+        summary = {key: context.get(key) for key in ('product_count', 'facets', 'filter_query', 'cart_count',
+                                                       'average_rating', 'review_count', 'in_cart', 'orderproduct')}
+        # The sync home page also passes an unused 'reviews', so compare reviews on detail pages only
+        for key in ('products', 'reviews', 'product_gallery'):
+            if key in context and (key != 'reviews' or 'single_product' in context):
+                summary[key] = [item.id for item in context[key]]
+        summary['links'] = [category.id for category in context['links']]
+        return summary
+
+    def test_async_pages_match_sync_pages(self):
+        self.client.force_login(self.user)
+        expected = [self.summary(self.client.get(url)) for url in self.pages()]
+        with catalog_views(use_async=True):
+            self.assertTrue(iscoroutinefunction(resolve(reverse('store')).func))
+            cache.clear()
+            for url, summary in zip(self.pages(), expected):
+                with self.subTest(url=url):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(self.summary(response), summary)
+        self.assertFalse(iscoroutinefunction(resolve(reverse('store')).func))
+
+    async def test_async_pages_run_under_async_client(self):
+        await self.async_client.aforce_login(self.user)
+        with catalog_views(use_async=True):
+            response = await self.async_client.get(self.products[0].get_url())
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['in_cart'])
+            self.assertEqual(response.context['cart_count'], 2)
+            missing = await self.async_client.get(reverse('products_by_category', args=['no-such-category']))
+            self.assertEqual(missing.status_code, 404)
+
+
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRouterTests(SimpleTestCase):
+    def route(self, view, method='get', cookies=None, write=False):
+        """Run view through ReplicaMiddleware and return where Product and CartItem reads went."""
+        routes = {}
+        router = ReplicaRouter()
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            if write:
+                router.db_for_write(CartItem)
+            routes['store'] = router.db_for_read(Product) or 'default'
+            routes['carts'] = router.db_for_read(CartItem) or 'default'
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(get_response)
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies or {})
+        routes['response'] = middleware(request)
+        return routes
+
+    def test_catalog_reads_use_replica(self):
+        routes = self.route(replica_reads(lambda request: None))
+        self.assertEqual((routes['store'], routes['carts']), ('replica', 'default'))
+        self.assertEqual(self.route(lambda request: None)['store'], 'default')
+        self.assertEqual(self.route(replica_reads(lambda request: None), method='post')['store'], 'default')
+
+    def test_writes_are_sticky(self):
+        routes = self.route(replica_reads(lambda request: None), write=True)
+        self.assertEqual(routes['store'], 'default')
+        cookie = routes['response'].cookies[STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_STICKY_SECONDS)
+
+        routes = self.route(replica_reads(lambda request: None), cookies={STICKY_COOKIE: cookie.value})
+        self.assertEqual(routes['store'], 'default')
+        expired = str(int(time.time()) - 1)
+        self.assertEqual(self.route(replica_reads(lambda request: None), cookies={STICKY_COOKIE: expired})['store'], 'replica')
+
+    def test_store_views_are_marked(self):
+        self.assertTrue(all(getattr(view, 'replica_reads', False) for view in (
+            home, store_views.store, store_views.search, store_views.product_reviews, api.product_list,
+        )))
+        self.assertFalse(hasattr(store_views.product_detail, 'replica_reads'))
+
+
+@override_settings(RATE_LIMITS={'search': (2, 60), 'payment': (1, 60)})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_search_is_rejected_before_any_query(self):
+        url = reverse('search') + '?keyword=chips'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        # Counts are per client
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    def test_allowance_refills(self):
+        with mock.patch('mohifoodspro.ratelimit.time.time', return_value=960.0) as now:
+            self.assertEqual([take_token('search', 'ip:1') for _ in range(3)], [0, 0, 60])
+            # A new window, but the full previous one still counts
+            now.return_value = 1020.0
+            self.assertEqual(take_token('search', 'ip:1'), 30)
+            # Half of it has slid out
+            now.return_value = 1050.0
+            self.assertEqual(take_token('search', 'ip:1'), 0)
+            self.assertEqual(take_token('search', 'ip:1'), 30)
+        self.assertEqual(take_token('unlimited', 'ip:1'), 0)
+
+    def test_concurrent_requests_never_exceed_the_burst(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            waits = list(pool.map(lambda _: take_token('search', 'ip:3'), range(20)))
+        self.assertEqual(waits.count(0), 2)
+
+    def test_clients_behind_trusted_proxies_are_told_apart(self):
+        url = reverse('search') + '?keyword=chips'
+
+        def get(forwarded_for):
+            return self.client.get(url, REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=forwarded_for).status_code
+
+        with override_settings(RATE_LIMIT_TRUSTED_PROXIES=1):
+            self.assertEqual([get('203.0.113.7'), get('203.0.113.7')], [200, 200])
+            # Entries before the one the proxy wrote are the client's to forge
+            self.assertEqual(get('192.0.2.1, 203.0.113.7'), 429)
+            self.assertEqual(get('203.0.113.8'), 200)
+        # Without the setting the header is ignored and everyone is the proxy
+        self.assertEqual([get('198.51.100.1'), get('198.51.100.2'), get('198.51.100.3')], [200, 200, 429])
+
+    def test_falls_back_to_process_memory_without_cache(self):
+        with mock.patch('mohifoodspro.ratelimit.cache.incr', side_effect=ConnectionError), \
+                self.assertLogs('mohifoodspro.ratelimit', 'WARNING'):
+            self.assertEqual([bool(take_token('search', 'ip:2')) for _ in range(3)], [False, False, True])
+
+    def test_json_endpoints_get_a_json_error(self):
+        url = reverse('start_payment')
+        self.client.post(url, '{}', content_type='application/json')
+        response = self.client.post(url, '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('error', response.json())
+
+    async def test_async_search_is_limited(self):
+        with catalog_views(use_async=True):
+            url = reverse('search') + '?keyword=chips'
+            statuses = [(await self.async_client.get(url)).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_waiters_get_the_stale_value_while_one_request_computes(self):
+        single_flight.get_or_compute('page', lambda: 'old', 60, version=1)
+        cache.add('page:lock', 'other', version=2)
+        compute = mock.Mock(return_value='new')
+        self.assertEqual(single_flight.get_or_compute('page', compute, 60, version=2), 'old')
+        compute.assert_not_called()
+
+    @mock.patch.object(single_flight, 'WAIT_SECONDS', 0.05)
+    def test_gives_up_waiting_on_a_stuck_lock(self):
+        cache.add('page:lock', 'other')
+        self.assertEqual(single_flight.get_or_compute('page', lambda: 'fresh', 60), 'fresh')
+
+    async def test_async_requesters_share_one_computation(self):
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return 'page'
+
+        results = await asyncio.gather(*(single_flight.aget_or_compute('page', compute, 60) for _ in range(20)))
+        self.assertEqual(results, ['page'] * 20)
+        self.assertEqual(calls, 1)
+
+
+class ProductDetailSingleFlightTests(TransactionTestCase):
+    def setUp(self):
+        user = Account.objects.create_user('Many', 'Readers', 'readers', 'readers@example.com', 'x')
+        self.categories, self.products = seed_catalog(products=1, categories=1, reviews_per_product=3, user=user)
+
+    def cold_page_queries(self, requesters):
+        """Queries run by `requesters` threads loading one product page together on an empty cache."""
+        cache.clear()
+        product = self.products[0]
+        barrier = threading.Barrier(requesters)
+
+        def load(_):
+            barrier.wait()
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    data = store_views._product_detail_data(product.category.slug, product.slug)
+                self.assertEqual(data['review_count'], 3)
+                return len(queries)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=requesters) as pool:
+            return sum(pool.map(load, range(requesters)))
+
+    def test_query_count_does_not_grow_with_requesters(self):
+        self.assertEqual([self.cold_page_queries(requesters) for requesters in (1, 8, 32)], [3, 3, 3])
+
+
+class StartupProfileTests(SimpleTestCase):
+    def test_parses_importtime_output(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     requests.compat\n'
+            'import time:      2669 |      49671 | orders.views\n'
+            'unrelated line\n'
+        )
+        self.assertEqual(parse_importtime(output), [('requests.compat', 120, 120), ('orders.views', 2669, 49671)])
+
+    def test_views_do_not_load_payment_sdk(self):
+        script = 'import django; django.setup(); import orders.views, sys; print("razorpay" in sys.modules)'
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='mohifoodspro.settings', SECRET_KEY='x')
+        result = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), 'False')
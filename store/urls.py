@@ -1,14 +1,19 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Catalog pages are served by the async views under ASGI (ASYNC_CATALOG_VIEWS)
+catalog = async_views if settings.ASYNC_CATALOG_VIEWS else views
 
 urlpatterns = [
-    path('', views.store, name='store'),
+    path('', catalog.store, name='store'),
     
     # --- SPECIFIC URLs MOVED UP ---
-    path('search/', views.search, name='search'),
-    path('category/<slug:category_slug>/<slug:product_slug>/', views.product_detail, name='product_detail'),
+    path('search/', catalog.search, name='search'),
+    path('category/<slug:category_slug>/<slug:product_slug>/', catalog.product_detail, name='product_detail'),
     path('submit_review/<int:product_id>/', views.submit_review, name='submit_review'),
+    path('reviews/<int:product_id>/', views.product_reviews, name='product_reviews'),
 
     # --- GENERAL SLUG URL MOVED TO THE END ---
-    path('<slug:category_slug>/', views.store, name='products_by_category'),
+    path('<slug:category_slug>/', catalog.store, name='products_by_category'),
 ]
\ No newline at end of file
@@ -1,80 +1,228 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Product, ReviewRating, ProductGallery
+from .models import Product, ReviewRating, ProductGallery, product_detail_version
 from category.models import Category
-from carts.models import CartItem
-from django.db.models import Q
+from carts.models import cart_quantities
+from carts.guest_cart import guest_cart_quantities
+from django.db.models import Q, Avg, Count
 
-from carts.views import _cart_id
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.http import urlencode
 from .forms import ReviewForm
 from django.contrib import messages
-from orders.models import OrderProduct
+from orders.models import ordered_product_ids
+from analytics.recommendations import ordered_together
+from analytics.rankings import PRODUCT_SORTS
+from mohifoodspro.db_router import replica_reads
+from mohifoodspro.ratelimit import rate_limit
+from mohifoodspro.single_flight import get_or_compute
+from .facets import FilterState, facet_counts, facet_index, facet_options
 
+SORT_LABELS = {
+    'best_selling': 'Best selling',
+    'trending': 'Trending',
+    'newest': 'Newest',
+}
 
-def store(request, category_slug=None):
-    categories = None
-    products = None
 
-    if category_slug != None:
-        categories = get_object_or_404(Category, slug=category_slug)
-        products = Product.objects.filter(category=categories, is_available=True)
-        paginator = Paginator(products, 1)
-        page = request.GET.get('page')
-        paged_products = paginator.get_page(page)
-        product_count = products.count()
+def store_listing(request, index, category=None):
+    """Filter state, facet counts, products and page size behind the store page."""
+    state = FilterState.from_query(request.GET, PRODUCT_SORTS)
+    products = Product.objects.filter(is_available=True).select_related('category')
+    if category is not None:
+        # The category comes from the path, so it's left out of the query string
+        state = state.replace(categories=())
+        products = products.filter(category=category)
+        counts = facet_counts(index, state, within=index.bitmap('category', category.slug))
+        per_page = 1
     else:
-        products = Product.objects.all().filter(is_available=True).order_by('id')
-        paginator = Paginator(products, 3)
-        page = request.GET.get('page')
-        paged_products = paginator.get_page(page)
-        product_count = products.count()
+        counts = facet_counts(index, state)
+        per_page = 3
+    products = state.apply(products).order_by(*PRODUCT_SORTS.get(state.sort, ('id',)))
+    return state, counts, products, per_page
 
-    context = {
+
+def store_context(index, state, counts, paged_products, show_categories):
+    return {
         'products': paged_products,
-        'product_count': product_count,
+        'product_count': paged_products.paginator.count,
+        'facets': facet_options(index, state, counts, show_categories=show_categories),
+        'filter_query': state.query(),
+        'clear_filters_query': FilterState(sort=state.sort).query(),
+        'is_filtered': state.is_filtered,
+        'sort_options': [
+            {'label': label, 'selected': state.sort == sort, 'query': state.query(sort=sort)}
+            for sort, label in SORT_LABELS.items()
+        ],
     }
+
+
+@replica_reads
+def store(request, category_slug=None):
+    categories = None
+    if category_slug != None:
+        categories = get_object_or_404(Category, slug=category_slug)
+
+    index = facet_index()
+    state, counts, products, per_page = store_listing(request, index, categories)
+    paginator = Paginator(products, per_page)
+    page = request.GET.get('page')
+    paged_products = paginator.get_page(page)
+
+    context = store_context(index, state, counts, paged_products, show_categories=category_slug is None)
     return render(request, 'store/store.html', context)
 
 
-def product_detail(request, category_slug, product_slug):
-    try:
-        single_product = Product.objects.get(category__slug=category_slug, slug=product_slug)
-        in_cart = CartItem.objects.filter(cart__cart_id=_cart_id(request), product=single_product).exists()
-    except Exception as e:
-        raise e
-    
+REVIEWS_PAGE_SIZE = 10
+PRODUCT_DETAIL_CACHE_TIMEOUT = 60 * 15
+REVIEW_SORTS = {
+    'newest': ('-id',),
+    'highest': ('-rating', '-id'),
+}
 
-    if request.user.is_authenticated:
-        try:
-            orderproduct = OrderProduct.objects.filter(user=request.user, product_id=single_product.id).exists()
-        except OrderProduct.DoesNotExist:
-            orderproduct = None
-    else:
-        orderproduct = None
 
-    # Get the reviews
-    reviews = ReviewRating.objects.filter(product_id=single_product.id, status=True)
+def review_query(product_id, sort='newest', after=None):
+    """Approved reviews after the cursor, in page order.
 
-    # Get the product gallery
-    product_gallery = ProductGallery.objects.filter(product_id=single_product.id)
+    Cursors are the last review's id for 'newest' and 'rating:id' for 'highest'.
+    """
+    reviews = ReviewRating.objects.filter(product_id=product_id, status=True).select_related('user')
+    if after:
+        if sort == 'highest':
+            rating, review_id = after.split(':')
+            rating, review_id = float(rating), int(review_id)
+            reviews = reviews.filter(Q(rating__lt=rating) | Q(rating=rating, id__lt=review_id))
+        else:
+            reviews = reviews.filter(id__lt=int(after))
+    return reviews.order_by(*REVIEW_SORTS[sort])
 
-    context = {
+
+def review_page(rows, sort='newest', limit=REVIEWS_PAGE_SIZE):
+    """Split limit + 1 fetched rows into one page and the cursor of the next page."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = f'{last.rating}:{last.id}' if sort == 'highest' else str(last.id)
+    return rows, next_cursor
+
+
+def _review_page(product_id, sort='newest', after=None, limit=REVIEWS_PAGE_SIZE):
+    """Return one keyset page of approved reviews and the cursor of the next page."""
+    rows = list(review_query(product_id, sort, after)[:limit + 1])
+    return review_page(rows, sort, limit)
+
+
+def product_detail_queryset():
+    return Product.objects.select_related('category').annotate(
+        average_rating=Avg('reviewrating__rating', filter=Q(reviewrating__status=True)),
+        review_count=Count('reviewrating', filter=Q(reviewrating__status=True)),
+    )
+
+
+def product_detail_data(single_product, reviews, next_cursor, product_gallery):
+    reviews_next = None
+    if next_cursor:
+        reviews_next = reverse('product_reviews', args=[single_product.id]) + \
+            '?' + urlencode({'sort': 'newest', 'format': 'html', 'after': next_cursor})
+    return {
         'single_product': single_product,
-        'in_cart'       : in_cart,
-        'orderproduct': orderproduct,
-        'reviews': reviews,
+        'average_rating': single_product.average_rating or 0,
+        'review_count': single_product.review_count,
         'product_gallery': product_gallery,
+        'reviews': reviews,
+        'reviews_next': reviews_next,
     }
+
+
+def product_detail_cache_key(category_slug, product_slug):
+    return f'product_detail:{category_slug}:{product_slug}'
+
+
+def _product_detail_data(category_slug, product_slug):
+    """Everything on the detail page that is the same for every visitor.
+
+    Loaded in three queries (product with category and rating aggregates,
+    gallery, first page of reviews) and cached under the product's version.
+    On a miss only one request loads it; the others wait for it or get the
+    previous version.
+    """
+    def load():
+        single_product = get_object_or_404(product_detail_queryset(), category__slug=category_slug, slug=product_slug)
+        reviews, next_cursor = _review_page(single_product.id)
+        product_gallery = list(ProductGallery.objects.filter(product_id=single_product.id))
+        return product_detail_data(single_product, reviews, next_cursor, product_gallery)
+
+    version = product_detail_version(product_slug)
+    key = product_detail_cache_key(category_slug, product_slug)
+    return get_or_compute(key, load, PRODUCT_DETAIL_CACHE_TIMEOUT, version=version)
+
+
+def product_detail(request, category_slug, product_slug):
+    context = dict(_product_detail_data(category_slug, product_slug))
+    product_id = context['single_product'].id
+
+    # Per-user bits come from cached per-user maps, not per-page queries
+    if request.user.is_authenticated:
+        in_cart = product_id in cart_quantities(user_id=request.user.id)
+        orderproduct = product_id in ordered_product_ids(request.user.id)
+    else:
+        in_cart = product_id in guest_cart_quantities(request)
+        orderproduct = None
+
+    context['in_cart'] = in_cart
+    context['orderproduct'] = orderproduct
+    context['ordered_together'] = ordered_together(product_id)
     return render(request, 'store/product_detail.html', context)
 
 
+@replica_reads
+def product_reviews(request, product_id):
+    sort = request.GET.get('sort', 'newest')
+    if sort not in REVIEW_SORTS:
+        sort = 'newest'
+    try:
+        reviews, next_cursor = _review_page(product_id, sort, request.GET.get('after'))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    next_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['after'] = next_cursor
+        next_url = request.path + '?' + params.urlencode()
+
+    if request.GET.get('format') == 'html':
+        response = render(request, 'includes/review_list.html', {'reviews': reviews})
+        if next_url:
+            response['X-Next-Page'] = next_url
+        return response
+
+    results = [{
+        'id': review.id,
+        'user': review.user.full_name(),
+        'subject': review.subject,
+        'review': review.review,
+        'rating': review.rating,
+        'updated_at': review.updated_at,
+    } for review in reviews]
+    return JsonResponse({'results': results, 'next': next_url})
+
+
+def search_products(request):
+    keyword = request.GET.get('keyword')
+    if not keyword:
+        return Product.objects.none()
+    return Product.objects.select_related('category').order_by('-created_date', '-id') \
+        .filter(Q(description__icontains=keyword) | Q(product_name__icontains=keyword))
+
+
+@replica_reads
+@rate_limit('search')
 def search(request):
-    if 'keyword' in request.GET:
-        keyword = request.GET['keyword']
-        if keyword:
-            products = Product.objects.order_by('-created_date').filter(Q(description__icontains=keyword) | Q(product_name__icontains=keyword))
-            product_count = products.count()
+    products = search_products(request)
+    product_count = products.count()
     context = {
         'products': products,
         'product_count': product_count,
@@ -82,6 +230,7 @@ def search(request):
     return render(request, 'store/store.html', context)
 
 
+@rate_limit('review', key='user')
 def submit_review(request, product_id):
     url = request.META.get('HTTP_REFERER')
     if request.method == 'POST':